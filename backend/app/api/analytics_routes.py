@@ -68,17 +68,20 @@ async def genre_ratings_chart():
 @router.get("/statistics/chart/ratings", response_class=Response, responses={200: {"content": {"image/png": {}}}})
 async def ratings_distribution_chart():
     recommender = get_recommender()
-    vote_averages = recommender.movies_df["vote_average"].dropna()
+    ratings = recommender.aggregates["ratings"]
+    bins = np.array(ratings["histogram"]["bin_edges"])
+    counts = np.array(ratings["histogram"]["counts"])
 
     fig, ax = plt.subplots(figsize=(10, 5))
     _apply_dark_theme(fig, ax)
 
-    n, bins, patches = ax.hist(vote_averages, bins=25, color=ACCENT, edgecolor="#222", alpha=0.85)
+    patches = ax.bar(bins[:-1], counts, width=np.diff(bins), align="edge",
+                     color=ACCENT, edgecolor="#222", alpha=0.85)
 
     for patch, left_edge in zip(patches, bins[:-1]):
         patch.set_facecolor(plt.cm.RdPu(0.3 + (left_edge / 10) * 0.6))
 
-    mean_val = vote_averages.mean()
+    mean_val = ratings["mean"] or 0.0
     ax.axvline(mean_val, color=ACCENT2, linestyle="--", linewidth=2, label=f"Mean: {mean_val:.2f}")
 
     ax.set_xlabel("Vote Average", fontsize=11)
@@ -1,31 +1,55 @@
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import Response
+from sqlalchemy.orm import Session
 from typing import List, Optional
 from app.models import (
     MovieRecommendationRequest,
+    MultiSeedRecommendationRequest,
     MoodRecommendationRequest,
     RecommendationResponse,
     PopularMoviesResponse,
     GenreStatsResponse,
     Movie
 )
+from app.database import get_db
+from app.ml.item_similarity import co_rating_similarities
 from app.ml.recommender import get_recommender
+from app.ml.payloads import encode_response
 
 router = APIRouter()
 
 @router.get("/movies/search")
 async def search_movies(
     query: str = Query(..., min_length=1),
-    limit: int = Query(10, ge=1, le=50)
+    limit: int = Query(10, ge=1, le=50),
+    fuzzy: bool = Query(True)
 ):
-    """Search for movies by title"""
+    """Search for movies by title, tolerating typos unless fuzzy=false"""
     recommender = get_recommender()
-    results = recommender.search_movies(query, limit)
+    rows = recommender.search_rows(query, limit, fuzzy=fuzzy)
     
-    return {
+    body = encode_response({
         "query": query,
-        "results": results,
-        "count": len(results)
-    }
+        "results": recommender.search_payloads.encode_list(rows),
+        "count": len(rows)
+    })
+    return Response(content=body, media_type="application/json")
+
+@router.get("/movies/autocomplete")
+async def autocomplete_movies(
+    query: str = Query(..., min_length=1),
+    limit: int = Query(10, ge=1, le=20)
+):
+    """Suggest movies whose title starts with the query, most popular first"""
+    recommender = get_recommender()
+    rows = recommender.autocomplete_rows(query, limit)
+    
+    body = encode_response({
+        "query": query,
+        "results": recommender.search_payloads.encode_list(rows),
+        "count": len(rows)
+    })
+    return Response(content=body, media_type="application/json")
 
 @router.post("/recommendations/content-based", response_model=RecommendationResponse)
 async def get_content_recommendations(request: MovieRecommendationRequest):
@@ -33,55 +57,125 @@ async def get_content_recommendations(request: MovieRecommendationRequest):
     recommender = get_recommender()
     
     # Check if movie exists
-    movie = recommender.get_movie_by_title(request.title)
-    if movie is None:
+    if not recommender.find_rows_by_title(request.title):
         raise HTTPException(
             status_code=404,
             detail=f"Movie '{request.title}' not found. Please try searching first."
         )
     
-    recommendations, scores = recommender.get_content_based_recommendations(
+    rows, scores = recommender.get_content_based_rows(
         request.title,
         request.n_recommendations
     )
     
-    if not recommendations:
+    if not rows:
         raise HTTPException(
             status_code=404,
             detail="No recommendations found"
         )
     
-    return {
-        "recommendations": recommendations,
-        "similarity_scores": [float(score) for score in scores]
-    }
+    # Payloads are pre-encoded and match RecommendationResponse, so skip re-validation
+    body = encode_response({
+        "recommendations": recommender.payloads.encode_list(rows),
+        "similarity_scores": scores
+    })
+    return Response(content=body, media_type="application/json")
+
+@router.post("/recommendations/also-liked", response_model=RecommendationResponse)
+async def get_also_liked_recommendations(
+    request: MovieRecommendationRequest,
+    db: Session = Depends(get_db)
+):
+    """Collaborative "users who liked this also liked" recommendations from co-ratings"""
+    recommender = get_recommender()
+    
+    title_rows = recommender.find_rows_by_title(request.title)
+    if not title_rows:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Movie '{request.title}' not found. Please try searching first."
+        )
+    
+    movie_id = int(recommender.movie_ids[title_rows[0]])
+    other_ids, similarities = co_rating_similarities(db, movie_id)
+    rows, scores = recommender.top_rows_for_ids(other_ids, similarities, request.n_recommendations)
+    
+    if not rows:
+        raise HTTPException(
+            status_code=404,
+            detail="Not enough ratings of this movie yet"
+        )
+    
+    body = encode_response({
+        "recommendations": recommender.payloads.encode_list(rows),
+        "similarity_scores": scores
+    })
+    return Response(content=body, media_type="application/json")
+
+@router.post("/recommendations/more-like-these", response_model=RecommendationResponse)
+async def get_multi_seed_recommendations(request: MultiSeedRecommendationRequest):
+    """Get merged content-based recommendations for several seed movies"""
+    recommender = get_recommender()
+    
+    if request.weights is not None and (
+        len(request.weights) != len(request.movie_ids) or min(request.weights) < 0
+    ):
+        raise HTTPException(
+            status_code=400,
+            detail="weights must have one non-negative entry per movie id"
+        )
+    
+    rows, scores = recommender.get_multi_seed_rows(
+        request.movie_ids,
+        request.weights,
+        request.n_recommendations
+    )
+    
+    if not rows:
+        raise HTTPException(
+            status_code=404,
+            detail="No recommendations found for these movies"
+        )
+    
+    body = encode_response({
+        "recommendations": recommender.payloads.encode_list(rows),
+        "similarity_scores": scores
+    })
+    return Response(content=body, media_type="application/json")
 
 @router.post("/recommendations/mood-based")
 async def get_mood_recommendations(request: MoodRecommendationRequest):
     """Get mood-based movie recommendations"""
     recommender = get_recommender()
     
-    recommendations = recommender.get_mood_based_recommendations(
-        request.mood,
-        request.n_recommendations
-    )
+    rows = recommender.get_mood_rows(request.mood, request.n_recommendations)
     
-    return {
+    body = encode_response({
         "mood": request.mood,
-        "recommendations": recommendations,
-        "count": len(recommendations)
-    }
+        "recommendations": recommender.payloads.encode_list(rows),
+        "count": len(rows)
+    })
+    return Response(content=body, media_type="application/json")
 
 @router.get("/movies/popular")
-async def get_popular_movies(limit: int = Query(20, ge=1, le=50)):
-    """Get popular movies from TMDB or dataset"""
+async def get_popular_movies(
+    limit: int = Query(20, ge=1, le=50),
+    weighted: bool = Query(False)
+):
+    """Get popular movies from TMDB or dataset (weighted=true ranks by vote-weighted rating)"""
     recommender = get_recommender()
     
-    # Try TMDB first, fallback to dataset
-    movies = await recommender.fetch_tmdb_popular()
+    # Try TMDB first, fallback to dataset; TMDB has no vote-weighted ranking
+    movies = [] if weighted else await recommender.fetch_tmdb_popular()
     
     if not movies:
-        movies = recommender.get_popular_movies(limit)
+        # Straight from the pre-encoded payloads, nothing decoded per request
+        rows = recommender.popularity.top(limit, weighted).tolist()
+        body = encode_response({
+            "movies": recommender.payloads.encode_list(rows),
+            "count": len(rows)
+        })
+        return Response(content=body, media_type="application/json")
     
     return {
         "movies": movies[:limit],
@@ -93,14 +187,11 @@ async def get_movie_details(movie_id: int):
     """Get detailed information about a specific movie"""
     recommender = get_recommender()
     
-    movie_data = recommender.movies_df[recommender.movies_df['movie_id'] == movie_id]
+    details = recommender.get_movie_by_id(movie_id)
     
-    if movie_data.empty:
+    if details is None:
         raise HTTPException(status_code=404, detail="Movie not found")
     
-    movie = movie_data.iloc[0]
-    details = recommender._format_movie(movie)
-    
     # Try to fetch poster
     poster_url = await recommender.fetch_tmdb_poster(movie_id)
     if poster_url:
@@ -127,7 +218,20 @@ async def get_genre_statistics():
     
     return {
         "genre_stats": genre_stats,
-        "total_movies": len(recommender.movies_df)
+        "total_movies": len(recommender.catalog)
+    }
+
+@router.get("/statistics/distributions")
+async def get_catalog_distributions():
+    """Rating and runtime distributions plus per-genre counts, precomputed per catalog"""
+    recommender = get_recommender()
+    aggregates = recommender.aggregates
+    
+    return {
+        "total_movies": aggregates["n_movies"],
+        "ratings": aggregates["ratings"],
+        "runtime": aggregates["runtime"],
+        "genres": aggregates["genres"]
     }
 
 @router.get("/statistics/moods")
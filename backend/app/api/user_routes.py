@@ -4,7 +4,6 @@ import matplotlib
 matplotlib.use("Agg")
 import matplotlib.pyplot as plt
 import numpy as np
-import pandas as pd
 
 from fastapi import APIRouter, Depends, HTTPException, Query, status
 from fastapi.responses import Response
@@ -13,6 +12,13 @@ from typing import List, Optional
 from app.database import get_db
 from app.models_db import User, WatchlistItem, MovieRating
 from app.auth.security import get_current_active_user
+from app.ml.payloads import encode_response
+from app.ml.batch_recommendations import (
+    COLLABORATIVE_METHODS, get_precomputed, personalized_rows
+)
+from app.ml.item_similarity import record_rating_change
+from app.ml.artifacts import artifact_versions
+from app.ml.recommendation_cache import bump_profile_version, get_personalized_cache, read_profile_version
 from pydantic import BaseModel
 from datetime import datetime
 
@@ -103,6 +109,7 @@ async def add_to_watchlist(
         )
         
         db.add(watchlist_item)
+        bump_profile_version(db, current_user.id)
         db.commit()
         db.refresh(watchlist_item)
         return watchlist_item
@@ -134,6 +141,7 @@ async def remove_from_watchlist(
         )
     
     db.delete(watchlist_item)
+    bump_profile_version(db, current_user.id)
     db.commit()
     
     return {"message": "Movie removed from watchlist"}
@@ -196,6 +204,9 @@ async def rate_movie(
 ):
     """Rate a movie"""
     
+    # First, so concurrent writes for this user queue here (see record_rating_change)
+    bump_profile_version(db, current_user.id)
+    
     # Check if already rated
     existing = db.query(MovieRating).filter(
         MovieRating.user_id == current_user.id,
@@ -203,6 +214,7 @@ async def rate_movie(
     ).first()
     
     if existing:
+        record_rating_change(db, current_user.id, rating_data.movie_id, existing.rating, rating_data.rating)
         existing.rating = rating_data.rating
         existing.review = rating_data.review
         db.commit()
@@ -217,6 +229,7 @@ async def rate_movie(
         review=rating_data.review
     )
     
+    record_rating_change(db, current_user.id, rating_data.movie_id, None, rating_data.rating)
     db.add(new_rating)
     db.commit()
     db.refresh(new_rating)
@@ -231,6 +244,9 @@ async def delete_rating(
 ):
     """Delete a movie rating"""
 
+    # First, so concurrent writes for this user queue here (see record_rating_change)
+    bump_profile_version(db, current_user.id)
+
     rating = db.query(MovieRating).filter(
         MovieRating.user_id == current_user.id,
         MovieRating.movie_id == movie_id
@@ -242,23 +258,82 @@ async def delete_rating(
             detail="Rating not found"
         )
 
+    record_rating_change(db, current_user.id, movie_id, rating.rating, None)
     db.delete(rating)
     db.commit()
 
     return {"message": "Rating deleted"}
 
 
+PERSONALIZED_METHODS = ("auto",) + COLLABORATIVE_METHODS + ("genre",)
+# Response method label and message (with the user's rating count) per method used
+PERSONALIZED_LABELS = {
+    "ncf": ("neural_collaborative_filtering", "Personalized via neural model using your {} ratings"),
+    "mf": ("matrix_factorization", "Personalized via matrix factorization using your {} ratings"),
+    "genre": ("genre_weighted", "Based on your {} ratings"),
+}
+
+
+def _personalized_body(recommender, rows, used: str, rating_count: int) -> bytes:
+    response_method, message = PERSONALIZED_LABELS[used]
+    return encode_response({
+        "recommendations": recommender.payloads.encode_list(rows),
+        "method": response_method,
+        "rating_count": rating_count,
+        "message": message.format(rating_count),
+    })
+
+
+def _precomputed_body(recommender, user_id: int, profile_version: int, n: int) -> Optional[bytes]:
+    """The user's list from the last batch run, unless their ratings or watchlist changed since"""
+    precomputed = get_precomputed().lookup(user_id)
+    if precomputed is None:
+        return None
+    movie_ids, used, version, rating_count = precomputed
+    if version != profile_version:
+        return None
+    # Stored by id, so a catalog published after the batch still resolves them
+    rows = [row for row in map(recommender.get_movie_row, movie_ids.tolist()) if row is not None][:n]
+    if len(rows) < min(n, len(movie_ids)):
+        return None
+    return _personalized_body(recommender, rows, used, rating_count)
+
+
 @router.get("/recommendations/personalized")
 async def get_personalized_recommendations(
     n: int = Query(10, ge=1, le=50),
+    method: str = Query("auto", description="auto, ncf, mf or genre"),
     current_user: User = Depends(get_current_active_user),
     db: Session = Depends(get_db),
 ):
     from app.ml.recommender import get_recommender
     from app.ml.neural_recommender import get_ncf_model
+    from app.ml.matrix_factorization import get_mf_model
+
+    if method not in PERSONALIZED_METHODS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"method must be one of {', '.join(PERSONALIZED_METHODS)}"
+        )
+
+    # Read before computing, so a write or publish during this request leaves the entry unreachable
+    profile_version = read_profile_version(db, current_user.id)
+    versions = artifact_versions()
+    cache = get_personalized_cache()
+    cached = cache.get(current_user.id, n, method, profile_version, versions)
+    if cached is not None:
+        return Response(content=cached, media_type="application/json")
+    # Picks up weights published by a finished training job
+    models = {"ncf": get_ncf_model(), "mf": get_mf_model()}
 
     recommender = get_recommender()
-    ncf = get_ncf_model()
+
+    # Most users have not rated anything since the last batch run
+    if method == "auto":
+        body = _precomputed_body(recommender, current_user.id, profile_version, n)
+        if body is not None:
+            cache.put(current_user.id, n, body, profile_version, method, versions)
+            return Response(content=body, media_type="application/json")
 
     # Fetch this user's ratings
     ratings = (
@@ -266,92 +341,79 @@ async def get_personalized_recommendations(
         .filter(MovieRating.user_id == current_user.id)
         .all()
     )
-    rated_movie_ids = {r.movie_id for r in ratings}
 
     if not ratings:
-        return {
-            "recommendations": recommender.get_popular_movies(n),
+        body = encode_response({
+            "recommendations": recommender.payloads.encode_list(recommender.popularity.top(n).tolist()),
             "method": "popular",
             "rating_count": 0,
             "message": "Rate some movies to unlock personalized recommendations!",
-        }
+        })
+        cache.put(current_user.id, n, body, profile_version, method, versions)
+        return Response(content=body, media_type="application/json")
+
+    user_ratings = {r.movie_id: r.rating for r in ratings}
+    watchlist_ids = [
+        movie_id for (movie_id,) in
+        db.query(WatchlistItem.movie_id).filter(WatchlistItem.user_id == current_user.id)
+    ]
+    rows, used = personalized_rows(recommender, models, current_user.id, user_ratings, watchlist_ids, n, method)
+    body = _personalized_body(recommender, rows, used, len(ratings))
 
-    all_movie_ids = recommender.movies_df["movie_id"].tolist()
-    candidate_ids = [mid for mid in all_movie_ids if mid not in rated_movie_ids]
-
-    if ncf.is_ready_for_user(current_user.id):
-        ncf_scores = ncf.predict_for_user(current_user.id, candidate_ids)
-        if ncf_scores:
-            top_ids = sorted(ncf_scores, key=ncf_scores.get, reverse=True)[:n]
-            movies = recommender.get_movies_by_ids(top_ids)
-            return {
-                "recommendations": movies,
-                "method": "neural_collaborative_filtering",
-                "rating_count": len(ratings),
-                "message": f"Personalized via neural model using your {len(ratings)} ratings",
-            }
-
-    genre_weights: dict = {}
-    for r in ratings:
-        movie_data = recommender.movies_df[
-            recommender.movies_df["movie_id"] == r.movie_id
-        ]
-        if movie_data.empty:
-            continue
-        weight = r.rating / 5.0
-        for genre in movie_data.iloc[0]["genres"]:
-            genre_weights[genre] = genre_weights.get(genre, 0.0) + weight
-
-    scored = []
-    for _, movie in recommender.movies_df.iterrows():
-        if movie["movie_id"] in rated_movie_ids:
-            continue
-        genre_score = sum(genre_weights.get(g, 0.0) for g in movie["genres"])
-        quality = (float(movie["vote_average"]) / 10.0
-                   if pd.notna(movie["vote_average"]) else 0.0)
-        final_score = genre_score * 0.65 + quality * 0.35
-        scored.append((movie, final_score))
-
-    scored.sort(key=lambda x: x[1], reverse=True)
-    top_movies = [recommender._format_movie(m) for m, _ in scored[:n]]
+    cache.put(current_user.id, n, body, profile_version, method, versions)
+    return Response(content=body, media_type="application/json")
 
-    return {
-        "recommendations": top_movies,
-        "method": "genre_weighted",
-        "rating_count": len(ratings),
-        "message": f"Based on your {len(ratings)} ratings",
-    }
+
+@router.get("/recommendations/cache-stats")
+async def personalized_cache_stats(
+    current_user: User = Depends(get_current_active_user),
+):
+    """Hit/miss counters of the personalized recommendation cache (this worker)"""
+    return get_personalized_cache().stats()
 
 
-@router.post("/recommendations/train-model")
+@router.post("/recommendations/train-model", status_code=status.HTTP_202_ACCEPTED)
 async def train_ncf_model(
+    model: str = Query("ncf", description="ncf (Keras) or mf (ALS matrix factorization)"),
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db),
 ):
-    from app.ml.neural_recommender import get_ncf_model
-
-    all_ratings = db.query(MovieRating).all()
-    ratings_data = [
-        {"user_id": r.user_id, "movie_id": r.movie_id, "rating": r.rating}
-        for r in all_ratings
-    ]
+    """Start model training in the background; poll the returned job id for progress"""
+    from app.ml.training_jobs import MODELS, get_training_scheduler
 
-    ncf = get_ncf_model()
-    success = ncf.train(ratings_data)
+    if model not in MODELS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"model must be one of {', '.join(MODELS)}"
+        )
 
-    if success:
-        return {
-            "trained": True,
-            "total_ratings": len(ratings_data),
-            "message": f"NCF model trained on {len(ratings_data)} ratings.",
-        }
+    # The training process streams the ratings table itself
+    job, started = get_training_scheduler().submit(model=model)
     return {
-        "trained": False,
-        "total_ratings": len(ratings_data),
-        "message": f"Need at least 5 ratings to train (have {len(ratings_data)}).",
+        "job_id": job["job_id"],
+        "status": job["status"],
+        "started": started,
+        "total_ratings": job.get("total_ratings"),
+        "message": "Training started." if started else "A training job is already running.",
     }
 
 
+@router.get("/recommendations/train-model/{job_id}")
+async def get_training_job(
+    job_id: str,
+    current_user: User = Depends(get_current_active_user),
+):
+    """Status and per-epoch progress of a training job"""
+    from app.ml.training_jobs import get_training_scheduler
+
+    job = get_training_scheduler().get(job_id)
+    if job is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Training job not found"
+        )
+    return job
+
+
 @router.get(
     "/chart/watchlist",
     response_class=Response,
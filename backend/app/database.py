@@ -24,6 +24,24 @@ def get_db():
     finally:
         db.close()
 
+def upsert_add(db, model, keys, rows):
+    """Upsert rows, adding their non-key values to any existing row's (SQLite and PostgreSQL)"""
+    if not rows:
+        return
+    if db.get_bind().dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    stmt = insert(model)
+    values = [name for name in rows[0] if name not in keys]
+    db.execute(
+        stmt.on_conflict_do_update(
+            index_elements=keys,
+            set_={name: getattr(model, name) + getattr(stmt.excluded, name) for name in values},
+        ),
+        rows,
+    )
+
 def init_db():
     """Initialize database tables"""
     Base.metadata.create_all(bind=engine)
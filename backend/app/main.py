@@ -3,6 +3,11 @@ from fastapi.middleware.cors import CORSMiddleware
 from app.api import routes
 from app.api import auth_routes, user_routes, analytics_routes
 from app.database import init_db
+from app.ml.artifacts import artifact_status, preload_artifacts
+from app.ml.recommender import get_recommender
+from app.ml.neural_recommender import get_ncf_model
+from app.ml.matrix_factorization import get_mf_model
+from app.ml.batch_recommendations import get_precomputed
 import uvicorn
 
 app = FastAPI(
@@ -24,6 +29,8 @@ app.add_middleware(
 @app.on_event("startup")
 async def startup_event():
     init_db()
+    # Load and warm the catalog and models off the request path
+    preload_artifacts([get_recommender, get_ncf_model, get_mf_model, get_precomputed])
     print("🚀 Movie Recommender API started!")
     print("📚 API Docs: http://localhost:8000/docs")
 
@@ -43,7 +50,8 @@ async def root():
 
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy"}
+    """Liveness plus the catalog and model versions this worker is serving"""
+    return {"status": "healthy", "artifacts": artifact_status()}
 
 if __name__ == "__main__":
     uvicorn.run("app.main:app", host="0.0.0.0", port=8000, reload=True)
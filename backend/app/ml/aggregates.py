@@ -0,0 +1,73 @@
+"""
+Catalog-wide aggregates (per-genre ratings, rating and runtime distributions).
+
+They only change when the catalog is rebuilt, so they are computed once per
+artifact by Catalog.from_dataframe and stored in its manifest.
+"""
+import numpy as np
+from typing import List
+
+RATING_BIN_EDGES = np.linspace(0.0, 10.0, 26)
+RUNTIME_BIN_EDGES = np.arange(0, 241, 15)
+
+
+def _histogram(values: np.ndarray, edges: np.ndarray) -> dict:
+    """Counts per bin; values outside the edges land in the first/last bin"""
+    clipped = np.clip(values, edges[0], edges[-1])
+    counts, _ = np.histogram(clipped, bins=edges)
+    return {'bin_edges': edges.tolist(), 'counts': counts.tolist()}
+
+
+def _summary(values: np.ndarray) -> dict:
+    if len(values) == 0:
+        return {'count': 0, 'mean': None, 'min': None, 'p25': None, 'median': None, 'p75': None, 'max': None}
+    p25, median, p75 = np.percentile(values, [25, 50, 75])
+    return {
+        'count': int(len(values)),
+        'mean': float(values.mean()),
+        'min': float(values.min()),
+        'p25': float(p25),
+        'median': float(median),
+        'p75': float(p75),
+        'max': float(values.max()),
+    }
+
+
+def compute_aggregates(
+    vote_average: np.ndarray,
+    runtime: np.ndarray,
+    genre_indptr: np.ndarray,
+    genre_ids: np.ndarray,
+    genre_names: List[str],
+) -> dict:
+    """Per-genre count/mean rating plus rating and runtime distributions, JSON-ready"""
+    vote_average = np.asarray(vote_average, dtype=np.float64)
+    runtime = np.asarray(runtime, dtype=np.float64)
+    n_genres = len(genre_names)
+
+    # Each genre id inherits its movie's rating; unrated movies count but do not average
+    rows = np.repeat(np.arange(len(vote_average)), np.diff(genre_indptr))
+    genre_ids = np.asarray(genre_ids, dtype=np.int64)
+    ratings = vote_average[rows]
+    rated = ~np.isnan(ratings)
+    counts = np.bincount(genre_ids, minlength=n_genres)
+    rated_counts = np.bincount(genre_ids[rated], minlength=n_genres)
+    rating_sums = np.bincount(genre_ids[rated], weights=ratings[rated], minlength=n_genres)
+
+    genres = {}
+    for gid, name in enumerate(genre_names):
+        genres[name] = {
+            'count': int(counts[gid]),
+            'rated_count': int(rated_counts[gid]),
+            'mean_rating': float(rating_sums[gid] / rated_counts[gid]) if rated_counts[gid] else None,
+        }
+
+    ratings = vote_average[~np.isnan(vote_average)]
+    # A runtime of 0 means "unknown" in TMDB
+    runtimes = runtime[~np.isnan(runtime) & (runtime > 0)]
+    return {
+        'n_movies': int(len(vote_average)),
+        'genres': genres,
+        'ratings': {**_summary(ratings), 'histogram': _histogram(ratings, RATING_BIN_EDGES)},
+        'runtime': {**_summary(runtimes), 'histogram': _histogram(runtimes, RUNTIME_BIN_EDGES)},
+    }
@@ -0,0 +1,176 @@
+"""
+Hot-swappable serving artifacts (catalog, NCF weights, MF factors).
+
+Each artifact lives in an ArtifactSlot. Requests read the current instance
+without locking; at most every VERSION_CHECK_INTERVAL seconds a request also
+compares the artifact's on-disk version with the one being served, and on a
+change a background thread builds and warms a new instance, then swaps the
+reference. In-flight requests finish on the instance they already hold, so
+shipping a new artifact needs no restart and no request waits on a load.
+"""
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+import numpy as np
+
+# Seconds between on-disk version checks on the request path
+VERSION_CHECK_INTERVAL = 2.0
+
+_slots: Dict[str, "ArtifactSlot"] = {}
+
+
+def file_version(path: Path) -> Optional[int]:
+    """Modification time of a published artifact file, or None if there is none"""
+    try:
+        return os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+def save_npz(path: Path, **arrays: np.ndarray):
+    """Publish arrays as one .npz, written aside and renamed so readers in other workers never see a partial file"""
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    with open(tmp_path, "wb") as f:
+        np.savez(f, **arrays)
+    os.replace(tmp_path, path)
+
+
+def load_npz(path: Path) -> Dict[str, np.ndarray]:
+    """Every array of an .npz, read into memory"""
+    with np.load(path) as data:
+        return {name: data[name] for name in data.files}
+
+
+class ArtifactSlot:
+    def __init__(
+        self,
+        name: str,
+        version: Callable[[], object],
+        load: Callable[[], object],
+        warm: Optional[Callable[[object], None]] = None,
+        check_interval: float = VERSION_CHECK_INTERVAL,
+    ):
+        self.name = name
+        self._version_of_disk = version
+        self._load = load
+        self._warm = warm
+        self.check_interval = check_interval
+        self._instance = None
+        self._version = None
+        self._loading_version = None
+        self._failed_version = None
+        self._next_check = 0.0
+        self._lock = threading.Lock()
+        self.loaded_at: Optional[float] = None
+        self.last_error: Optional[str] = None
+        _slots[name] = self
+
+    def get(self):
+        """The serving instance; the first call loads it, later ones may start a background reload"""
+        instance = self._instance
+        if instance is None:
+            return self._load_now()
+        now = time.monotonic()
+        if now >= self._next_check:
+            self._next_check = now + self.check_interval
+            self._reload_if_changed()
+        return instance
+
+    def set(self, instance, version=None):
+        """Serve a prebuilt instance (tests, benchmarks)"""
+        self._install(instance, version)
+
+    def _build(self):
+        instance = self._load()
+        if self._warm is not None:
+            self._warm(instance)
+        return instance
+
+    def _install(self, instance, version):
+        # A single reference assignment: readers see the old or the new instance, never a mix
+        self._instance = instance
+        self._version = version
+        self.loaded_at = time.time()
+        self.last_error = None
+
+    def _load_now(self):
+        with self._lock:
+            # Concurrent first requests wait for one load instead of each building their own
+            if self._instance is None:
+                version = self._version_of_disk()
+                self._install(self._build(), version)
+        return self._instance
+
+    def _reload_if_changed(self):
+        try:
+            version = self._version_of_disk()
+        except Exception:
+            return
+        if version in (self._version, self._failed_version):
+            return
+        with self._lock:
+            if self._loading_version is not None:
+                return
+            self._loading_version = version
+        threading.Thread(target=self._reload, args=(version,), name=f"reload-{self.name}", daemon=True).start()
+
+    def _reload(self, version):
+        try:
+            start = time.perf_counter()
+            instance = self._build()
+            self._install(instance, version)
+            print(f"[Artifacts] {self.name} version {version} loaded and swapped in "
+                  f"({time.perf_counter() - start:.2f}s)")
+        except Exception as e:
+            # Keep serving the old instance, and do not retry this version on every check
+            self._failed_version = version
+            self.last_error = f"{type(e).__name__}: {e}"
+            print(f"[Artifacts] {self.name} version {version} failed to load: {e}")
+        finally:
+            self._loading_version = None
+
+    def reload(self, wait: bool = False):
+        """Rebuild from disk now, in the background unless wait"""
+        version = self._version_of_disk()
+        if wait:
+            self._install(self._build(), version)
+            return
+        with self._lock:
+            if self._loading_version is not None:
+                return
+            self._loading_version = version
+        threading.Thread(target=self._reload, args=(version,), name=f"reload-{self.name}", daemon=True).start()
+
+    def status(self) -> dict:
+        return {
+            "version": None if self._version is None else str(self._version),
+            "loaded": self._instance is not None,
+            "loaded_at": self.loaded_at,
+            "reloading": self._loading_version is not None,
+            "last_error": self.last_error,
+        }
+
+
+def artifact_status() -> Dict[str, dict]:
+    """Serving version and reload state of every artifact slot in this worker"""
+    return {name: slot.status() for name, slot in _slots.items()}
+
+
+def artifact_versions() -> Tuple[Tuple[str, object], ...]:
+    """(name, version) of every artifact this worker is serving, for cache keys"""
+    return tuple(sorted((name, slot._version) for name, slot in _slots.items()))
+
+
+def preload_artifacts(getters: Iterable[Callable[[], object]]):
+    """Load (and warm) artifacts in a background thread, so the first requests do not pay for it"""
+    def run():
+        for get in getters:
+            try:
+                get()
+            except Exception as e:
+                print(f"[Artifacts] Preload failed: {e}")
+
+    threading.Thread(target=run, name="preload-artifacts", daemon=True).start()
@@ -0,0 +1,287 @@
+"""
+Precomputed personalized recommendations for active users.
+
+A batch job (``python -m app.ml.batch_recommendations``) ranks the top
+PRECOMPUTED_N movies of every active user who has ratings. Users are split
+into chunks that run on a process pool; each worker loads the catalog and
+models once and reads its chunk's ratings and watchlists in two queries.
+Ranking is personalized_rows, the same code the online route runs, so a
+precomputed list is the one the route would have served at batch time.
+
+The lists are published as one compact file (CSR layout: sorted user ids,
+offsets, movie ids). Each list carries the user's profile version as it was
+when the list was computed. Every write to a user's ratings or watchlist
+bumps that version (app.ml.recommendation_cache), so the route serves the list
+while the versions match and scores online once the user has changed
+anything since. Workers swap in a new file as they do any other artifact (see
+app.ml.artifacts).
+"""
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from app.ml.artifacts import ArtifactSlot, file_version, load_npz, save_npz
+from app.ml.candidates import MODEL_CANDIDATES
+from app.ml.recommendation_cache import read_profile_versions
+from app.models_db import MovieRating, User, WatchlistItem
+
+# The route serves at most 50 recommendations, so this covers every n
+PRECOMPUTED_N = 50
+BATCH_CHUNK_USERS = 500
+
+# method=auto tries these in order before the genre-weighted fallback
+COLLABORATIVE_METHODS = ("ncf", "mf")
+# Stored as the index into this tuple
+_METHOD_CODES = ("genre",) + COLLABORATIVE_METHODS
+
+_PRECOMPUTED_PATH = Path(__file__).parent / "precomputed_recommendations.npz"
+
+
+def personalized_rows(
+    recommender,
+    models: Dict[str, object],
+    user_id: int,
+    ratings: Dict[int, float],
+    watchlist_ids: Sequence[int],
+    n: int,
+    method: str = "auto",
+    two_stage: Optional[bool] = None,
+) -> Tuple[List[int], str]:
+    """
+    (rows, method used) of a user's personalized top n, from the first
+    collaborative model able to score them, else from genre affinity.
+
+    Large catalogs (recommender.uses_two_stage, or two_stage=True) retrieve
+    a few hundred candidates, among them the model's best from its own index
+    (MF), and rank those; smaller ones rank every unrated movie by the
+    model's score.
+    """
+    if two_stage is None:
+        two_stage = recommender.uses_two_stage
+    for name in (COLLABORATIVE_METHODS if method == "auto" else (method,)):
+        model = models.get(name)
+        # Users rated since the last training are folded in from their ratings on the fly
+        if model is None or not model.is_ready_for_user(user_id, ratings):
+            continue
+        if not two_stage:
+            rows = recommender.get_model_rows(model, user_id, ratings, n)
+        else:
+            model_rows, model_scores = recommender.get_model_candidates(model, user_id, ratings, MODEL_CANDIDATES)
+            candidates = recommender.get_personalized_candidates(ratings, watchlist_ids, model_rows)
+            preference = recommender.model_preference(candidates, model, user_id, ratings, model_rows, model_scores)
+            rows, _ = recommender.rank_personalized(candidates, n, preference)
+        if rows:
+            return rows, name
+
+    if not two_stage:
+        rows, _ = recommender.get_genre_weighted_rows(ratings, n)
+    else:
+        candidates = recommender.get_personalized_candidates(ratings, watchlist_ids)
+        rows, _ = recommender.rank_personalized(candidates, n)
+    return rows, "genre"
+
+
+class PrecomputedRecommendations:
+    """Published top-N lists, looked up by user id"""
+
+    def __init__(self, load: bool = True):
+        self.user_ids = np.empty(0, dtype=np.int64)
+        self.profile_versions = np.empty(0, dtype=np.int64)
+        self.rating_counts = np.empty(0, dtype=np.int32)
+        self.offsets = np.zeros(1, dtype=np.int64)
+        self.movie_ids = np.empty(0, dtype=np.int32)
+        self.methods = np.empty(0, dtype=np.uint8)
+        self.built_at: Optional[float] = None
+        if load:
+            self._load_if_exists()
+
+    def __len__(self) -> int:
+        return len(self.user_ids)
+
+    def lookup(self, user_id: int) -> Optional[Tuple[np.ndarray, str, int, int]]:
+        """(movie ids best first, method used, profile version, rating count) of a user's list, or None"""
+        i = int(np.searchsorted(self.user_ids, user_id))
+        if i == len(self.user_ids) or self.user_ids[i] != user_id:
+            return None
+        movie_ids = self.movie_ids[self.offsets[i]:self.offsets[i + 1]]
+        return movie_ids, _METHOD_CODES[self.methods[i]], int(self.profile_versions[i]), int(self.rating_counts[i])
+
+    def _load_if_exists(self):
+        try:
+            if not _PRECOMPUTED_PATH.exists():
+                return
+            data = load_npz(_PRECOMPUTED_PATH)
+            self.user_ids = data["user_ids"]
+            self.profile_versions = data["profile_versions"]
+            self.rating_counts = data["rating_counts"]
+            self.offsets = data["offsets"]
+            self.movie_ids = data["movie_ids"]
+            self.methods = data["methods"]
+            self.built_at = float(data["built_at"])
+            print(f"[Batch] Loaded precomputed recommendations for {len(self.user_ids)} users.")
+        except Exception as e:
+            print(f"[Batch] Could not load precomputed recommendations: {e}")
+
+    @staticmethod
+    def save(user_ids, profile_versions, rating_counts, lists: List[np.ndarray], methods):
+        order = np.argsort(user_ids, kind="stable")
+        lengths = np.array([len(lists[i]) for i in order], dtype=np.int64)
+        offsets = np.zeros(len(order) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        movie_ids = np.concatenate([lists[i] for i in order]) if len(order) else np.empty(0)
+        save_npz(
+            _PRECOMPUTED_PATH,
+            user_ids=np.asarray(user_ids, dtype=np.int64)[order],
+            profile_versions=np.asarray(profile_versions, dtype=np.int64)[order],
+            rating_counts=np.asarray(rating_counts, dtype=np.int32)[order],
+            offsets=offsets,
+            movie_ids=movie_ids.astype(np.int32),
+            methods=np.asarray(methods, dtype=np.uint8)[order],
+            built_at=np.float64(time.time()),
+        )
+
+
+# State of a batch worker process, loaded once by _init_worker
+_worker: dict = {}
+
+
+def _init_worker():
+    from app.ml.matrix_factorization import get_mf_model
+    from app.ml.neural_recommender import get_ncf_model
+    from app.ml.recommender import get_recommender
+
+    _worker["recommender"] = get_recommender()
+    _worker["models"] = {"ncf": get_ncf_model(), "mf": get_mf_model()}
+
+
+def _score_chunk(user_ids: List[int], n: int):
+    """(user ids, profile versions, rating counts, movie id lists, method codes) for one chunk of users"""
+    from app.database import SessionLocal
+
+    recommender, models = _worker["recommender"], _worker["models"]
+    db = SessionLocal()
+    try:
+        # Versions first: a write that lands while the chunk is read leaves its
+        # list with an older version, so the route scores that user online
+        versions = read_profile_versions(db, user_ids)
+        ratings: Dict[int, Dict[int, float]] = {}
+        for user_id, movie_id, rating in (
+            db.query(MovieRating.user_id, MovieRating.movie_id, MovieRating.rating)
+            .filter(MovieRating.user_id.in_(user_ids))
+        ):
+            ratings.setdefault(user_id, {})[movie_id] = rating
+        watchlists: Dict[int, List[int]] = {}
+        for user_id, movie_id in (
+            db.query(WatchlistItem.user_id, WatchlistItem.movie_id)
+            .filter(WatchlistItem.user_id.in_(user_ids))
+        ):
+            watchlists.setdefault(user_id, []).append(movie_id)
+    finally:
+        db.close()
+
+    # Full-catalog scoring (the catalogs personalized_rows does not retrieve
+    # for): each model scores the chunk's users in one matrix, and only the
+    # users no model can score are ranked one at a time, by genre affinity
+    model_lists: Dict[int, Tuple[List[int], str]] = {}
+    if not recommender.uses_two_stage:
+        pending = dict(ratings)
+        for name in COLLABORATIVE_METHODS:
+            if models.get(name) is None or not pending:
+                continue
+            for user_id, rows in recommender.get_model_rows_batch(models[name], pending, n).items():
+                if rows:
+                    model_lists[user_id] = (rows, name)
+                    del pending[user_id]
+
+    done_ids, done_versions, rating_counts, lists, methods = [], [], [], [], []
+    for user_id in user_ids:
+        if user_id not in ratings:
+            continue
+        if user_id in model_lists:
+            rows, used = model_lists[user_id]
+        elif recommender.uses_two_stage:
+            rows, used = personalized_rows(recommender, models, user_id, ratings[user_id], watchlists.get(user_id, ()), n)
+        else:
+            rows, used = personalized_rows(recommender, models, user_id, ratings[user_id], (), n, method="genre")
+        done_ids.append(user_id)
+        done_versions.append(versions[user_id])
+        rating_counts.append(len(ratings[user_id]))
+        lists.append(recommender.movie_ids[rows].astype(np.int32))
+        methods.append(_METHOD_CODES.index(used))
+    return done_ids, done_versions, rating_counts, lists, methods
+
+
+def precompute_recommendations(
+    db: Session,
+    workers: Optional[int] = None,
+    chunk_size: int = BATCH_CHUNK_USERS,
+    n: int = PRECOMPUTED_N,
+) -> int:
+    """Rank and publish the top n of every active user with ratings; returns the user count"""
+    start = time.perf_counter()
+    user_ids = [
+        user_id for (user_id,) in
+        db.query(User.id)
+        .filter(User.is_active.is_(True), User.id.in_(db.query(MovieRating.user_id).distinct()))
+        .order_by(User.id)
+    ]
+    chunks = [user_ids[i:i + chunk_size] for i in range(0, len(user_ids), chunk_size)]
+    workers = min(workers or os.cpu_count() or 1, max(len(chunks), 1))
+
+    if workers <= 1:
+        _init_worker()
+        results = [_score_chunk(chunk, n) for chunk in chunks]
+    else:
+        # spawn, not fork: TensorFlow and the API's threads do not survive a fork
+        with ProcessPoolExecutor(workers, mp_context=get_context("spawn"), initializer=_init_worker) as pool:
+            results = list(pool.map(_score_chunk, chunks, [n] * len(chunks)))
+
+    done_ids, versions, rating_counts, lists, methods = [], [], [], [], []
+    for chunk in results:
+        done_ids += chunk[0]
+        versions += chunk[1]
+        rating_counts += chunk[2]
+        lists += chunk[3]
+        methods += chunk[4]
+    PrecomputedRecommendations.save(done_ids, versions, rating_counts, lists, methods)
+    counts = {name: methods.count(code) for code, name in enumerate(_METHOD_CODES)}
+    print(f"[Batch] Precomputed top-{n} for {len(done_ids)} users on {workers} worker(s) "
+          f"in {time.perf_counter() - start:.1f}s ({counts}).")
+    return len(done_ids)
+
+
+def precomputed_version() -> Optional[int]:
+    """Modification time of the published lists, or None if there are none"""
+    return file_version(_PRECOMPUTED_PATH)
+
+
+_precomputed_slot = ArtifactSlot("precomputed", version=precomputed_version, load=PrecomputedRecommendations)
+
+
+def get_precomputed() -> PrecomputedRecommendations:
+    """The published lists, hot-swapped when a new batch finishes"""
+    return _precomputed_slot.get()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from app.database import SessionLocal, init_db
+
+    parser = argparse.ArgumentParser(description="Precompute personalized recommendations for active users")
+    parser.add_argument("--workers", type=int, default=None, help="processes (default: one per CPU)")
+    parser.add_argument("--chunk-size", type=int, default=BATCH_CHUNK_USERS, help="users per task")
+    args = parser.parse_args()
+
+    init_db()
+    session = SessionLocal()
+    try:
+        precompute_recommendations(session, args.workers, args.chunk_size)
+    finally:
+        session.close()
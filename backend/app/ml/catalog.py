@@ -0,0 +1,256 @@
+"""
+Versioned, memory-mapped catalog artifact.
+
+A catalog directory holds one ``.npy`` file per column plus string tables
+(UTF-8 blob + offsets), the top-K neighbor arrays and the pre-encoded API
+payloads. ``Catalog.open`` maps every array with ``np.load(mmap_mode='r')``,
+so all uvicorn workers share one page-cache copy and opening is O(1) in the
+catalog size.
+
+Layout::
+
+    catalog/
+        CURRENT                 # name of the active version directory
+        v20261018-031500-3f9c2a1b/
+            manifest.json
+            movie_id.npy vote_average.npy vote_count.npy runtime.npy
+            title_blob.npy title_offsets.npy
+            genre_indptr.npy genre_ids.npy
+            neighbor_indptr.npy neighbor_indices.npy neighbor_scores.npy
+            payload_blob.npy payload_offsets.npy
+            search_payload_blob.npy search_payload_offsets.npy
+
+Saving a new version keeps the one CURRENT pointed at before, for rollback,
+and deletes older ones. manifest.json also carries the catalog aggregates
+(see app.ml.aggregates).
+"""
+import json
+import os
+import shutil
+import uuid
+import numpy as np
+import pandas as pd
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from app.ml.aggregates import compute_aggregates
+from app.ml.neighbors import NeighborIndex
+from app.ml.payloads import PayloadStore, SEARCH_FIELDS, format_movie
+
+CATALOG_FORMAT_VERSION = 1
+CURRENT_FILE = "CURRENT"
+MANIFEST_FILE = "manifest.json"
+
+
+def _new_version() -> str:
+    """Sortable by build time; the random suffix keeps builds within one second apart"""
+    return f"{datetime.now(timezone.utc):v%Y%m%d-%H%M%S}-{uuid.uuid4().hex[:8]}"
+
+
+def _encode_strings(values: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+    encoded = [v.encode("utf-8") for v in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(e) for e in encoded], out=offsets[1:])
+    return np.frombuffer(b"".join(encoded), dtype=np.uint8), offsets
+
+
+def _decode_strings(blob: np.ndarray, offsets: np.ndarray) -> List[str]:
+    raw = blob.tobytes()
+    bounds = offsets.tolist()
+    return [raw[a:b].decode("utf-8") for a, b in zip(bounds[:-1], bounds[1:])]
+
+
+class Catalog:
+    """Columnar catalog arrays plus the manifest describing them"""
+
+    def __init__(self, arrays: Dict[str, np.ndarray], manifest: dict, path: Optional[Path] = None):
+        self.arrays = arrays
+        self.manifest = manifest
+        self.path = path
+        self._payload_dicts: Optional[List[dict]] = None
+
+    def __len__(self) -> int:
+        return self.manifest["n_movies"]
+
+    @property
+    def version(self) -> str:
+        return self.manifest["version"]
+
+    @classmethod
+    def from_dataframe(
+        cls,
+        movies_df: pd.DataFrame,
+        neighbors: NeighborIndex,
+        build_info: Optional[dict] = None
+    ) -> "Catalog":
+        """Flatten a preprocessed movies DataFrame into catalog arrays"""
+        movies_df = movies_df.reset_index(drop=True)
+        records = movies_df.to_dict('records')
+        payloads = [format_movie(movie) for movie in records]
+        payload_store = PayloadStore.from_payloads(payloads)
+        search_store = PayloadStore.from_payloads(
+            [{field: p[field] for field in SEARCH_FIELDS} for p in payloads]
+        )
+
+        genre_names = sorted({g for p in payloads for g in p['genres']})
+        genre_to_id = {g: i for i, g in enumerate(genre_names)}
+        genre_lists = [[genre_to_id[g] for g in p['genres']] for p in payloads]
+        genre_indptr = np.zeros(len(genre_lists) + 1, dtype=np.int64)
+        np.cumsum([len(g) for g in genre_lists], out=genre_indptr[1:])
+        genre_ids = np.fromiter(
+            (gid for genres in genre_lists for gid in genres),
+            dtype=np.int16, count=int(genre_indptr[-1])
+        )
+
+        title_blob, title_offsets = _encode_strings([p['title'] for p in payloads])
+        # Older pickles and synthetic catalogs carry no vote counts
+        if 'vote_count' in movies_df:
+            vote_count = pd.to_numeric(movies_df['vote_count'], errors='coerce').to_numpy(dtype=np.float32)
+        else:
+            vote_count = np.full(len(payloads), np.nan, dtype=np.float32)
+
+        arrays = {
+            'movie_id': movies_df['movie_id'].to_numpy(dtype=np.int64),
+            'vote_average': pd.to_numeric(movies_df['vote_average'], errors='coerce').to_numpy(dtype=np.float32),
+            'vote_count': vote_count,
+            'runtime': pd.to_numeric(movies_df['runtime'], errors='coerce').to_numpy(dtype=np.float32),
+            'title_blob': title_blob,
+            'title_offsets': title_offsets,
+            'genre_indptr': genre_indptr,
+            'genre_ids': genre_ids,
+            'neighbor_indptr': neighbors.indptr,
+            'neighbor_indices': neighbors.indices,
+            'neighbor_scores': neighbors.scores,
+            'payload_blob': np.frombuffer(payload_store.blob, dtype=np.uint8),
+            'payload_offsets': payload_store.offsets,
+            'search_payload_blob': np.frombuffer(search_store.blob, dtype=np.uint8),
+            'search_payload_offsets': search_store.offsets,
+        }
+        manifest = {
+            'format_version': CATALOG_FORMAT_VERSION,
+            'version': _new_version(),
+            'n_movies': len(payloads),
+            'top_k': neighbors.top_k,
+            'genres': genre_names,
+            'arrays': sorted(arrays),
+            'build': build_info or {},
+            'aggregates': compute_aggregates(
+                arrays['vote_average'], arrays['runtime'], genre_indptr, genre_ids, genre_names
+            ),
+        }
+        catalog = cls(arrays, manifest)
+        # Keep the already-built dicts so an in-memory catalog skips JSON decoding
+        catalog._payload_dicts = payloads
+        return catalog
+
+    def save(self, root_dir: str) -> Path:
+        """
+        Write a new version directory under root_dir, point CURRENT at it and
+        delete older versions except the one CURRENT pointed at before (for rollback)
+        """
+        root = Path(root_dir)
+        root.mkdir(parents=True, exist_ok=True)
+        if (root / self.version).exists():
+            # Saved before (here or elsewhere): never replace a version readers may have open
+            self.manifest["version"] = _new_version()
+        final_dir = root / self.version
+        tmp_dir = root / f".{self.version}.tmp"
+        if tmp_dir.exists():
+            shutil.rmtree(tmp_dir)
+        tmp_dir.mkdir()
+
+        for name, array in self.arrays.items():
+            np.save(tmp_dir / f"{name}.npy", np.ascontiguousarray(array))
+        with open(tmp_dir / MANIFEST_FILE, "w") as f:
+            json.dump(self.manifest, f, indent=2)
+
+        # Readers only ever see complete version directories
+        os.replace(tmp_dir, final_dir)
+        previous = resolve_catalog_path(str(root)).name if (root / CURRENT_FILE).exists() else None
+        current_tmp = root / f".{CURRENT_FILE}.{os.getpid()}.tmp"
+        current_tmp.write_text(self.version)
+        os.replace(current_tmp, root / CURRENT_FILE)
+
+        self.path = final_dir
+        _prune_versions(root, keep=[self.version, previous])
+        return final_dir
+
+    @classmethod
+    def open(cls, path: str) -> "Catalog":
+        """Memory-map a version directory, or the CURRENT version of a catalog root"""
+        path = resolve_catalog_path(path)
+        with open(path / MANIFEST_FILE) as f:
+            manifest = json.load(f)
+        if manifest.get('format_version') != CATALOG_FORMAT_VERSION:
+            raise ValueError(
+                f"Catalog at {path} has format {manifest.get('format_version')}, "
+                f"expected {CATALOG_FORMAT_VERSION}. Re-run preprocessing."
+            )
+        arrays = {
+            name: np.load(path / f"{name}.npy", mmap_mode='r')
+            for name in manifest['arrays']
+        }
+        return cls(arrays, manifest, path)
+
+    @property
+    def neighbors(self) -> NeighborIndex:
+        return NeighborIndex(
+            self.arrays['neighbor_indptr'],
+            self.arrays['neighbor_indices'],
+            self.arrays['neighbor_scores'],
+        )
+
+    @property
+    def payloads(self) -> PayloadStore:
+        return PayloadStore(
+            self.arrays['payload_blob'],
+            self.arrays['payload_offsets'],
+            self._payload_dicts,
+        )
+
+    @property
+    def search_payloads(self) -> PayloadStore:
+        return PayloadStore(self.arrays['search_payload_blob'], self.arrays['search_payload_offsets'])
+
+    @property
+    def genre_names(self) -> List[str]:
+        return self.manifest['genres']
+
+    @property
+    def aggregates(self) -> dict:
+        """Materialized aggregates; recomputed for artifacts written before they existed"""
+        if 'aggregates' not in self.manifest:
+            self.manifest['aggregates'] = compute_aggregates(
+                self.arrays['vote_average'], self.arrays['runtime'],
+                self.arrays['genre_indptr'], self.arrays['genre_ids'], self.genre_names
+            )
+        return self.manifest['aggregates']
+
+    def titles(self) -> List[str]:
+        return _decode_strings(self.arrays['title_blob'], self.arrays['title_offsets'])
+
+
+def _prune_versions(root: Path, keep: List[Optional[str]]):
+    """Delete every version directory under root whose name is not in keep"""
+    for path in root.iterdir():
+        if path.name in keep or path.name.startswith(".") or not (path / MANIFEST_FILE).exists():
+            continue
+        # Workers still serving it keep their memory maps; unlinked files stay readable
+        try:
+            shutil.rmtree(path)
+        except OSError as e:
+            print(f"[Catalog] Could not remove old version {path.name}: {e}")
+
+
+def resolve_catalog_path(path: str) -> Path:
+    """Follow a catalog root's CURRENT pointer; version directories pass through"""
+    path = Path(path)
+    current = path / CURRENT_FILE
+    if current.exists():
+        return path / current.read_text().strip()
+    return path
+
+
+def catalog_exists(path: str) -> bool:
+    return (resolve_catalog_path(path) / MANIFEST_FILE).exists()
@@ -0,0 +1,102 @@
+"""
+Id lookup and user-vector logic shared by the collaborative models (NCF, MF).
+
+Both keep their trained movie ids sorted, so a batch of ids maps to embedding
+rows with one searchsorted, and both serve users the last training has not
+seen (or who rated more since) by folding them in from their ratings.
+"""
+import numpy as np
+from typing import Dict, List, Optional, Sequence, Tuple
+
+
+class CollaborativeModelMixin:
+    """
+    Expects user_to_idx, _movie_ids (sorted), _user_rating_counts (None for
+    artifacts saved without them), is_trained, MIN_RATINGS, fold_in(),
+    _trained_vector() and _score_matrix().
+    """
+    MIN_RATINGS = 5
+
+    @property
+    def movie_ids(self) -> np.ndarray:
+        """Ids of the movies the model can score"""
+        return self._movie_ids
+
+    def _movie_positions(self, movie_ids: Sequence[int]) -> Tuple[np.ndarray, np.ndarray]:
+        """(known mask, embedding rows of the known ones) for a batch of movie ids"""
+        movie_ids = np.asarray(movie_ids, dtype=np.int64)
+        if len(self._movie_ids) == 0:
+            return np.zeros(len(movie_ids), dtype=bool), np.empty(0, dtype=np.int64)
+        pos = np.searchsorted(self._movie_ids, movie_ids)
+        pos[pos == len(self._movie_ids)] = 0
+        known = self._movie_ids[pos] == movie_ids
+        return known, pos[known]
+
+    def _trained_vector(self, idx: int):
+        raise NotImplementedError
+
+    def _folded_vector(self, user_id: int, ratings: Dict[int, float]):
+        return self.fold_in(ratings)
+
+    def user_vector(self, user_id: int, ratings: Optional[Dict[int, float]] = None):
+        """
+        The trained user vector, or one folded in from ratings when the user
+        is new or has rated more movies since training.
+        """
+        if not self.is_trained:
+            return None
+        idx = self.user_to_idx.get(user_id)
+        if idx is not None and (
+            ratings is None
+            or self._user_rating_counts is None
+            or len(ratings) == self._user_rating_counts[idx]
+        ):
+            return self._trained_vector(idx)
+        if not ratings:
+            return None
+        return self._folded_vector(user_id, ratings)
+
+    def _score_matrix(self, vectors: list) -> np.ndarray:
+        raise NotImplementedError
+
+    def score_users(
+        self,
+        user_ids: Sequence[int],
+        ratings: Dict[int, Dict[int, float]],
+    ) -> Tuple[List[int], np.ndarray]:
+        """
+        (the users the model can score, their (users, movie_ids) score
+        matrix): trained or folded-in vectors stacked, so the catalog is
+        scored for all of them at once
+        """
+        scored, vectors = [], []
+        for user_id in user_ids:
+            user_ratings = ratings.get(user_id)
+            if not self.is_ready_for_user(user_id, user_ratings):
+                continue
+            vector = self.user_vector(user_id, user_ratings)
+            if vector is not None:
+                scored.append(user_id)
+                vectors.append(vector)
+        if not scored:
+            return [], np.empty((0, len(self._movie_ids)), dtype=np.float32)
+        return scored, self._score_matrix(vectors)
+
+    def retrieve(self, user_id: int, n: int, ratings: Optional[Dict[int, float]] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        (movie_ids, scores) of about the n movies the model scores highest for
+        the user, best first, found without scoring the whole catalog; empty
+        for models without a retrieval index
+        """
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+    def is_ready_for_user(self, user_id: int, ratings: Optional[Dict[int, float]] = None) -> bool:
+        """Trained on this user, or (given their ratings) able to fold them in"""
+        if not self.is_trained:
+            return False
+        if user_id in self.user_to_idx:
+            return True
+        if not ratings or len(ratings) < self.MIN_RATINGS:
+            return False
+        known, _ = self._movie_positions(list(ratings))
+        return int(known.sum()) >= self.MIN_RATINGS
@@ -0,0 +1,73 @@
+import numpy as np
+from typing import Dict, List, Optional
+
+# Genre bitmasks are uint64, one bit per genre id (TMDB has about 20 genres)
+MAX_GENRES = 64
+
+
+def genre_bitmasks(genre_indptr: np.ndarray, genre_ids: np.ndarray) -> np.ndarray:
+    """One uint64 per movie with bit g set for every genre id g in its CSR slice"""
+    n_movies = len(genre_indptr) - 1
+    masks = np.zeros(n_movies, dtype=np.uint64)
+    if len(genre_ids) == 0:
+        return masks
+    if int(np.max(genre_ids)) >= MAX_GENRES:
+        raise ValueError(f"At most {MAX_GENRES} genres fit in a bitmask")
+    rows = np.repeat(np.arange(n_movies), np.diff(genre_indptr))
+    bits = np.left_shift(np.uint64(1), np.asarray(genre_ids, dtype=np.uint64))
+    np.bitwise_or.at(masks, rows, bits)
+    return masks
+
+
+class GenreIndex:
+    """Per-movie genre bitmasks plus the genre name -> bit vocabulary"""
+
+    def __init__(self, genre_names: List[str], masks: np.ndarray):
+        self.genre_names = genre_names
+        self.masks = masks
+        self._bit_of = {name: i for i, name in enumerate(genre_names)}
+
+    def mask_for(self, genres: List[str]) -> int:
+        """Bitmask of the given genre names; names not in the catalog are ignored"""
+        mask = 0
+        for genre in genres:
+            bit = self._bit_of.get(genre)
+            if bit is not None:
+                mask |= 1 << bit
+        return mask
+
+    def ids_for(self, genres: List[str]) -> np.ndarray:
+        """Genre ids of the given names; names not in the catalog are ignored"""
+        return np.array([self._bit_of[g] for g in genres if g in self._bit_of], dtype=np.int64)
+
+    def rows_with_any(self, genres: List[str]) -> np.ndarray:
+        """Rows that have at least one of the given genres, in catalog order"""
+        mask = np.uint64(self.mask_for(genres))
+        return np.flatnonzero(self.masks & mask)
+
+
+class MoodPools:
+    """
+    For each mood, the rows having any of its genres sorted by rating (best
+    first, unrated last). Built once at load so a mood request only samples.
+    """
+
+    def __init__(self, genre_index: GenreIndex, ratings: np.ndarray, mood_genres: Dict[str, List[str]]):
+        ratings = np.asarray(ratings, dtype=np.float64)
+        self.pools: Dict[str, np.ndarray] = {}
+        for mood, genres in mood_genres.items():
+            rows = genre_index.rows_with_any(genres)
+            # NaN sorts last, like sort_values(ascending=False)
+            order = np.argsort(-ratings[rows], kind="stable")
+            self.pools[mood] = rows[order]
+
+    def __contains__(self, mood: str) -> bool:
+        return mood in self.pools
+
+    def sample(self, mood: str, n: int, oversample: int = 3, rng: Optional[np.random.Generator] = None) -> np.ndarray:
+        """n random rows from the top n * oversample of the mood's pool"""
+        pool = self.pools[mood][:n * oversample]
+        if len(pool) == 0:
+            return pool
+        rng = rng or np.random.default_rng()
+        return rng.choice(pool, size=min(n, len(pool)), replace=False)
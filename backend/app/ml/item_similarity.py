@@ -0,0 +1,149 @@
+"""
+Item-item collaborative similarity from MovieRating, maintained incrementally.
+
+The co-rating matrix lives in the database as a sparse matrix in coordinate
+form (MovieCoRating, both directions) plus its diagonal (MovieRatingStats).
+Each rating write folds its change into those sums inside the same
+transaction, touching one row pair per other movie the user rated, so no
+recompute is needed and every worker reads the same, current numbers.
+Similarity is the cosine of centered ratings, shrunk toward zero for pairs
+few users rated together.
+
+Run ``python -m app.ml.item_similarity`` once to build the tables from the
+existing ratings.
+"""
+import numpy as np
+from scipy.sparse import csr_matrix, triu
+from sqlalchemy.orm import Session
+from typing import Optional, Tuple
+
+from app.database import upsert_add
+from app.models_db import MovieCoRating, MovieRating, MovieRatingStats
+
+# Ratings (1-10) are centered here, so a liked movie counts for and a
+# disliked one against the similarity of every movie co-rated with it
+RATING_CENTER = 5.5
+# Pairs rated by fewer users together are not served
+MIN_CO_RATINGS = 2
+# similarity *= co_count / (co_count + SIMILARITY_SHRINKAGE)
+SIMILARITY_SHRINKAGE = 10.0
+REBUILD_BATCH_SIZE = 10_000
+
+
+def record_rating_change(
+    db: Session,
+    user_id: int,
+    movie_id: int,
+    old_rating: Optional[float],
+    new_rating: Optional[float],
+):
+    """
+    Fold one rating write (old None: created, new None: deleted) into the
+    co-rating sums, in the caller's transaction. Cost is O(user's ratings).
+
+    The caller must first have bumped the user's profile version in the same
+    transaction (bump_profile_version): that upsert locks the user's version
+    row until commit, so two writes for one user never run side by side, and
+    each one reads the user's other ratings, and old_rating, only after the
+    previous write committed. Without it, concurrent writes miss each other's
+    rating and the sums drift from a rebuild.
+    """
+    old_weight = 0.0 if old_rating is None else old_rating - RATING_CENTER
+    new_weight = 0.0 if new_rating is None else new_rating - RATING_CENTER
+    count_change = (new_rating is not None) - (old_rating is not None)
+    weight_change = new_weight - old_weight
+    if count_change == 0 and weight_change == 0:
+        return
+
+    upsert_add(db, MovieRatingStats, ["movie_id"], [{
+        "movie_id": movie_id,
+        "sum_sq": new_weight ** 2 - old_weight ** 2,
+        "rating_count": count_change,
+    }])
+
+    others = (
+        db.query(MovieRating.movie_id, MovieRating.rating)
+        .filter(MovieRating.user_id == user_id, MovieRating.movie_id != movie_id)
+        .all()
+    )
+    pairs = []
+    for other_id, rating in others:
+        dot = weight_change * (rating - RATING_CENTER)
+        pairs.append({"movie_id": movie_id, "other_movie_id": other_id, "dot": dot, "co_count": count_change})
+        pairs.append({"movie_id": other_id, "other_movie_id": movie_id, "dot": dot, "co_count": count_change})
+    upsert_add(db, MovieCoRating, ["movie_id", "other_movie_id"], pairs)
+
+    if count_change < 0:
+        # Drop pairs no user rates together any more
+        db.query(MovieCoRating).filter(
+            (MovieCoRating.movie_id == movie_id) | (MovieCoRating.other_movie_id == movie_id),
+            MovieCoRating.co_count <= 0,
+        ).delete(synchronize_session=False)
+
+
+def co_rating_similarities(db: Session, movie_id: int) -> Tuple[np.ndarray, np.ndarray]:
+    """(movie ids, similarities) of every movie co-rated with movie_id by at least MIN_CO_RATINGS users"""
+    own = db.get(MovieRatingStats, movie_id)
+    rows = (
+        db.query(MovieCoRating.other_movie_id, MovieCoRating.dot, MovieCoRating.co_count, MovieRatingStats.sum_sq)
+        .join(MovieRatingStats, MovieRatingStats.movie_id == MovieCoRating.other_movie_id)
+        .filter(MovieCoRating.movie_id == movie_id, MovieCoRating.co_count >= MIN_CO_RATINGS)
+        .all()
+    )
+    if own is None or own.sum_sq <= 0 or not rows:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+    other_ids, dots, counts, sum_sq = (np.array(column) for column in zip(*rows))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        cosine = dots / np.sqrt(own.sum_sq * sum_sq)
+    similarity = np.nan_to_num(cosine, nan=0.0, posinf=0.0, neginf=0.0) * counts / (counts + SIMILARITY_SHRINKAGE)
+    return other_ids.astype(np.int64), similarity.astype(np.float32)
+
+
+def rebuild_item_similarity(db: Session):
+    """Recompute both tables from every rating (sparse W^T W), replacing their contents"""
+    from app.ml.ratings_loader import load_rating_arrays
+
+    ratings = load_rating_arrays(db)
+    movie_ids, movie_idx = np.unique(ratings.movie_ids, return_inverse=True)
+    _, user_idx = np.unique(ratings.user_ids, return_inverse=True)
+    shape = (int(user_idx.max()) + 1 if len(user_idx) else 0, len(movie_ids))
+    weights = csr_matrix((ratings.ratings.astype(np.float64) - RATING_CENTER, (user_idx, movie_idx)), shape=shape)
+    rated = csr_matrix((np.ones(len(ratings)), (user_idx, movie_idx)), shape=shape)
+
+    # Upper triangle of the co-count structure only; each pair is written in
+    # both directions below (a pair's dot may be 0, so it cannot drive this)
+    pairs_coo = triu(rated.T @ rated, k=1).tocoo()
+    gram = (weights.T @ weights).tocsr()
+    dots = np.asarray(gram[pairs_coo.row, pairs_coo.col]).ravel()
+
+    db.query(MovieCoRating).delete(synchronize_session=False)
+    db.query(MovieRatingStats).delete(synchronize_session=False)
+    sum_sq = np.asarray(weights.multiply(weights).sum(axis=0)).ravel()
+    rating_counts = np.diff(rated.tocsc().indptr)
+    db.bulk_insert_mappings(MovieRatingStats, [
+        {"movie_id": int(m), "sum_sq": float(s), "rating_count": int(c)}
+        for m, s, c in zip(movie_ids, sum_sq, rating_counts)
+    ])
+
+    for start in range(0, len(pairs_coo.row), REBUILD_BATCH_SIZE):
+        batch = slice(start, start + REBUILD_BATCH_SIZE)
+        pairs = []
+        for a, b, dot, count in zip(pairs_coo.row[batch], pairs_coo.col[batch], dots[batch], pairs_coo.data[batch]):
+            a, b = int(movie_ids[a]), int(movie_ids[b])
+            pairs.append({"movie_id": a, "other_movie_id": b, "dot": float(dot), "co_count": int(count)})
+            pairs.append({"movie_id": b, "other_movie_id": a, "dot": float(dot), "co_count": int(count)})
+        db.bulk_insert_mappings(MovieCoRating, pairs)
+    db.commit()
+    print(f"[ItemSim] Rebuilt from {len(ratings)} ratings: {len(movie_ids)} movies, {len(pairs_coo.row)} co-rated pairs.")
+
+
+if __name__ == "__main__":
+    from app.database import SessionLocal, init_db
+
+    init_db()
+    session = SessionLocal()
+    try:
+        rebuild_item_similarity(session)
+    finally:
+        session.close()
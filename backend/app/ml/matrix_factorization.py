@@ -0,0 +1,345 @@
+"""
+Biased matrix factorization trained by alternating least squares.
+
+A TensorFlow-free alternative to the NCF model: the rating of user u for
+movie i is predicted as mean + b_u + b_i + p_u . q_i. Each ALS half-step
+solves every user's (or movie's) regularized least-squares problem exactly:
+rows with similar rating counts are padded into blocks whose normal
+equations come from one batched matmul (BLAS) and one batched LAPACK
+solve, and blocks run on a thread pool, since NumPy releases the GIL.
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from scipy.sparse import csr_matrix
+
+from app.ml.ann import IVFIndex
+from app.ml.artifacts import ArtifactSlot, file_version, load_npz, save_npz
+from app.ml.collaborative import CollaborativeModelMixin
+from app.ml.neighbors import top_n_indices
+
+MIN_RATINGS_FOR_MF = 5
+MF_FACTORS = 32
+ALS_ITERATIONS = 15
+# Weighted-lambda regularization: each row's penalty scales with its rating count
+ALS_REGULARIZATION = 0.1
+# Padded rating cells per block of rows solved at once
+ALS_BLOCK_RATINGS = 16_384
+ALS_THREADS = min(8, os.cpu_count() or 1)
+# retrieve() probes enough lists of the movie factor index to hold about
+# this many times the requested number of movies
+RETRIEVAL_OVERSAMPLE = 8
+
+_FACTORS_PATH = Path(__file__).parent / "mf_factors.npz"
+
+
+def factors_version() -> Optional[int]:
+    """Modification time of the published factors file, or None if there is none"""
+    return file_version(_FACTORS_PATH)
+
+
+def _solve_block(R: csr_matrix, rows: np.ndarray, features: np.ndarray, reg: float, out: np.ndarray):
+    """Least-squares [factors, bias] of the given rows of R (residual targets) into out"""
+    counts = np.diff(R.indptr)[rows]
+    width = int(counts.max())
+    # The rows' ratings as a zero-padded (rows, width) block, so every Gram
+    # matrix comes out of one batched matmul
+    offsets = np.arange(width)
+    valid = offsets < counts[:, None]
+    positions = np.where(valid, R.indptr[rows][:, None] + offsets, 0)
+    f = features[R.indices[positions]] * valid[:, :, None]
+    targets = R.data[positions] * valid
+
+    k = features.shape[1]
+    gram = f.transpose(0, 2, 1) @ f
+    gram += (reg * np.maximum(counts, 1))[:, None, None] * np.eye(k)
+    rhs = f.transpose(0, 2, 1) @ targets[:, :, None]
+    out[rows] = np.linalg.solve(gram, rhs)[:, :, 0]
+
+
+def _row_blocks(R: csr_matrix) -> List[np.ndarray]:
+    """
+    Rows grouped by similar rating counts (sorted), each group padding to at
+    most about ALS_BLOCK_RATINGS cells, so padding wastes little work
+    """
+    counts = np.diff(R.indptr)
+    order = np.argsort(counts, kind="stable")
+    order = order[counts[order] > 0]
+    blocks = []
+    start = 0
+    while start < len(order):
+        # Sorted ascending, so the block's width is the count of its last row
+        end = start + 1
+        while end < len(order) and (end + 1 - start) * counts[order[end]] <= ALS_BLOCK_RATINGS:
+            end += 1
+        blocks.append(order[start:end])
+        start = end
+    return blocks
+
+
+def _als_half_step(
+    R: csr_matrix,
+    blocks: List[np.ndarray],
+    fixed: np.ndarray,
+    fixed_bias: np.ndarray,
+    global_mean: float,
+    reg: float,
+    pool: Optional[ThreadPoolExecutor],
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Solve every row of R given the other side's fixed factors and biases.
+    Targets are ratings minus the global mean and the fixed side's bias; the
+    row's own bias is an extra factor paired with a constant 1 feature.
+    """
+    residual = csr_matrix(
+        (R.data - global_mean - fixed_bias[R.indices], R.indices, R.indptr), shape=R.shape
+    )
+    features = np.hstack([fixed, np.ones((len(fixed), 1))])
+    out = np.zeros((R.shape[0], features.shape[1]))
+    if pool is None:
+        for rows in blocks:
+            _solve_block(residual, rows, features, reg, out)
+    else:
+        list(pool.map(lambda rows: _solve_block(residual, rows, features, reg, out), blocks))
+    return out[:, :-1], out[:, -1]
+
+
+class MatrixFactorization(CollaborativeModelMixin):
+    MIN_RATINGS = MIN_RATINGS_FOR_MF
+
+    def __init__(self, factors: int = MF_FACTORS, load: bool = True):
+        self.factors = factors
+        # factors_version() of the file these factors were loaded from
+        self.version: Optional[int] = None
+        self.user_to_idx: Dict[int, int] = {}
+        # Trained ids in factor order (sorted), for vectorized id -> row lookup
+        self._user_ids = np.empty(0, dtype=np.int64)
+        self._movie_ids = np.empty(0, dtype=np.int64)
+        self.user_factors = np.empty((0, factors), dtype=np.float32)
+        self.movie_factors = np.empty((0, factors), dtype=np.float32)
+        self.user_bias = np.empty(0, dtype=np.float32)
+        self.movie_bias = np.empty(0, dtype=np.float32)
+        self.global_mean = 0.0
+        self._user_rating_counts: Optional[np.ndarray] = None
+        # IVF index over the movie factors, for retrieve()
+        self._movie_index: Optional[IVFIndex] = None
+        self.is_trained = False
+        if load:
+            self._load_if_exists()
+
+    def train(
+        self,
+        ratings,
+        iterations: int = ALS_ITERATIONS,
+        reg: float = ALS_REGULARIZATION,
+        threads: int = ALS_THREADS,
+        seed: int = 0,
+        save: bool = True,
+        progress: Optional[Callable[[int, int, dict], None]] = None,
+    ) -> bool:
+        """
+        Fit on all ratings (a RatingArrays, or a list of {"user_id", "movie_id",
+        "rating"} dicts) and publish the factors unless save is False;
+        progress(iteration, iterations, {"loss": training MSE}) runs after
+        each iteration.
+        """
+        if isinstance(ratings, list):
+            from app.ml.ratings_loader import RatingArrays
+            ratings = RatingArrays.from_records(ratings)
+
+        if len(ratings) < MIN_RATINGS_FOR_MF:
+            print(f"[MF] Need {MIN_RATINGS_FOR_MF} ratings to train, have {len(ratings)}.")
+            return False
+
+        user_ids, user_idx = np.unique(ratings.user_ids, return_inverse=True)
+        movie_ids, movie_idx = np.unique(ratings.movie_ids, return_inverse=True)
+        values = ratings.ratings.astype(np.float64)
+        R = csr_matrix((values, (user_idx, movie_idx)), shape=(len(user_ids), len(movie_ids)))
+        Rt = R.T.tocsr()
+        global_mean = float(R.data.mean())
+
+        rng = np.random.default_rng(seed)
+        movie_factors = rng.normal(0.0, 0.1, size=(len(movie_ids), self.factors))
+        movie_bias = np.zeros(len(movie_ids))
+        user_blocks, movie_blocks = _row_blocks(R), _row_blocks(Rt)
+        pool = ThreadPoolExecutor(threads) if threads > 1 else None
+        try:
+            for iteration in range(iterations):
+                user_factors, user_bias = _als_half_step(
+                    R, user_blocks, movie_factors, movie_bias, global_mean, reg, pool
+                )
+                movie_factors, movie_bias = _als_half_step(
+                    Rt, movie_blocks, user_factors, user_bias, global_mean, reg, pool
+                )
+                if progress:
+                    rows = np.repeat(np.arange(R.shape[0]), np.diff(R.indptr))
+                    predicted = (
+                        global_mean + user_bias[rows] + movie_bias[R.indices]
+                        + np.einsum("ij,ij->i", user_factors[rows], movie_factors[R.indices])
+                    )
+                    progress(iteration + 1, iterations, {"loss": float(np.mean((predicted - R.data) ** 2))})
+        finally:
+            if pool is not None:
+                pool.shutdown()
+
+        self._user_ids = user_ids.astype(np.int64)
+        self._movie_ids = movie_ids.astype(np.int64)
+        self.user_to_idx = dict(zip(self._user_ids.tolist(), range(len(user_ids))))
+        self.user_factors = user_factors.astype(np.float32)
+        self.movie_factors = movie_factors.astype(np.float32)
+        self.user_bias = user_bias.astype(np.float32)
+        self.movie_bias = movie_bias.astype(np.float32)
+        self.global_mean = global_mean
+        self._user_rating_counts = np.diff(R.indptr)
+        self._index_movies()
+        self.is_trained = True
+        if save:
+            self._save()
+        print(f"[MF] Trained on {len(ratings)} ratings ({len(user_ids)} users, {len(movie_ids)} movies).")
+        return True
+
+    def _index_movies(self):
+        """
+        Fit the IVF index over [movie factors, movie bias]. Rows are scaled
+        by the largest norm and padded with one coordinate to unit length, so
+        their cosine to [user factors, 1, 0] orders movies as the predicted
+        rating does (maximum inner product search as nearest neighbors).
+        """
+        if len(self._movie_ids) == 0:
+            self._movie_index = None
+            return
+        items = np.hstack([self.movie_factors, self.movie_bias[:, None]]).astype(np.float32)
+        norms = np.linalg.norm(items, axis=1)
+        scale = float(norms.max()) or 1.0
+        pad = np.sqrt(np.maximum(1.0 - (norms / scale) ** 2, 0.0))
+        self._movie_index = IVFIndex().fit(np.hstack([items / scale, pad[:, None]]))
+
+    def fold_in(self, ratings: Dict[int, float], reg: float = ALS_REGULARIZATION) -> Optional[Tuple[np.ndarray, float]]:
+        """
+        (factors, bias) for a user from {movie_id: rating} alone: the same
+        least-squares solve as a training half-step, against the frozen movie
+        factors. None if fewer than MIN_RATINGS_FOR_MF rated movies are known.
+        """
+        if not self.is_trained:
+            return None
+        known, rows = self._movie_positions(list(ratings))
+        if len(rows) < MIN_RATINGS_FOR_MF:
+            return None
+        targets = np.fromiter(ratings.values(), dtype=np.float64, count=len(ratings))[known]
+        features = np.hstack([self.movie_factors[rows], np.ones((len(rows), 1), dtype=np.float32)]).astype(np.float64)
+        residual = targets - self.global_mean - self.movie_bias[rows]
+        gram = features.T @ features + reg * len(rows) * np.eye(features.shape[1])
+        solution = np.linalg.solve(gram, features.T @ residual)
+        return solution[:-1].astype(np.float32), float(solution[-1])
+
+    def _trained_vector(self, idx: int) -> Tuple[np.ndarray, float]:
+        return self.user_factors[idx], float(self.user_bias[idx])
+
+    def _score_matrix(self, vectors: List[Tuple[np.ndarray, float]]) -> np.ndarray:
+        """Predicted ratings of every movie for a batch of (factors, bias) user vectors"""
+        factors = np.stack([factors for factors, _ in vectors])
+        biases = np.array([bias for _, bias in vectors])
+        scores = factors @ self.movie_factors.T + self.movie_bias + (self.global_mean + biases)[:, None]
+        return scores.astype(np.float32)
+
+    def score_candidates(
+        self,
+        user_id: int,
+        candidate_movie_ids: Sequence[int],
+        ratings: Optional[Dict[int, float]] = None,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """(movie_ids, predicted ratings) for the candidates the model knows"""
+        empty = (np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32))
+        user = self.user_vector(user_id, ratings)
+        if user is None:
+            return empty
+        user_vec, user_bias = user
+
+        candidates = np.asarray(candidate_movie_ids, dtype=np.int64)
+        known, rows = self._movie_positions(candidates)
+        if not known.any():
+            return empty
+        scores = self.movie_factors[rows] @ user_vec + self.movie_bias[rows] + (self.global_mean + user_bias)
+        return candidates[known], scores.astype(np.float32)
+
+    def retrieve(self, user_id: int, n: int, ratings: Optional[Dict[int, float]] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        (movie_ids, predicted ratings) of about the n movies the model rates
+        highest for the user, best first. Only the movies in the probed lists
+        of the factor index are scored, so the cost follows n and the number
+        of lists rather than the catalog size.
+        """
+        empty = (np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32))
+        index = self._movie_index
+        user = self.user_vector(user_id, ratings)
+        if user is None or index is None:
+            return empty
+        user_vec, user_bias = user
+
+        mean_list_size = len(self._movie_ids) / index.n_lists
+        n_probe = max(index.n_probe, int(np.ceil(RETRIEVAL_OVERSAMPLE * n / mean_list_size)))
+        rows = index.probe(np.append(user_vec, [1.0, 0.0]), n_probe)
+        scores = self.movie_factors[rows] @ user_vec + self.movie_bias[rows] + (self.global_mean + user_bias)
+        top = top_n_indices(scores, n)
+        return self._movie_ids[rows[top]], scores[top].astype(np.float32)
+
+    def warm_up(self):
+        """Score the whole catalog once, so the first request after a swap runs hot"""
+        if self.is_trained and len(self.user_factors):
+            self.movie_factors @ self.user_factors[0]
+
+    def _save(self):
+        try:
+            save_npz(
+                _FACTORS_PATH,
+                user_ids=self._user_ids,
+                movie_ids=self._movie_ids,
+                user_factors=self.user_factors,
+                movie_factors=self.movie_factors,
+                user_bias=self.user_bias,
+                movie_bias=self.movie_bias,
+                global_mean=np.float64(self.global_mean),
+                user_rating_counts=self._user_rating_counts,
+            )
+            self.version = factors_version()
+        except Exception as e:
+            print(f"[MF] Save failed: {e}")
+
+    def _load_if_exists(self):
+        try:
+            # Recorded up front so a file that fails to load is not retried on every request
+            version = self.version = factors_version()
+            if version is None:
+                return
+            data = load_npz(_FACTORS_PATH)
+            self._user_ids = data["user_ids"]
+            self._movie_ids = data["movie_ids"]
+            self.user_factors = data["user_factors"]
+            self.movie_factors = data["movie_factors"]
+            self.user_bias = data["user_bias"]
+            self.movie_bias = data["movie_bias"]
+            self.global_mean = float(data["global_mean"])
+            self._user_rating_counts = data["user_rating_counts"]
+            self.factors = self.user_factors.shape[1]
+            self.user_to_idx = dict(zip(self._user_ids.tolist(), range(len(self._user_ids))))
+            self._index_movies()
+            self.is_trained = True
+            print(f"[MF] Loaded factors ({len(self._user_ids)} users, {len(self._movie_ids)} movies).")
+        except Exception as e:
+            print(f"[MF] Could not load saved factors: {e}")
+
+
+_mf_slot = ArtifactSlot(
+    "mf",
+    version=factors_version,
+    load=MatrixFactorization,
+    warm=lambda model: model.warm_up(),
+)
+
+
+def get_mf_model() -> MatrixFactorization:
+    """The serving model, swapped for a warmed-up fresh instance when new factors are published"""
+    return _mf_slot.get()
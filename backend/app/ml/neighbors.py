@@ -0,0 +1,220 @@
+import os
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Optional, Tuple
+
+DEFAULT_TOP_K = 50
+DEFAULT_BLOCK_SIZE = 1024
+
+
+def top_n_indices(scores: np.ndarray, n: int) -> np.ndarray:
+    """Indices of the n largest scores, best first, via partial selection"""
+    n = min(n, len(scores))
+    if n <= 0:
+        return np.empty(0, dtype=np.int64)
+    if n < len(scores):
+        # Sorted so equal scores come out in index order
+        top = np.sort(np.argpartition(scores, -n)[-n:])
+    else:
+        top = np.arange(len(scores))
+    return top[np.argsort(-scores[top], kind="stable")]
+
+
+def top_n_per_row(scores: np.ndarray, n: int) -> np.ndarray:
+    """(rows, n) column indices of each row's n largest scores, best first"""
+    n_rows, n_cols = scores.shape
+    n = min(n, n_cols)
+    if n <= 0:
+        return np.empty((n_rows, 0), dtype=np.int64)
+    if n < n_cols:
+        # Sorted so equal scores come out in column order, as in top_n_indices
+        top = np.sort(np.argpartition(scores, -n, axis=1)[:, -n:], axis=1)
+    else:
+        top = np.tile(np.arange(n_cols), (n_rows, 1))
+    order = np.argsort(-np.take_along_axis(scores, top, axis=1), axis=1, kind="stable")
+    return np.take_along_axis(top, order, axis=1)
+
+
+class NeighborIndex:
+    """
+    Per-movie top-K content neighbors in CSR layout.
+
+    Row ``i`` owns ``indices[indptr[i]:indptr[i + 1]]`` (neighbor row numbers)
+    and the matching ``scores`` slice, both sorted by descending similarity
+    with the movie itself excluded. Memory grows as N * K instead of N * N.
+    """
+
+    def __init__(self, indptr: np.ndarray, indices: np.ndarray, scores: np.ndarray):
+        self.indptr = indptr
+        self.indices = indices
+        self.scores = scores
+
+    def __len__(self) -> int:
+        return len(self.indptr) - 1
+
+    @property
+    def top_k(self) -> int:
+        if len(self) == 0:
+            return 0
+        return int(np.max(np.diff(self.indptr)))
+
+    @property
+    def nbytes(self) -> int:
+        return self.indptr.nbytes + self.indices.nbytes + self.scores.nbytes
+
+    def neighbors(self, row: int, n: int = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Return (neighbor rows, scores) for a movie row, best first"""
+        start, end = self.indptr[row], self.indptr[row + 1]
+        if n is not None:
+            end = min(end, start + n)
+        return self.indices[start:end], self.scores[start:end]
+
+    def aggregate_sparse(self, rows, weights) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Weighted sum of several movies' neighbor lists: (neighbor rows, summed
+        scores) over just the movies the seeds list, so the cost follows
+        seeds * K rather than the catalog size.
+
+        Each seed row contributes ``weight * score`` to every neighbor it lists,
+        in a single bincount over the concatenated neighbor slices.
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        weights = np.asarray(weights, dtype=np.float32)
+        starts, ends = self.indptr[rows], self.indptr[rows + 1]
+        lengths = ends - starts
+        if lengths.sum() == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+        # Positions of every neighbor entry of every seed, without a Python loop
+        positions = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+        contributions = self.scores[positions] * np.repeat(weights, lengths)
+        unique_rows, inverse = np.unique(self.indices[positions], return_inverse=True)
+        summed = np.bincount(inverse, weights=contributions, minlength=len(unique_rows))
+        return unique_rows.astype(np.int64), summed.astype(np.float32)
+
+    def aggregate(self, rows, weights) -> np.ndarray:
+        """aggregate_sparse scattered into one dense score vector over the catalog"""
+        scores = np.zeros(len(self), dtype=np.float32)
+        neighbor_rows, summed = self.aggregate_sparse(rows, weights)
+        scores[neighbor_rows] = summed
+        return scores
+
+    @classmethod
+    def from_dense_rows(cls, sim_rows: np.ndarray, row_offset: int, top_k: int) -> "NeighborIndex":
+        """Keep the top_k entries of each row of a (block of a) similarity matrix"""
+        sim_rows = np.array(sim_rows, dtype=np.float32)
+        n_rows, n_cols = sim_rows.shape
+        k = min(top_k, max(n_cols - 1, 0))
+
+        # Never recommend a movie as its own neighbor
+        sim_rows[np.arange(n_rows), row_offset + np.arange(n_rows)] = -np.inf
+
+        if 0 < k < n_cols:
+            top = np.argpartition(sim_rows, -k, axis=1)[:, -k:]
+        else:
+            top = np.tile(np.arange(n_cols), (n_rows, 1))[:, :k]
+        top_scores = np.take_along_axis(sim_rows, top, axis=1)
+        order = np.argsort(-top_scores, axis=1, kind="stable")
+
+        indices = np.take_along_axis(top, order, axis=1).astype(np.int32)
+        scores = np.take_along_axis(top_scores, order, axis=1)
+        indptr = np.arange(0, (n_rows + 1) * k, k, dtype=np.int64) if k else np.zeros(n_rows + 1, dtype=np.int64)
+        return cls(indptr, indices.ravel(), scores.ravel())
+
+    @classmethod
+    def from_dense(cls, cosine_sim: np.ndarray, top_k: int = DEFAULT_TOP_K) -> "NeighborIndex":
+        """Build from a full N x N similarity matrix (legacy movie_data.pkl)"""
+        return cls.from_dense_rows(cosine_sim, 0, top_k)
+
+    @classmethod
+    def concatenate(cls, parts) -> "NeighborIndex":
+        """Stack per-block indexes (in row order) into one"""
+        parts = list(parts)
+        offsets = np.cumsum([0] + [len(p.indices) for p in parts[:-1]])
+        indptr = np.concatenate(
+            [np.zeros(1, dtype=np.int64)] +
+            [p.indptr[1:] + off for p, off in zip(parts, offsets)]
+        )
+        indices = np.concatenate([p.indices for p in parts])
+        scores = np.concatenate([p.scores for p in parts])
+        return cls(indptr, indices, scores)
+
+
+# A block scorer takes (source, start, end, top_k) and returns the NeighborIndex
+# of rows [start, end); it must be a module-level function so workers can unpickle it
+BlockScorer = Callable[[object, int, int, int], NeighborIndex]
+
+# Set once per worker process so the source (TF-IDF matrix, ANN index) is not re-pickled per block
+_worker_source = None
+_worker_score_block: Optional[BlockScorer] = None
+_worker_top_k = DEFAULT_TOP_K
+
+
+def _init_worker(source, score_block: BlockScorer, top_k: int):
+    global _worker_source, _worker_score_block, _worker_top_k
+    _worker_source = source
+    _worker_score_block = score_block
+    _worker_top_k = top_k
+
+
+def _build_block(bounds: Tuple[int, int]) -> NeighborIndex:
+    start, end = bounds
+    return _worker_score_block(_worker_source, start, end, _worker_top_k)
+
+
+def build_in_blocks(
+    source,
+    n_rows: int,
+    score_block: BlockScorer,
+    top_k: int = DEFAULT_TOP_K,
+    block_size: int = DEFAULT_BLOCK_SIZE,
+    n_jobs: Optional[int] = None,
+) -> NeighborIndex:
+    """
+    Run score_block over row blocks of ``block_size`` and stack the results.
+    Blocks are spread over ``n_jobs`` processes (default: all cores, 1 runs
+    in-process), each of which receives ``source`` once.
+    """
+    blocks = [(start, min(start + block_size, n_rows)) for start in range(0, n_rows, block_size)]
+    n_jobs = n_jobs or os.cpu_count() or 1
+    n_jobs = min(n_jobs, len(blocks)) or 1
+
+    if n_jobs == 1:
+        _init_worker(source, score_block, top_k)
+        parts = [_build_block(b) for b in blocks]
+    else:
+        with ProcessPoolExecutor(
+            max_workers=n_jobs,
+            initializer=_init_worker,
+            initargs=(source, score_block, top_k),
+        ) as pool:
+            parts = list(pool.map(_build_block, blocks))
+
+    if not parts:
+        return NeighborIndex(np.zeros(1, dtype=np.int64), np.empty(0, dtype=np.int32), np.empty(0, dtype=np.float32))
+    return NeighborIndex.concatenate(parts)
+
+
+def exact_block(tfidf_matrix, start: int, end: int, top_k: int) -> NeighborIndex:
+    """Exact top-K of rows [start, end) against the whole catalog"""
+    # TF-IDF rows are L2-normalised, so the dot product is the cosine similarity
+    block = tfidf_matrix[start:end] @ tfidf_matrix.T
+    block = block.toarray() if hasattr(block, "toarray") else np.asarray(block)
+    return NeighborIndex.from_dense_rows(block, start, top_k)
+
+
+def build_neighbor_index(
+    tfidf_matrix,
+    top_k: int = DEFAULT_TOP_K,
+    block_size: int = DEFAULT_BLOCK_SIZE,
+    n_jobs: Optional[int] = None,
+) -> NeighborIndex:
+    """
+    Build the top-K neighbor index without materializing the N x N matrix.
+
+    Rows are multiplied against the whole catalog in blocks of ``block_size``,
+    so peak memory per worker is on the order of ``block_size * N * 4`` bytes
+    regardless of catalog size.
+    """
+    tfidf_matrix = tfidf_matrix.astype(np.float32)
+    return build_in_blocks(tfidf_matrix, tfidf_matrix.shape[0], exact_block, top_k, block_size, n_jobs)
@@ -1,7 +1,11 @@
 import numpy as np
 import json
+from collections import OrderedDict
 from pathlib import Path
-from typing import List, Dict, Optional
+from typing import Callable, List, Dict, Optional, Sequence, Tuple
+
+from app.ml.artifacts import ArtifactSlot, file_version, load_npz, save_npz
+from app.ml.collaborative import CollaborativeModelMixin
 
 MIN_RATINGS_FOR_NCF = 5
 EMBEDDING_DIM = 32
@@ -9,17 +13,59 @@ EPOCHS = 20
 BATCH_SIZE = 32
 
 _MODEL_PATH = Path(__file__).parent / "ncf_model.keras"
+# Only read to convert models saved before ncf_weights.npz carried the id mappings
 _MAPPINGS_PATH = Path(__file__).parent / "ncf_mappings.json"
+# Embeddings, dense weights and id mappings for the NumPy forward pass, in one
+# file so a new model is published with a single atomic rename
+_WEIGHTS_PATH = Path(__file__).parent / "ncf_weights.npz"
+# Weight names of the dense layers, in forward order after the embeddings
+_DENSE_LAYERS = ("hidden_1", "hidden_2", "output")
+
+# Fold-in: Adam on one user embedding against the frozen network
+FOLD_IN_STEPS = 150
+FOLD_IN_LEARNING_RATE = 0.05
+FOLD_IN_L2 = 1e-3
+# Folded-in user vectors kept per worker (LRU)
+FOLD_IN_CACHE_SIZE = 10_000
+# Hidden activations (floats) per user group in _score_matrix, bounding its memory
+SCORE_MATRIX_BLOCK = 4_000_000
+
+
+def _relu(x: np.ndarray) -> np.ndarray:
+    return np.maximum(x, 0.0, out=x)
+
+
+def _sigmoid(x: np.ndarray) -> np.ndarray:
+    return 1.0 / (1.0 + np.exp(-x))
+
+
+def weights_version() -> Optional[int]:
+    """Modification time of the published weights file, or None if there is none"""
+    return file_version(_WEIGHTS_PATH)
 
 
-class NeuralCollaborativeFilter:
-    def __init__(self, embedding_dim: int = EMBEDDING_DIM):
+class NeuralCollaborativeFilter(CollaborativeModelMixin):
+    MIN_RATINGS = MIN_RATINGS_FOR_NCF
+
+    def __init__(self, embedding_dim: int = EMBEDDING_DIM, load: bool = True):
         self.embedding_dim = embedding_dim
+        # weights_version() of the file these weights were loaded from
+        self.version: Optional[int] = None
         self.model = None
         self.user_to_idx: Dict[int, int] = {}
         self.movie_to_idx: Dict[int, int] = {}
+        self.weights: Dict[str, np.ndarray] = {}
+        # Trained movie ids in embedding order (sorted), for vectorized id -> index lookup
+        self._movie_ids = np.empty(0, dtype=np.int64)
+        # movie_emb @ the movie half of hidden_1's kernel, precomputed once per model
+        self._movie_hidden: Optional[np.ndarray] = None
+        # Ratings each trained user had at training time (None for older weight files)
+        self._user_rating_counts: Optional[np.ndarray] = None
+        # user_id -> (ratings fingerprint, folded-in embedding)
+        self._folded: "OrderedDict[int, Tuple[int, np.ndarray]]" = OrderedDict()
         self.is_trained = False
-        self._load_if_exists()
+        if load:
+            self._load_if_exists()
 
     def _build_model(self, num_users: int, num_movies: int):
         import tensorflow as tf
@@ -36,18 +82,32 @@ class NeuralCollaborativeFilter:
         )
 
         x = layers.Concatenate()([user_vec, movie_vec])
-        x = layers.Dense(64, activation="relu")(x)
+        x = layers.Dense(64, activation="relu", name="hidden_1")(x)
         x = layers.Dropout(0.2)(x)
-        x = layers.Dense(32, activation="relu")(x)
-        output = layers.Dense(1, activation="sigmoid")(x)
+        x = layers.Dense(32, activation="relu", name="hidden_2")(x)
+        output = layers.Dense(1, activation="sigmoid", name="output")(x)
 
         model = tf.keras.Model(inputs=[user_input, movie_input], outputs=output)
         model.compile(optimizer="adam", loss="mse", metrics=["mae"])
         return model
 
-    def train(self, ratings_data: List[dict]) -> bool:
-        if len(ratings_data) < MIN_RATINGS_FOR_NCF:
-            print(f"[NCF] Need {MIN_RATINGS_FOR_NCF} ratings to train, have {len(ratings_data)}.")
+    def train(
+        self,
+        ratings,
+        progress: Optional[Callable[[int, int, dict], None]] = None,
+        save: bool = True,
+    ) -> bool:
+        """
+        Fit on all ratings (a RatingArrays, or a list of {"user_id", "movie_id",
+        "rating"} dicts) and publish the weights unless save is False;
+        progress(epoch, epochs, logs) runs after each epoch.
+        """
+        if isinstance(ratings, list):
+            from app.ml.ratings_loader import RatingArrays
+            ratings = RatingArrays.from_records(ratings)
+
+        if len(ratings) < MIN_RATINGS_FOR_NCF:
+            print(f"[NCF] Need {MIN_RATINGS_FOR_NCF} ratings to train, have {len(ratings)}.")
             return False
 
         try:
@@ -56,15 +116,14 @@ class NeuralCollaborativeFilter:
             print("[NCF] TensorFlow not installed.")
             return False
 
-        user_ids = sorted(set(r["user_id"] for r in ratings_data))
-        movie_ids = sorted(set(r["movie_id"] for r in ratings_data))
+        # Sorted unique ids and each rating's index into them, in one pass per column
+        user_ids, user_arr = np.unique(ratings.user_ids, return_inverse=True)
+        movie_ids, movie_arr = np.unique(ratings.movie_ids, return_inverse=True)
 
-        self.user_to_idx = {uid: i for i, uid in enumerate(user_ids)}
-        self.movie_to_idx = {mid: i for i, mid in enumerate(movie_ids)}
-
-        user_arr = np.array([self.user_to_idx[r["user_id"]] for r in ratings_data])
-        movie_arr = np.array([self.movie_to_idx[r["movie_id"]] for r in ratings_data])
-        rating_arr = np.array([r["rating"] / 10.0 for r in ratings_data], dtype=np.float32)
+        self.user_to_idx = dict(zip(user_ids.tolist(), range(len(user_ids))))
+        self.movie_to_idx = dict(zip(movie_ids.tolist(), range(len(movie_ids))))
+        self._user_rating_counts = np.bincount(user_arr, minlength=len(user_ids))
+        rating_arr = ratings.ratings.astype(np.float32) / np.float32(10.0)
 
         self.model = self._build_model(len(user_ids), len(movie_ids))
         self.model.fit(
@@ -72,76 +131,226 @@ class NeuralCollaborativeFilter:
             rating_arr,
             epochs=EPOCHS,
             batch_size=BATCH_SIZE,
-            validation_split=0.1 if len(ratings_data) >= 10 else 0.0,
+            validation_split=0.1 if len(ratings) >= 10 else 0.0,
             verbose=0,
+            callbacks=[
+                tf.keras.callbacks.LambdaCallback(
+                    on_epoch_end=lambda epoch, logs: progress(epoch + 1, EPOCHS, logs or {})
+                )
+            ] if progress else None,
         )
 
+        self._set_weights(self._export_weights())
         self.is_trained = True
-        self._save()
-        print(f"[NCF] Trained on {len(ratings_data)} ratings ({len(user_ids)} users, {len(movie_ids)} movies).")
+        if save:
+            self._save()
+        print(f"[NCF] Trained on {len(ratings)} ratings ({len(user_ids)} users, {len(movie_ids)} movies).")
         return True
 
-    def predict_for_user(self, user_id: int, candidate_movie_ids: List[int]) -> Dict[int, float]:
-        if not self.is_trained or self.model is None:
-            return {}
-        if user_id not in self.user_to_idx:
-            return {}
+    def _export_weights(self) -> Dict[str, np.ndarray]:
+        """Pull embeddings and dense kernels/biases out of the Keras model"""
+        weights = {
+            "user_emb": self.model.get_layer("user_emb").get_weights()[0],
+            "movie_emb": self.model.get_layer("movie_emb").get_weights()[0],
+        }
+        # Dense layers in forward order (models saved before they were named have default names)
+        dense = [layer for layer in self.model.layers if type(layer).__name__ == "Dense"]
+        for name, layer in zip(_DENSE_LAYERS, dense):
+            kernel, bias = layer.get_weights()
+            weights[f"{name}_kernel"] = kernel
+            weights[f"{name}_bias"] = bias
+        return {name: np.asarray(w, dtype=np.float32) for name, w in weights.items()}
 
-        try:
-            user_idx = self.user_to_idx[user_id]
-            known = [(mid, self.movie_to_idx[mid]) for mid in candidate_movie_ids if mid in self.movie_to_idx]
-            if not known:
-                return {}
+    def _set_weights(self, weights: Dict[str, np.ndarray]):
+        """Install NumPy weights and precompute the per-movie half of the first layer"""
+        self.weights = weights
+        self._movie_ids = np.array(sorted(self.movie_to_idx, key=self.movie_to_idx.get), dtype=np.int64)
+        # hidden_1 sees concat([user_vec, movie_vec]); split its kernel so the
+        # movie half is applied once per model instead of once per request
+        dim = weights["user_emb"].shape[1]
+        self._movie_hidden = weights["movie_emb"] @ weights["hidden_1_kernel"][dim:]
 
-            movie_arr = np.array([m[1] for m in known])
-            user_arr = np.full(len(movie_arr), user_idx)
+    def _forward(self, user_vec: np.ndarray, movie_idx: np.ndarray) -> np.ndarray:
+        """Predicted (0-1) scores of one user vector against the given movie rows"""
+        w = self.weights
+        dim = w["user_emb"].shape[1]
+        user_hidden = user_vec @ w["hidden_1_kernel"][:dim] + w["hidden_1_bias"]
+        h = _relu(self._movie_hidden[movie_idx] + user_hidden)
+        h = _relu(h @ w["hidden_2_kernel"] + w["hidden_2_bias"])
+        return _sigmoid(h @ w["output_kernel"] + w["output_bias"]).ravel()
 
-            preds = self.model.predict([user_arr, movie_arr], verbose=0).flatten()
-            return {m[0]: float(p) for m, p in zip(known, preds)}
+    def _score_matrix(self, vectors: List[np.ndarray]) -> np.ndarray:
+        """_forward over every movie for a batch of user vectors, in user groups of bounded size"""
+        w = self.weights
+        dim = w["user_emb"].shape[1]
+        user_hidden = np.stack(vectors) @ w["hidden_1_kernel"][:dim] + w["hidden_1_bias"]
+        n_movies, width = self._movie_hidden.shape
+        group = max(1, SCORE_MATRIX_BLOCK // max(n_movies * width, 1))
+        scores = np.empty((len(vectors), n_movies), dtype=np.float32)
+        for start in range(0, len(vectors), group):
+            h = _relu(self._movie_hidden[None, :, :] + user_hidden[start:start + group, None, :])
+            h = _relu(h @ w["hidden_2_kernel"] + w["hidden_2_bias"])
+            scores[start:start + group] = _sigmoid(h @ w["output_kernel"] + w["output_bias"])[:, :, 0]
+        return scores
+
+    def fold_in(self, ratings: Dict[int, float]) -> Optional[np.ndarray]:
+        """
+        Solve a user embedding from {movie_id: rating} alone, every other weight
+        frozen: Adam on the training loss (MSE against rating / 10) plus a small
+        L2 pull toward the average trained user. None if fewer than
+        MIN_RATINGS_FOR_NCF of the rated movies are known to the model.
+        """
+        if not self.is_trained or self._movie_hidden is None:
+            return None
+        known, movie_idx = self._movie_positions(list(ratings))
+        if len(movie_idx) < MIN_RATINGS_FOR_NCF:
+            return None
+        targets = np.fromiter(ratings.values(), dtype=np.float32, count=len(ratings))[known] / 10.0
+
+        w = self.weights
+        dim = w["user_emb"].shape[1]
+        w_user = w["hidden_1_kernel"][:dim]
+        movie_part = self._movie_hidden[movie_idx] + w["hidden_1_bias"]
+        prior = w["user_emb"].mean(axis=0)
+        u = prior.copy()
+        m = np.zeros_like(u)
+        v = np.zeros_like(u)
+        beta1, beta2, eps = 0.9, 0.999, 1e-8
+
+        for step in range(1, FOLD_IN_STEPS + 1):
+            z1 = movie_part + u @ w_user
+            h1 = np.maximum(z1, 0.0)
+            z2 = h1 @ w["hidden_2_kernel"] + w["hidden_2_bias"]
+            h2 = np.maximum(z2, 0.0)
+            y = _sigmoid(h2 @ w["output_kernel"] + w["output_bias"]).ravel()
+
+            # Backprop the mean squared error down to the user vector only
+            dz3 = (2.0 / len(y)) * (y - targets) * y * (1.0 - y)
+            dz2 = (dz3[:, None] @ w["output_kernel"].T) * (z2 > 0)
+            dz1 = (dz2 @ w["hidden_2_kernel"].T) * (z1 > 0)
+            grad = dz1.sum(axis=0) @ w_user.T + 2.0 * FOLD_IN_L2 * (u - prior)
+
+            m = beta1 * m + (1 - beta1) * grad
+            v = beta2 * v + (1 - beta2) * grad * grad
+            u -= FOLD_IN_LEARNING_RATE * (m / (1 - beta1 ** step)) / (np.sqrt(v / (1 - beta2 ** step)) + eps)
+        return u.astype(np.float32)
+
+    def _trained_vector(self, idx: int) -> np.ndarray:
+        return self.weights["user_emb"][idx]
+
+    def _folded_vector(self, user_id: int, ratings: Dict[int, float]) -> Optional[np.ndarray]:
+        """fold_in, cached per user until their ratings change"""
+        fingerprint = hash(frozenset(ratings.items()))
+        cached = self._folded.get(user_id)
+        if cached is not None and cached[0] == fingerprint:
+            self._folded.move_to_end(user_id)
+            return cached[1]
+        vec = self.fold_in(ratings)
+        if vec is not None:
+            self._folded[user_id] = (fingerprint, vec)
+            if len(self._folded) > FOLD_IN_CACHE_SIZE:
+                self._folded.popitem(last=False)
+        return vec
+
+    def score_candidates(
+        self,
+        user_id: int,
+        candidate_movie_ids: Sequence[int],
+        ratings: Optional[Dict[int, float]] = None,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        (movie_ids, predicted scores) for the candidates the model knows, in
+        one batched NumPy forward pass. Dropout is the identity at inference.
+        Pass the user's ratings to serve users the last training has not seen.
+        """
+        empty = (np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32))
+        if self._movie_hidden is None:
+            return empty
+        user_vec = self.user_vector(user_id, ratings)
+        if user_vec is None:
+            return empty
+
+        candidates = np.asarray(candidate_movie_ids, dtype=np.int64)
+        known, movie_idx = self._movie_positions(candidates)
+        if not known.any():
+            return empty
+        return candidates[known], self._forward(user_vec, movie_idx).astype(np.float32)
+
+    def predict_for_user(self, user_id: int, candidate_movie_ids: List[int]) -> Dict[int, float]:
+        try:
+            movie_ids, scores = self.score_candidates(user_id, candidate_movie_ids)
         except Exception as e:
             print(f"[NCF] Prediction error: {e}")
             return {}
+        return dict(zip(movie_ids.tolist(), scores.tolist()))
 
-    def is_ready_for_user(self, user_id: int) -> bool:
-        return self.is_trained and user_id in self.user_to_idx
+    def warm_up(self):
+        """One full-catalog forward pass, so the first request after a swap runs hot"""
+        if self.is_trained and self._movie_hidden is not None and len(self._movie_ids):
+            self._forward(self.weights["user_emb"].mean(axis=0), np.arange(len(self._movie_ids)))
 
     def _save(self):
         try:
-            self.model.save(str(_MODEL_PATH))
-            with open(_MAPPINGS_PATH, "w") as f:
-                json.dump(
-                    {
-                        "user_to_idx": {str(k): v for k, v in self.user_to_idx.items()},
-                        "movie_to_idx": {str(k): v for k, v in self.movie_to_idx.items()},
-                    },
-                    f,
-                )
+            user_ids = sorted(self.user_to_idx, key=self.user_to_idx.get)
+            save_npz(
+                _WEIGHTS_PATH,
+                user_ids=np.array(user_ids, dtype=np.int64),
+                movie_ids=self._movie_ids,
+                **({} if self._user_rating_counts is None else {"user_rating_counts": self._user_rating_counts}),
+                **self.weights,
+            )
+            self.version = weights_version()
+            if self.model is not None:
+                # Full Keras model too, for inspection or warm-starting; serving never loads it
+                self.model.save(str(_MODEL_PATH))
         except Exception as e:
             print(f"[NCF] Save failed: {e}")
 
     def _load_if_exists(self):
         try:
-            if not (_MODEL_PATH.exists() and _MAPPINGS_PATH.exists()):
-                return
-            import tensorflow as tf
+            # Recorded up front so a file that fails to load is not retried on every request
+            version = self.version = weights_version()
+            if version is not None:
+                weights = load_npz(_WEIGHTS_PATH)
+                user_ids = weights.pop("user_ids").tolist()
+                movie_ids = weights.pop("movie_ids").tolist()
+                self._user_rating_counts = weights.pop("user_rating_counts", None)
+                self.user_to_idx = {uid: i for i, uid in enumerate(user_ids)}
+                self.movie_to_idx = {mid: i for i, mid in enumerate(movie_ids)}
+                self._set_weights(weights)
+            elif _MODEL_PATH.exists() and _MAPPINGS_PATH.exists():
+                # Models saved before the .npz export: convert once, then serve without TensorFlow
+                import tensorflow as tf
 
-            self.model = tf.keras.models.load_model(str(_MODEL_PATH))
-            with open(_MAPPINGS_PATH) as f:
-                mappings = json.load(f)
+                with open(_MAPPINGS_PATH) as f:
+                    mappings = json.load(f)
+                self.user_to_idx = {int(k): v for k, v in mappings["user_to_idx"].items()}
+                self.movie_to_idx = {int(k): v for k, v in mappings["movie_to_idx"].items()}
+                self.model = tf.keras.models.load_model(str(_MODEL_PATH))
+                self._set_weights(self._export_weights())
+                self.model = None
+                self._save()
+            else:
+                return
 
-            self.user_to_idx = {int(k): v for k, v in mappings["user_to_idx"].items()}
-            self.movie_to_idx = {int(k): v for k, v in mappings["movie_to_idx"].items()}
             self.is_trained = True
-            print(f"[NCF] Loaded model ({len(self.user_to_idx)} users, {len(self.movie_to_idx)} movies).")
+            print(f"[NCF] Loaded weights ({len(self.user_to_idx)} users, {len(self.movie_to_idx)} movies).")
         except Exception as e:
             print(f"[NCF] Could not load saved model: {e}")
 
 
-_ncf_instance: Optional[NeuralCollaborativeFilter] = None
+_ncf_slot = ArtifactSlot(
+    "ncf",
+    version=weights_version,
+    load=NeuralCollaborativeFilter,
+    warm=lambda model: model.warm_up(),
+)
 
 
 def get_ncf_model() -> NeuralCollaborativeFilter:
-    global _ncf_instance
-    if _ncf_instance is None:
-        _ncf_instance = NeuralCollaborativeFilter()
-    return _ncf_instance
+    """
+    The serving model. When a training job publishes new weights, a fresh
+    instance is loaded and warmed in the background and then swapped in, so
+    in-flight requests finish on the old model and no restart is needed.
+    """
+    return _ncf_slot.get()
@@ -0,0 +1,85 @@
+import json
+import numpy as np
+import pandas as pd
+from typing import Iterable, List, Optional
+
+# Fields returned by /movies/search
+SEARCH_FIELDS = ('movie_id', 'title', 'genres', 'vote_average')
+
+
+def format_movie(movie) -> dict:
+    """Format a catalog row (Series or record dict) for API responses"""
+    return {
+        'movie_id': int(movie['movie_id']),
+        'title': movie['title'],
+        'overview': movie['overview'] if pd.notna(movie['overview']) else None,
+        'genres': list(movie['genres']),
+        'keywords': list(movie['keywords']),
+        'cast': list(movie['cast']),
+        'crew': list(movie['crew']),
+        'vote_average': float(movie['vote_average']) if pd.notna(movie['vote_average']) else None,
+        'runtime': int(movie['runtime']) if pd.notna(movie['runtime']) else None
+    }
+
+
+def _dumps(obj) -> bytes:
+    # Same compact UTF-8 encoding FastAPI's JSONResponse produces
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class RawJSON(bytes):
+    """Already-encoded JSON that encode_response splices in verbatim"""
+
+
+def encode_response(body: dict) -> bytes:
+    """Encode a top-level response dict, splicing RawJSON values in without re-encoding"""
+    parts = []
+    for key, value in body.items():
+        encoded = value if isinstance(value, RawJSON) else _dumps(value)
+        parts.append(_dumps(key) + b":" + encoded)
+    return b"{" + b",".join(parts) + b"}"
+
+
+class PayloadStore:
+    """
+    API-ready movie payloads, built once per catalog load.
+
+    Each row has a plain dict (what format_movie returns) and its JSON
+    encoding, stored back to back in one blob addressed by ``offsets``. The
+    blob may be bytes or a memory-mapped uint8 array from a catalog artifact,
+    in which case each row's dict is decoded the first time it is asked for
+    and kept, so no row is decoded twice. Dicts are shared between requests
+    and must be treated as read-only.
+    """
+
+    def __init__(self, blob, offsets: np.ndarray, dicts: Optional[List[dict]] = None):
+        self.blob = blob
+        self.offsets = offsets
+        self._dicts: List[Optional[dict]] = dicts if dicts is not None else [None] * (len(offsets) - 1)
+
+    @classmethod
+    def from_payloads(cls, payloads: List[dict]) -> "PayloadStore":
+        encoded = [_dumps(p) for p in payloads]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(e) for e in encoded], out=offsets[1:])
+        return cls(b"".join(encoded), offsets, payloads)
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def get(self, row: int) -> dict:
+        payload = self._dicts[row]
+        if payload is None:
+            # Racing requests may both decode a row; either result is the same
+            payload = self._dicts[row] = json.loads(self.json_bytes(row))
+        return payload
+
+    def get_many(self, rows: Iterable[int]) -> List[dict]:
+        return [self.get(row) for row in rows]
+
+    def json_bytes(self, row: int) -> bytes:
+        return bytes(self.blob[self.offsets[row]:self.offsets[row + 1]])
+
+    def encode_list(self, rows: Iterable[int]) -> RawJSON:
+        """JSON array of the given rows, assembled from the pre-encoded payloads"""
+        return RawJSON(b"[" + b",".join(self.json_bytes(row) for row in rows) + b"]")
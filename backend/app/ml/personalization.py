@@ -0,0 +1,61 @@
+import numpy as np
+from scipy.sparse import csr_matrix
+from typing import Dict, Tuple
+
+from app.ml.neighbors import top_n_indices
+
+# Final score = GENRE_WEIGHT * genre affinity + QUALITY_WEIGHT * vote_average / 10
+GENRE_WEIGHT = 0.65
+QUALITY_WEIGHT = 0.35
+
+
+class GenreWeightedScorer:
+    """
+    Genre-affinity scoring for users without a collaborative model.
+
+    A user's genre weights are the sum of rating / 5 over the genres of the
+    movies they rated. Every catalog movie is then scored in one sparse
+    (movies x genres) @ (genres,) product plus a rating prior, and the top n
+    unrated movies come from a masked argpartition.
+    """
+
+    def __init__(self, genre_indptr: np.ndarray, genre_ids: np.ndarray, n_genres: int, vote_average: np.ndarray):
+        n_movies = len(genre_indptr) - 1
+        self.movie_genres = csr_matrix(
+            (np.ones(len(genre_ids), dtype=np.float32),
+             np.asarray(genre_ids, dtype=np.int32),
+             np.asarray(genre_indptr, dtype=np.int64)),
+            shape=(n_movies, n_genres),
+        )
+        self.quality = np.nan_to_num(np.asarray(vote_average, dtype=np.float32) / 10.0, nan=0.0)
+
+    def user_weights(self, rated_rows: np.ndarray, ratings: np.ndarray) -> np.ndarray:
+        """(n_genres,) affinity vector: rated rows' genre indicators weighted by rating / 5"""
+        weights = np.asarray(ratings, dtype=np.float32) / 5.0
+        return np.asarray(self.movie_genres[rated_rows].T @ weights).ravel()
+
+    def scores(self, genre_weights: np.ndarray) -> np.ndarray:
+        """Score for every catalog movie"""
+        return GENRE_WEIGHT * (self.movie_genres @ genre_weights) + QUALITY_WEIGHT * self.quality
+
+    def recommend(
+        self,
+        rated_rows: np.ndarray,
+        ratings: np.ndarray,
+        exclude: np.ndarray,
+        n: int,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Top n rows (and scores) by genre-weighted score, skipping rows where exclude is set"""
+        scores = self.scores(self.user_weights(rated_rows, ratings))
+        scores[exclude] = -np.inf
+        n = min(n, int(np.count_nonzero(~exclude)))
+        top = top_n_indices(scores, n)
+        return top, scores[top]
+
+
+def ratings_to_rows(id_to_row: Dict[int, int], ratings: Dict[int, float]) -> Tuple[np.ndarray, np.ndarray]:
+    """Row positions and ratings for the rated movie ids present in the catalog"""
+    pairs = [(id_to_row[mid], rating) for mid, rating in ratings.items() if mid in id_to_row]
+    rows = np.array([row for row, _ in pairs], dtype=np.int64)
+    values = np.array([rating for _, rating in pairs], dtype=np.float32)
+    return rows, values
@@ -0,0 +1,62 @@
+import numpy as np
+from typing import Optional
+
+# Movies below this rating never appear in the plain "popular" list
+POPULAR_MIN_RATING = 7.0
+# Prior weight of the Bayesian average, as a quantile of the vote counts (IMDb Top 250 style)
+PRIOR_VOTES_QUANTILE = 0.8
+
+
+def bayesian_average(
+    ratings: np.ndarray,
+    vote_counts: np.ndarray,
+    prior_votes: Optional[float] = None,
+    prior_mean: Optional[float] = None,
+) -> np.ndarray:
+    """
+    (v / (v + m)) * R + (m / (v + m)) * C: shrinks each rating R toward the
+    catalog mean C in proportion to how few votes v it has relative to m.
+    Unrated movies score NaN.
+    """
+    ratings = np.asarray(ratings, dtype=np.float64)
+    votes = np.nan_to_num(np.asarray(vote_counts, dtype=np.float64), nan=0.0)
+    rated = ~np.isnan(ratings)
+    if prior_mean is None:
+        prior_mean = float(ratings[rated].mean()) if rated.any() else 0.0
+    if prior_votes is None:
+        prior_votes = float(np.quantile(votes[rated], PRIOR_VOTES_QUANTILE)) if rated.any() else 0.0
+    total = votes + prior_votes
+    with np.errstate(invalid='ignore', divide='ignore'):
+        scores = np.where(total > 0, (votes * ratings + prior_votes * prior_mean) / total, ratings)
+    return scores
+
+
+def _rank_desc(scores: np.ndarray, keep: np.ndarray) -> np.ndarray:
+    """Rows where keep is set, highest score first (ties keep catalog order)"""
+    rows = np.flatnonzero(keep)
+    return rows[np.argsort(-scores[rows], kind="stable")]
+
+
+class PopularityRanking:
+    """
+    Popular-movie row orders computed once at load; any top-n is a slice.
+
+    ``rows`` is every movie rated POPULAR_MIN_RATING or better, by rating.
+    ``weighted_rows`` ranks every rated movie by the vote-count-weighted
+    Bayesian average, or is None when the catalog has no vote counts.
+    """
+
+    def __init__(self, ratings: np.ndarray, vote_counts: Optional[np.ndarray] = None):
+        ratings = np.asarray(ratings, dtype=np.float64)
+        rated = ~np.isnan(ratings)
+        self.rows = _rank_desc(ratings, rated & (np.nan_to_num(ratings, nan=-np.inf) >= POPULAR_MIN_RATING))
+
+        self.weighted_rows: Optional[np.ndarray] = None
+        if vote_counts is not None and not np.isnan(np.asarray(vote_counts, dtype=np.float64)).all():
+            self.weighted_rows = _rank_desc(bayesian_average(ratings, vote_counts), rated)
+
+    def top(self, n: int, weighted: bool = False) -> np.ndarray:
+        """Row positions of the n most popular movies"""
+        if weighted and self.weighted_rows is not None:
+            return self.weighted_rows[:n]
+        return self.rows[:n]
@@ -1,17 +1,24 @@
 import pandas as pd
 import ast
 from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
 import pickle
 import os
 from pathlib import Path
+import argparse
+from app.ml.ann import (
+    IVFIndex, build_ann_neighbor_index, measure_recall, select_neighbor_method,
+    DEFAULT_IVF_PROBE
+)
+from app.ml.catalog import Catalog
+from app.ml.neighbors import build_neighbor_index, DEFAULT_TOP_K, DEFAULT_BLOCK_SIZE
 
 class MovieDataPreprocessor:
     def __init__(self, credits_path: str, movies_path: str):
         self.credits_path = credits_path
         self.movies_path = movies_path
         self.movies_df = None
-        self.cosine_sim = None
+        self.neighbors = None
+        self.neighbor_build_info = {}
         
     def convert(self, obj):
         """Convert JSON string to list of names"""
@@ -31,7 +38,7 @@ class MovieDataPreprocessor:
         # Select relevant columns
         self.movies_df = self.movies_df[[
             'movie_id', 'title', 'overview', 'genres', 'keywords', 
-            'cast', 'crew', 'vote_average', 'runtime'
+            'cast', 'crew', 'vote_average', 'vote_count', 'runtime'
         ]]
         
         return self.movies_df
@@ -76,23 +83,63 @@ class MovieDataPreprocessor:
         
         return self.movies_df
     
-    def compute_similarity_matrix(self):
-        """Compute TF-IDF and cosine similarity matrix"""
+    def compute_neighbor_index(
+        self,
+        top_k: int = DEFAULT_TOP_K,
+        block_size: int = DEFAULT_BLOCK_SIZE,
+        n_jobs: int = None,
+        method: str = "auto",
+        ann_lists: int = None,
+        ann_probe: int = DEFAULT_IVF_PROBE
+    ):
+        """
+        Compute TF-IDF vectors and keep each movie's top-K cosine neighbors
+        
+        ``method`` is "exact", "ann" or "auto" (exact up to ANN_AUTO_THRESHOLD
+        movies, the IVF index beyond). Both build in row blocks across a
+        process pool.
+        """
         tfidf = TfidfVectorizer(stop_words='english', max_features=5000)
         tfidf_matrix = tfidf.fit_transform(self.movies_df['tags'])
-        
-        # Compute cosine similarity
-        self.cosine_sim = cosine_similarity(tfidf_matrix, tfidf_matrix)
-        
-        return self.cosine_sim
+        method = select_neighbor_method(tfidf_matrix.shape[0], method)
+        self.neighbor_build_info = {'neighbor_method': method}
+        
+        if method == "ann":
+            index = IVFIndex(n_lists=ann_lists, n_probe=ann_probe).fit(tfidf_matrix)
+            self.neighbors = build_ann_neighbor_index(
+                index, top_k=top_k, block_size=block_size, n_jobs=n_jobs
+            )
+            recall = measure_recall(index, k=10)
+            self.neighbor_build_info.update({
+                'ann_lists': index.n_lists,
+                'ann_probe': index.n_probe,
+                'recall@10': round(recall['recall@10'], 4),
+            })
+            print(f"ANN recall@10 vs exact: {recall['recall@10']:.3f} "
+                  f"(sampled {recall['sample_size']} movies)")
+        else:
+            # Similarities are computed in row blocks across a process pool,
+            # so the full N x N matrix never exists in memory
+            self.neighbors = build_neighbor_index(
+                tfidf_matrix, top_k=top_k, block_size=block_size, n_jobs=n_jobs
+            )
+        
+        return self.neighbors
     
     def save_processed_data(self, output_path: str):
-        """Save processed data and similarity matrix"""
+        """Save processed data and neighbor index as a legacy pickle"""
         with open(output_path, 'wb') as f:
-            pickle.dump((self.movies_df, self.cosine_sim), f)
+            pickle.dump((self.movies_df, self.neighbors), f)
         print(f"Processed data saved to {output_path}")
     
-    def run_full_pipeline(self, output_path: str):
+    def save_catalog(self, catalog_dir: str) -> Path:
+        """Write a new memory-mappable catalog version and make it current"""
+        catalog = Catalog.from_dataframe(self.movies_df, self.neighbors, self.neighbor_build_info)
+        version_dir = catalog.save(catalog_dir)
+        print(f"Catalog {catalog.version} saved to {version_dir}")
+        return version_dir
+    
+    def run_full_pipeline(self, catalog_dir: str, **neighbor_options):
         """Run complete preprocessing pipeline"""
         print("Loading data...")
         self.load_and_merge_data()
@@ -100,29 +147,52 @@ class MovieDataPreprocessor:
         print("Extracting features...")
         self.extract_features()
         
-        print("Computing similarity matrix...")
-        self.compute_similarity_matrix()
+        print("Computing neighbor index...")
+        self.compute_neighbor_index(**neighbor_options)
         
-        print("Saving processed data...")
-        self.save_processed_data(output_path)
+        print("Saving catalog artifact...")
+        self.save_catalog(catalog_dir)
         
-        return self.movies_df, self.cosine_sim
+        return self.movies_df, self.neighbors
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the movie catalog artifact from the TMDB CSVs")
+    parser.add_argument("--top-k", type=int, default=DEFAULT_TOP_K,
+                        help="Neighbors kept per movie")
+    parser.add_argument("--block-size", type=int, default=DEFAULT_BLOCK_SIZE,
+                        help="Rows multiplied per block (bounds peak memory)")
+    parser.add_argument("--jobs", type=int, default=None,
+                        help="Worker processes (default: all cores)")
+    parser.add_argument("--neighbor-method", choices=["auto", "exact", "ann"], default="auto",
+                        help="Exact cosine or approximate IVF index (auto picks by catalog size)")
+    parser.add_argument("--ann-lists", type=int, default=None,
+                        help="IVF clusters (default: about 4 * sqrt(N))")
+    parser.add_argument("--ann-probe", type=int, default=DEFAULT_IVF_PROBE,
+                        help="IVF clusters searched per movie (more = higher recall, slower)")
+    args = parser.parse_args()
+    
     # Get the project root directory
     current_dir = Path(__file__).parent
     project_root = current_dir.parent.parent.parent
     
     credits_path = project_root / "data" / "tmdb_5000_credits.csv"
     movies_path = project_root / "data" / "tmdb_5000_movies.csv"
-    output_path = current_dir / "movie_data.pkl"
+    catalog_dir = current_dir / "catalog"
     
     preprocessor = MovieDataPreprocessor(
         credits_path=str(credits_path),
         movies_path=str(movies_path)
     )
     
-    movies_df, cosine_sim = preprocessor.run_full_pipeline(str(output_path))
+    movies_df, neighbors = preprocessor.run_full_pipeline(
+        str(catalog_dir),
+        top_k=args.top_k,
+        block_size=args.block_size,
+        n_jobs=args.jobs,
+        method=args.neighbor_method,
+        ann_lists=args.ann_lists,
+        ann_probe=args.ann_probe
+    )
     print(f"\nProcessed {len(movies_df)} movies")
-    print(f"Similarity matrix shape: {cosine_sim.shape}")
+    print(f"Neighbor index: top-{neighbors.top_k}, {neighbors.nbytes / 1e6:.1f} MB")
 
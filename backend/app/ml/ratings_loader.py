@@ -0,0 +1,68 @@
+import numpy as np
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+from typing import List
+
+from app.models_db import MovieRating
+
+DEFAULT_CHUNK_SIZE = 50_000
+
+
+class RatingArrays:
+    """Parallel (user_id, movie_id, rating) columns, one row per rating"""
+
+    def __init__(self, user_ids: np.ndarray, movie_ids: np.ndarray, ratings: np.ndarray):
+        self.user_ids = user_ids
+        self.movie_ids = movie_ids
+        self.ratings = ratings
+
+    def __len__(self) -> int:
+        return len(self.ratings)
+
+    @property
+    def nbytes(self) -> int:
+        return self.user_ids.nbytes + self.movie_ids.nbytes + self.ratings.nbytes
+
+    @classmethod
+    def from_records(cls, ratings_data: List[dict]) -> "RatingArrays":
+        """From the older list-of-dicts form ({"user_id", "movie_id", "rating"})"""
+        n = len(ratings_data)
+        return cls(
+            np.fromiter((r["user_id"] for r in ratings_data), dtype=np.int64, count=n),
+            np.fromiter((r["movie_id"] for r in ratings_data), dtype=np.int64, count=n),
+            np.fromiter((r["rating"] for r in ratings_data), dtype=np.float32, count=n),
+        )
+
+
+def load_rating_arrays(db: Session, chunk_size: int = DEFAULT_CHUNK_SIZE) -> RatingArrays:
+    """
+    Stream every rating into preallocated typed arrays.
+
+    Only the three columns are selected (no ORM objects), and rows arrive in
+    server-side chunks of chunk_size (yield_per), so peak memory is the
+    arrays themselves (20 bytes per rating) plus one chunk.
+    """
+    capacity = db.execute(select(func.count()).select_from(MovieRating)).scalar_one()
+    user_ids = np.empty(capacity, dtype=np.int64)
+    movie_ids = np.empty(capacity, dtype=np.int64)
+    ratings = np.empty(capacity, dtype=np.float32)
+
+    stmt = select(MovieRating.user_id, MovieRating.movie_id, MovieRating.rating)
+    result = db.execute(stmt.execution_options(yield_per=chunk_size))
+    n = 0
+    for chunk in result.partitions():
+        end = n + len(chunk)
+        if end > capacity:
+            # Rows inserted since the count; grow geometrically
+            capacity = max(end, capacity * 2)
+            user_ids = np.resize(user_ids, capacity)
+            movie_ids = np.resize(movie_ids, capacity)
+            ratings = np.resize(ratings, capacity)
+        users, movies, values = zip(*chunk)
+        user_ids[n:end] = users
+        movie_ids[n:end] = movies
+        ratings[n:end] = values
+        n = end
+    result.close()
+
+    return RatingArrays(user_ids[:n], movie_ids[:n], ratings[:n])
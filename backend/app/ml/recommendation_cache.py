@@ -0,0 +1,128 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Sequence, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.database import upsert_add
+from app.models_db import UserProfileVersion
+
+DEFAULT_MAX_ENTRIES = 10_000
+DEFAULT_TTL_SECONDS = 600.0
+
+
+class PersonalizedCache:
+    """
+    LRU + TTL cache of encoded personalized-recommendation responses.
+
+    Entries are keyed by (user_id, n, method, profile version, artifact
+    versions). The profile version lives in the database (UserProfileVersion)
+    and is bumped in the same transaction as every ratings or watchlist write,
+    so a write through any worker changes the key every worker looks up.
+    Publishing a new catalog, model or precomputed batch changes the artifact
+    versions the same way. Superseded entries are never hit again and age
+    out through the LRU or the TTL, so no scan is needed to invalidate them.
+    Changes made behind the API's back (direct database edits) bump nothing;
+    the TTL bounds how long those go unnoticed.
+    """
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES, ttl_seconds: float = DEFAULT_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[tuple, Tuple[float, bytes]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.evictions = 0
+
+    def get(
+        self,
+        user_id: int,
+        n: int,
+        method: str = "auto",
+        profile_version: int = 0,
+        artifact_versions: tuple = (),
+    ) -> Optional[bytes]:
+        key = (user_id, n, method, profile_version, artifact_versions)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            created_at, body = entry
+            if time.monotonic() - created_at > self.ttl_seconds:
+                del self._entries[key]
+                self.stale += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return body
+
+    def put(
+        self,
+        user_id: int,
+        n: int,
+        body: bytes,
+        profile_version: int = 0,
+        method: str = "auto",
+        artifact_versions: tuple = (),
+    ):
+        """
+        Store a response body under the versions read before computing it,
+        so a write that landed mid-computation leaves the entry unreachable.
+        """
+        key = (user_id, n, method, profile_version, artifact_versions)
+        with self._lock:
+            self._entries[key] = (time.monotonic(), body)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "stale": self.stale,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+def read_profile_version(db: Session, user_id: int) -> int:
+    """The user's current profile version (0 before their first write)"""
+    version = db.query(UserProfileVersion.version).filter(UserProfileVersion.user_id == user_id).scalar()
+    return version or 0
+
+
+def read_profile_versions(db: Session, user_ids: Sequence[int]) -> Dict[int, int]:
+    """{user_id: current profile version} for many users in one query"""
+    versions = dict.fromkeys(user_ids, 0)
+    versions.update(
+        db.query(UserProfileVersion.user_id, UserProfileVersion.version)
+        .filter(UserProfileVersion.user_id.in_(user_ids))
+    )
+    return versions
+
+
+def bump_profile_version(db: Session, user_id: int):
+    """Count a write to the user's ratings or watchlist, in the caller's transaction"""
+    upsert_add(db, UserProfileVersion, ["user_id"], [{"user_id": user_id, "version": 1}])
+
+
+_cache_instance: Optional[PersonalizedCache] = None
+
+
+def get_personalized_cache() -> PersonalizedCache:
+    global _cache_instance
+    if _cache_instance is None:
+        _cache_instance = PersonalizedCache()
+    return _cache_instance
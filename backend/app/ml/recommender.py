@@ -1,18 +1,45 @@
+import os
 import pandas as pd
 import numpy as np
 import pickle
 from pathlib import Path
-from typing import List, Tuple, Optional
+from typing import Dict, List, Sequence, Tuple, Optional
 import httpx
 from app.config import get_settings
+from app.ml.candidates import CandidateGenerator, Candidates, MODEL_CANDIDATES, TWO_STAGE_MIN_CATALOG, rank_candidates
+from app.ml.artifacts import ArtifactSlot
+from app.ml.catalog import Catalog, catalog_exists, resolve_catalog_path
+from app.ml.genres import GenreIndex, MoodPools, genre_bitmasks
+from app.ml.neighbors import NeighborIndex, top_n_indices, top_n_per_row
+from app.ml.payloads import PayloadStore, format_movie
+from app.ml.personalization import GenreWeightedScorer, ratings_to_rows
+from app.ml.popularity import PopularityRanking
+from app.ml.search import TitleSearchIndex
+
+_ML_DIR = Path(__file__).parent
+CATALOG_DIR = _ML_DIR / "catalog"
+LEGACY_DATA_PATH = _ML_DIR / "movie_data.pkl"
 
 class MovieRecommender:
     def __init__(self, data_path: str):
         self.data_path = data_path
-        self.movies_df = None
-        self.cosine_sim = None
+        self.catalog: Optional[Catalog] = None
+        self.movie_ids: Optional[np.ndarray] = None
+        self.vote_average: Optional[np.ndarray] = None
+        self.runtime: Optional[np.ndarray] = None
+        self.titles: List[str] = []
+        self.search_index: Optional[TitleSearchIndex] = None
+        self.neighbors: Optional[NeighborIndex] = None
+        self._title_to_rows: Dict[str, List[int]] = {}
+        self._id_to_row: Dict[int, int] = {}
+        self.payloads: Optional[PayloadStore] = None
+        self.search_payloads: Optional[PayloadStore] = None
+        self.genre_index: Optional[GenreIndex] = None
+        self.mood_pools: Optional[MoodPools] = None
+        self.popularity: Optional[PopularityRanking] = None
+        self.genre_scorer: Optional[GenreWeightedScorer] = None
+        self.candidate_generator: Optional[CandidateGenerator] = None
         self.settings = get_settings()
-        self._load_data()
         
         # Mood to genre mapping
         self.mood_genres = {
@@ -24,43 +51,120 @@ class MovieRecommender:
             "romantic": ["Romance", "Comedy", "Drama"],
             "adventurous": ["Adventure", "Action", "Fantasy"]
         }
+        self._load_data()
     
     def _load_data(self):
-        """Load preprocessed movie data and similarity matrix"""
+        """Open the catalog artifact (or a legacy movie_data.pkl)"""
+        path = Path(self.data_path)
+        if path.is_dir():
+            self.catalog = Catalog.open(str(path))
+        else:
+            self.catalog = self._catalog_from_pickle(path)
+        
+        self.movie_ids = self.catalog.arrays['movie_id']
+        self.vote_average = self.catalog.arrays['vote_average']
+        self.runtime = self.catalog.arrays['runtime']
+        self.neighbors = self.catalog.neighbors
+        self.payloads = self.catalog.payloads
+        self.search_payloads = self.catalog.search_payloads
+        self._build_indexes()
+        build = self.catalog.manifest.get('build', {})
+        print(f"Loaded {len(self.catalog)} movies from catalog {self.catalog.version} "
+              f"(top-{self.neighbors.top_k} {build.get('neighbor_method', 'exact')} neighbors, "
+              f"{self.neighbors.nbytes / 1e6:.1f} MB)")
+    
+    def _catalog_from_pickle(self, path: Path) -> Catalog:
         try:
-            with open(self.data_path, 'rb') as f:
-                self.movies_df, self.cosine_sim = pickle.load(f)
-            print(f"Loaded {len(self.movies_df)} movies")
+            with open(path, 'rb') as f:
+                movies_df, neighbors = pickle.load(f)
         except FileNotFoundError:
             raise Exception(
-                f"Data file not found at {self.data_path}. "
+                f"Data file not found at {path}. "
                 "Please run preprocessing.py first."
             )
+        
+        if not isinstance(neighbors, NeighborIndex):
+            # Older pickles carry the full dense N x N similarity matrix
+            neighbors = NeighborIndex.from_dense(neighbors)
+        return Catalog.from_dataframe(movies_df, neighbors)
     
-    def get_movie_by_title(self, title: str) -> Optional[pd.Series]:
+    def _build_indexes(self):
+        """Build the lookup, search, genre and popularity indexes over row positions"""
+        self.titles = self.catalog.titles()
+        self.search_index = TitleSearchIndex(self.titles, self.vote_average)
+        
+        masks = genre_bitmasks(self.catalog.arrays['genre_indptr'], self.catalog.arrays['genre_ids'])
+        self.genre_index = GenreIndex(self.catalog.genre_names, masks)
+        self.mood_pools = MoodPools(self.genre_index, self.vote_average, self.mood_genres)
+        self.popularity = PopularityRanking(self.vote_average, self.catalog.arrays.get('vote_count'))
+        self.genre_scorer = GenreWeightedScorer(
+            self.catalog.arrays['genre_indptr'], self.catalog.arrays['genre_ids'],
+            len(self.catalog.genre_names), self.vote_average
+        )
+        self.candidate_generator = CandidateGenerator(
+            self.movie_ids, self.neighbors, self.popularity, self.mood_pools,
+            self.genre_index, self.mood_genres, self.genre_scorer
+        )
+        
+        self._title_to_rows = {}
+        for row, title in enumerate(self.titles):
+            # Titles are not unique (remakes), so keep every row in catalog order
+            self._title_to_rows.setdefault(title, []).append(row)
+        
+        self._id_to_row = {}
+        for row, movie_id in enumerate(self.movie_ids.tolist()):
+            self._id_to_row.setdefault(movie_id, row)
+    
+    def find_rows_by_title(self, title: str) -> List[int]:
+        """Row positions of every movie with this exact title"""
+        return self._title_to_rows.get(title, [])
+    
+    def get_movie_row(self, movie_id: int) -> Optional[int]:
+        """Row position of a movie id, or None if it is not in the catalog"""
+        return self._id_to_row.get(int(movie_id))
+    
+    def get_movie_by_title(self, title: str) -> Optional[dict]:
         """Get movie data by exact title"""
-        matches = self.movies_df[self.movies_df['title'] == title]
-        if matches.empty:
+        rows = self.find_rows_by_title(title)
+        if not rows:
             return None
-        return matches.iloc[0]
+        return dict(self.payloads.get(rows[0]))
+    
+    def get_movie_by_id(self, movie_id: int) -> Optional[dict]:
+        """Get formatted movie data by movie id"""
+        row = self.get_movie_row(movie_id)
+        if row is None:
+            return None
+        # Copy so callers can add fields (e.g. poster_url) without touching the store
+        return dict(self.payloads.get(row))
+    
+    def search_rows(self, query: str, limit: int = 10, fuzzy: bool = True) -> List[int]:
+        """
+        Row positions of movies whose title contains the query, prefix matches first.
+        With fuzzy=True, remaining slots are filled with titles a few typos away.
+        """
+        rows = self.search_index.search(query, limit)
+        if fuzzy and len(rows) < limit:
+            seen = set(rows)
+            for row, _ in self.search_index.fuzzy(query, limit):
+                if row not in seen:
+                    rows.append(row)
+                    seen.add(row)
+                    if len(rows) >= limit:
+                        break
+        return rows
+    
+    def suggest_titles(self, query: str, limit: int = 5) -> List[str]:
+        """Did-you-mean titles within a few edits of the query, closest first"""
+        return [self.titles[row] for row, _ in self.search_index.fuzzy(query, limit)]
+    
+    def autocomplete_rows(self, query: str, limit: int = 10) -> List[int]:
+        """Row positions of movies whose title starts with the query"""
+        return self.search_index.autocomplete(query, limit)
     
     def search_movies(self, query: str, limit: int = 10) -> List[dict]:
         """Search movies by title (fuzzy search)"""
-        query = query.lower()
-        matches = self.movies_df[
-            self.movies_df['title'].str.lower().str.contains(query, na=False)
-        ]
-        
-        results = []
-        for _, movie in matches.head(limit).iterrows():
-            results.append({
-                'movie_id': int(movie['movie_id']),
-                'title': movie['title'],
-                'genres': movie['genres'],
-                'vote_average': float(movie['vote_average']) if pd.notna(movie['vote_average']) else None
-            })
-        
-        return results
+        return self.search_payloads.get_many(self.search_rows(query, limit))
     
     def get_content_based_recommendations(
         self, 
@@ -77,31 +181,71 @@ class MovieRecommender:
         Returns:
             Tuple of (recommendations list, similarity scores list)
         """
-        # Find movie index
-        matches = self.movies_df[self.movies_df['title'] == title]
-        if matches.empty:
+        movie_indices, similarity_scores = self.get_content_based_rows(title, n_recommendations)
+        recommendations = self._format_rows(movie_indices)
+        
+        return recommendations, similarity_scores
+    
+    def get_content_based_rows(
+        self,
+        title: str,
+        n_recommendations: int = 10
+    ) -> Tuple[List[int], List[float]]:
+        """Row positions and similarity scores of a title's nearest neighbors"""
+        # Find movie index (first match for duplicate titles)
+        rows = self.find_rows_by_title(title)
+        if not rows:
             return [], []
         
-        idx = matches.index[0]
+        # Neighbors are stored best-first with the movie itself excluded
+        movie_indices, scores = self.neighbors.neighbors(rows[0], n_recommendations)
+        return movie_indices.tolist(), scores.tolist()
+    
+    def get_multi_seed_rows(
+        self,
+        movie_ids: List[int],
+        weights: Optional[List[float]] = None,
+        n_recommendations: int = 10
+    ) -> Tuple[List[int], List[float]]:
+        """
+        Row positions and scores for "more like these" over several seed movies
         
-        # Get similarity scores
-        sim_scores = list(enumerate(self.cosine_sim[idx]))
+        Seed neighbor lists are merged in one vectorized pass, weighted by
+        ``weights`` (default 1 each) and normalised by the total weight, so
+        scores stay on the cosine-similarity scale. Seeds are never returned.
+        Unknown movie ids are ignored.
+        """
+        if weights is None:
+            weights = [1.0] * len(movie_ids)
         
-        # Sort by similarity (excluding the movie itself)
-        sim_scores = sorted(sim_scores, key=lambda x: x[1], reverse=True)
-        sim_scores = sim_scores[1:n_recommendations + 1]
+        seeds = [
+            (self._id_to_row[mid], w)
+            for mid, w in zip(movie_ids, weights)
+            if mid in self._id_to_row and w > 0
+        ]
+        if not seeds:
+            return [], []
         
-        # Get movie indices and scores
-        movie_indices = [i[0] for i in sim_scores]
-        similarity_scores = [i[1] for i in sim_scores]
+        seed_rows = np.array([row for row, _ in seeds], dtype=np.int64)
+        seed_weights = np.array([w for _, w in seeds], dtype=np.float32)
         
-        # Prepare recommendations
-        recommendations = []
-        for idx in movie_indices:
-            movie = self.movies_df.iloc[idx]
-            recommendations.append(self._format_movie(movie))
+        scores = self.neighbors.aggregate(seed_rows, seed_weights) / seed_weights.sum()
+        scores[seed_rows] = -np.inf
         
-        return recommendations, similarity_scores
+        # Only movies that appear in some seed's neighbor list are candidates
+        n = min(n_recommendations, int(np.count_nonzero(scores > 0)))
+        top = top_n_indices(scores, n)
+        return top.tolist(), scores[top].tolist()
+    
+    def get_multi_seed_recommendations(
+        self,
+        movie_ids: List[int],
+        weights: Optional[List[float]] = None,
+        n_recommendations: int = 10
+    ) -> Tuple[List[dict], List[float]]:
+        """Merged content-based recommendations for several seed movies"""
+        rows, scores = self.get_multi_seed_rows(movie_ids, weights, n_recommendations)
+        return self._format_rows(rows), scores
     
     def get_mood_based_recommendations(
         self, 
@@ -109,96 +253,232 @@ class MovieRecommender:
         n_recommendations: int = 5
     ) -> List[dict]:
         """Get recommendations based on user's mood"""
+        return self._format_rows(self.get_mood_rows(mood, n_recommendations))
+    
+    def get_mood_rows(self, mood: str, n_recommendations: int = 5) -> List[int]:
+        """Row positions of a mood's recommendations"""
         mood = mood.lower()
         
         if mood not in self.mood_genres:
             # Default to popular movies if mood not recognized
-            return self.get_popular_movies(n_recommendations)
-        
-        selected_genres = self.mood_genres[mood]
+            return self.popularity.top(n_recommendations).tolist()
         
-        # Filter movies by genre and rating
-        mood_movies = []
-        for _, movie in self.movies_df.iterrows():
-            if any(genre in selected_genres for genre in movie['genres']):
-                mood_movies.append(movie)
-        
-        mood_df = pd.DataFrame(mood_movies)
-        
-        if mood_df.empty:
-            return []
-        
-        # Sort by rating and get top movies
-        mood_df = mood_df.sort_values('vote_average', ascending=False)
-        
-        # Sample randomly from top-rated movies for variety
-        n_sample = min(n_recommendations * 3, len(mood_df))
-        top_movies = mood_df.head(n_sample)
-        sampled = top_movies.sample(min(n_recommendations, len(top_movies)))
-        
-        recommendations = []
-        for _, movie in sampled.iterrows():
-            recommendations.append(self._format_movie(movie))
-        
-        return recommendations
-    
-    def get_popular_movies(self, n: int = 20) -> List[dict]:
-        """Get top-rated popular movies"""
-        # Filter movies with good ratings and sort
-        popular = self.movies_df[
-            self.movies_df['vote_average'] >= 7.0
-        ].sort_values('vote_average', ascending=False)
-        
-        recommendations = []
-        for _, movie in popular.head(n).iterrows():
-            recommendations.append(self._format_movie(movie))
-        
-        return recommendations
+        # Sample randomly from the top-rated movies of the mood's prebuilt pool for variety
+        return self.mood_pools.sample(mood, n_recommendations).tolist()
+    
+    def get_genre_weighted_rows(self, ratings: Dict[int, float], n: int = 10) -> Tuple[List[int], List[float]]:
+        """
+        Row positions and scores of the best unrated movies for a user's
+        {movie_id: rating} history, scored by genre affinity plus rating.
+        """
+        rated_rows, rated_values = ratings_to_rows(self._id_to_row, ratings)
+        # Exclude by id so every row of a rated movie id is skipped
+        exclude = np.isin(self.movie_ids, np.fromiter(ratings, dtype=np.int64, count=len(ratings)))
+        rows, scores = self.genre_scorer.recommend(rated_rows, rated_values, exclude, n)
+        return rows.tolist(), scores.tolist()
+    
+    @property
+    def uses_two_stage(self) -> bool:
+        """Whether personalized recommendations retrieve candidates first (large catalogs)"""
+        return len(self.movie_ids) >= TWO_STAGE_MIN_CATALOG
+    
+    def get_model_rows(
+        self,
+        model,
+        user_id: int,
+        ratings: Dict[int, float],
+        n: int = 10
+    ) -> List[int]:
+        """
+        Rows of the n unrated movies a collaborative model (NCF or MF) scores
+        highest for the user, among the catalog movies it knows
+        """
+        movie_ids, scores = model.score_candidates(user_id, model.movie_ids, ratings)
+        # Rated and out-of-catalog movies are dropped after the top-n selection, so select a few more
+        top = top_n_indices(scores, n + len(ratings))
+        rows = [
+            self._id_to_row[mid] for mid in movie_ids[top].tolist()
+            if mid in self._id_to_row and mid not in ratings
+        ]
+        return rows[:n]
+    
+    def get_model_rows_batch(
+        self,
+        model,
+        ratings: Dict[int, Dict[int, float]],
+        n: int = 10
+    ) -> Dict[int, List[int]]:
+        """
+        get_model_rows for many users ({user_id: {movie_id: rating}}) at once:
+        one score matrix, rated and out-of-catalog movies masked, and a
+        per-row argpartition. Users the model cannot score are left out.
+        """
+        user_ids, scores = model.score_users(list(ratings), ratings)
+        if not user_ids:
+            return {}
+        model_ids = model.movie_ids
+        catalog_rows = np.array([self._id_to_row.get(mid, -1) for mid in model_ids.tolist()], dtype=np.int64)
+        scores[:, catalog_rows < 0] = -np.inf
+
+        # Every (user, rated movie) pair, looked up in the model's sorted movie ids
+        counts = [len(ratings[user_id]) for user_id in user_ids]
+        user_idx = np.repeat(np.arange(len(user_ids)), counts)
+        rated_ids = np.fromiter((mid for user_id in user_ids for mid in ratings[user_id]), dtype=np.int64, count=sum(counts))
+        pos = np.minimum(np.searchsorted(model_ids, rated_ids), max(len(model_ids) - 1, 0))
+        hit = model_ids[pos] == rated_ids if len(model_ids) else np.zeros(len(rated_ids), dtype=bool)
+        scores[user_idx[hit], pos[hit]] = -np.inf
+
+        top = top_n_per_row(scores, n)
+        valid = np.isfinite(np.take_along_axis(scores, top, axis=1))
+        return {
+            user_id: catalog_rows[top[i][valid[i]]].tolist()
+            for i, user_id in enumerate(user_ids)
+        }
+    
+    def get_model_candidates(
+        self,
+        model,
+        user_id: int,
+        ratings: Dict[int, float],
+        n: int = MODEL_CANDIDATES
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Rows and scores of about n unrated movies a collaborative model
+        retrieves as the user's best from its own index, without scoring the
+        catalog (empty for models without one)
+        """
+        # Rated and out-of-catalog movies are dropped after retrieval, so ask for a few more
+        movie_ids, scores = model.retrieve(user_id, n + len(ratings), ratings)
+        rows = np.array([self._id_to_row.get(mid, -1) for mid in movie_ids.tolist()], dtype=np.int64)
+        keep = (rows >= 0) & ~np.isin(movie_ids, np.fromiter(ratings, dtype=np.int64, count=len(ratings)))
+        return rows[keep][:n], scores[keep][:n]
+    
+    def get_personalized_candidates(
+        self,
+        ratings: Dict[int, float],
+        watchlist_ids: Sequence[int] = (),
+        model_rows: Sequence[int] = ()
+    ) -> Candidates:
+        """
+        Retrieval stage for a user's {movie_id: rating} history and watchlist:
+        a few hundred unrated rows from the collaborative model's retrieval
+        (model_rows), content neighbors, popularity and mood
+        """
+        rated_rows, rated_values = ratings_to_rows(self._id_to_row, ratings)
+        watchlist_rows = np.array(
+            [self._id_to_row[mid] for mid in watchlist_ids if mid in self._id_to_row and mid not in ratings],
+            dtype=np.int64
+        )
+        exclude_ids = np.fromiter(ratings, dtype=np.int64, count=len(ratings))
+        return self.candidate_generator.generate(rated_rows, rated_values, watchlist_rows, exclude_ids, model_rows)
+    
+    def model_preference(
+        self,
+        candidates: Candidates,
+        model,
+        user_id: int,
+        ratings: Dict[int, float],
+        scored_rows: Sequence[int] = (),
+        scored: Sequence[float] = ()
+    ) -> Optional[np.ndarray]:
+        """
+        A collaborative model's (NCF or MF) score for each candidate, NaN for
+        movies it does not know; None if it cannot score this user. Scores
+        retrieval already produced (scored_rows, scored) are reused, so the
+        model only scores the other candidates.
+        """
+        if not model.is_ready_for_user(user_id, ratings):
+            return None
+        preference = np.full(len(candidates), np.nan, dtype=np.float32)
+        scored_rows = np.asarray(scored_rows, dtype=np.int64)
+        if len(scored_rows) and len(candidates):
+            # Candidate rows are sorted (np.unique), so look the retrieved rows up by bisection
+            pos = np.minimum(np.searchsorted(candidates.rows, scored_rows), len(candidates) - 1)
+            hit = candidates.rows[pos] == scored_rows
+            preference[pos[hit]] = np.asarray(scored, dtype=np.float32)[hit]
+
+        todo = np.flatnonzero(np.isnan(preference))
+        todo_ids = self.movie_ids[candidates.rows[todo]]
+        movie_ids, scores = model.score_candidates(user_id, todo_ids, ratings)
+        # Scores come back for the known candidates, in candidate order
+        preference[todo[np.isin(todo_ids, movie_ids)]] = scores
+        if np.isnan(preference).all():
+            return None
+        return preference
+    
+    def rank_personalized(
+        self,
+        candidates: Candidates,
+        n: int = 10,
+        preference: Optional[np.ndarray] = None
+    ) -> Tuple[List[int], List[float]]:
+        """
+        Ranking stage: rows and scores of the n best candidates, blending the
+        collaborative preference (genre affinity without one), content
+        similarity and quality
+        """
+        rows, scores = rank_candidates(candidates, self.genre_scorer.quality, n, preference)
+        return rows.tolist(), scores.tolist()
+    
+    def get_popular_movies(self, n: int = 20, weighted: bool = False) -> List[dict]:
+        """
+        Get top-rated popular movies, a slice of the ranking built at load.
+        weighted=True ranks by vote-count-weighted (Bayesian) average instead.
+        """
+        return self._format_rows(self.popularity.top(n, weighted).tolist())
+    
+    @property
+    def aggregates(self) -> dict:
+        """Per-genre ratings and rating/runtime distributions, computed once per catalog"""
+        return self.catalog.aggregates
     
     def get_genre_statistics(self) -> dict:
         """Calculate average rating by genre"""
-        genre_ratings = {}
-        
-        for _, movie in self.movies_df.iterrows():
-            rating = movie['vote_average']
-            if pd.isna(rating):
-                continue
-                
-            for genre in movie['genres']:
-                if genre not in genre_ratings:
-                    genre_ratings[genre] = []
-                genre_ratings[genre].append(rating)
-        
-        # Calculate averages
-        avg_genre_ratings = {
-            genre: sum(ratings) / len(ratings)
-            for genre, ratings in genre_ratings.items()
+        return {
+            genre: stats['mean_rating']
+            for genre, stats in self.aggregates['genres'].items()
+            if stats['mean_rating'] is not None
         }
-        
-        return avg_genre_ratings
+    
+    def top_rows_for_ids(
+        self,
+        movie_ids: np.ndarray,
+        scores: np.ndarray,
+        n: int = 10
+    ) -> Tuple[List[int], List[float]]:
+        """Rows and scores of the n best-scored movie ids that are in the catalog and score above 0"""
+        rows = np.array([self._id_to_row.get(mid, -1) for mid in movie_ids.tolist()], dtype=np.int64)
+        keep = (rows >= 0) & (scores > 0)
+        rows, scores = rows[keep], scores[keep]
+        top = top_n_indices(scores, n)
+        return rows[top].tolist(), scores[top].tolist()
     
     def get_movies_by_ids(self, movie_ids: List[int]) -> List[dict]:
         """Get movie details for a list of movie IDs"""
-        movies = []
-        for movie_id in movie_ids:
-            movie_data = self.movies_df[self.movies_df['movie_id'] == movie_id]
-            if not movie_data.empty:
-                movies.append(self._format_movie(movie_data.iloc[0]))
-        return movies
+        rows = [self._id_to_row[mid] for mid in movie_ids if mid in self._id_to_row]
+        return self._format_rows(rows)
+    
+    def warm_up(self):
+        """Run each hot path once, so the first requests after a swap skip page faults and lazy builds"""
+        if len(self.movie_ids) == 0:
+            return
+        # Page the memory-mapped neighbor lists in
+        float(np.asarray(self.neighbors.scores).sum())
+        self.search_rows(self.titles[0][:3], 10)
+        self.get_content_based_rows(self.titles[0], 10)
+        self.payloads.encode_list(self.popularity.top(50).tolist())
+        self.get_popular_movies(10, weighted=True)
+        candidates = self.get_personalized_candidates({int(self.movie_ids[0]): 8.0})
+        self.rank_personalized(candidates, 10)
+        self.aggregates
+    
+    def _format_rows(self, rows) -> List[dict]:
+        """API payloads for the given row positions, read from the payload store"""
+        return self.payloads.get_many(rows)
     
     def _format_movie(self, movie: pd.Series) -> dict:
         """Format movie data for API response"""
-        return {
-            'movie_id': int(movie['movie_id']),
-            'title': movie['title'],
-            'overview': movie['overview'] if pd.notna(movie['overview']) else None,
-            'genres': movie['genres'],
-            'keywords': movie['keywords'],
-            'cast': movie['cast'],
-            'crew': movie['crew'],
-            'vote_average': float(movie['vote_average']) if pd.notna(movie['vote_average']) else None,
-            'runtime': int(movie['runtime']) if pd.notna(movie['runtime']) else None
-        }
+        return format_movie(movie)
     
     async def fetch_tmdb_poster(self, movie_id: int) -> Optional[str]:
         """Fetch movie poster from TMDB API"""
@@ -222,9 +502,9 @@ class MovieRecommender:
         return None
     
     async def fetch_tmdb_popular(self) -> List[dict]:
-        """Fetch popular movies from TMDB"""
+        """Popular movies from TMDB; empty without an API key or when the request fails"""
         if not self.settings.TMDB_API_KEY:
-            return self.get_popular_movies(20)
+            return []
         
         url = f"{self.settings.TMDB_BASE_URL}/movie/popular"
         params = {
@@ -242,18 +522,35 @@ class MovieRecommender:
         except Exception as e:
             print(f"Error fetching popular movies: {e}")
         
-        return self.get_popular_movies(20)
+        return []
 
-# Global instance
-_recommender_instance = None
+def _data_path() -> Path:
+    """The catalog version CURRENT points at, or the legacy pickle"""
+    # Prefer the memory-mapped catalog; fall back to a legacy pickle
+    if catalog_exists(str(CATALOG_DIR)):
+        return resolve_catalog_path(str(CATALOG_DIR))
+    return LEGACY_DATA_PATH
 
-def get_recommender() -> MovieRecommender:
-    """Get or create recommender instance"""
-    global _recommender_instance
-    
-    if _recommender_instance is None:
-        data_path = Path(__file__).parent / "movie_data.pkl"
-        _recommender_instance = MovieRecommender(str(data_path))
-    
-    return _recommender_instance
 
+def catalog_version() -> Optional[str]:
+    """Catalog version directory name, or the legacy pickle's mtime; None if neither exists"""
+    path = _data_path()
+    if path != LEGACY_DATA_PATH:
+        return path.name
+    try:
+        return f"{path.name}@{os.stat(path).st_mtime_ns}"
+    except FileNotFoundError:
+        return None
+
+
+# A new catalog version is loaded and warmed in the background, then swapped in
+_recommender_slot = ArtifactSlot(
+    "catalog",
+    version=catalog_version,
+    load=lambda: MovieRecommender(str(_data_path())),
+    warm=lambda recommender: recommender.warm_up(),
+)
+
+def get_recommender() -> MovieRecommender:
+    """The serving recommender, hot-swapped when a new catalog is published"""
+    return _recommender_slot.get()
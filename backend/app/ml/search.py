@@ -0,0 +1,198 @@
+import bisect
+import numpy as np
+from typing import Dict, List, Optional, Tuple
+
+NGRAM_SIZES = (2, 3)
+# q-gram size used to narrow fuzzy candidates (bigrams survive typos best)
+FUZZY_GRAM_SIZE = 2
+# Upper bound on titles verified per fuzzy query, taken best-first by shared q-grams
+MAX_FUZZY_CANDIDATES = 2000
+
+
+def _ngrams(text: str, n: int) -> set:
+    return {text[i:i + n] for i in range(len(text) - n + 1)}
+
+
+def default_max_distance(query: str) -> int:
+    """Edits allowed for a query: none for very short ones, then one, then two"""
+    if len(query) < 4:
+        return 0
+    return 1 if len(query) < 8 else 2
+
+
+def bounded_substring_distance(pattern: str, text: str, max_distance: int) -> Optional[int]:
+    """
+    Smallest Levenshtein distance between pattern and any substring of text,
+    or None if it exceeds max_distance. Myers' bit-parallel algorithm: one
+    pass over text with the pattern's DP column packed into two ints.
+    """
+    m = len(pattern)
+    if m == 0:
+        return 0
+    peq: Dict[str, int] = {}
+    for i, ch in enumerate(pattern):
+        peq[ch] = peq.get(ch, 0) | (1 << i)
+
+    mask = (1 << m) - 1
+    high = 1 << (m - 1)
+    pv, mv, score = mask, 0, m
+    best = m
+    for ch in text:
+        eq = peq.get(ch, 0)
+        xv = eq | mv
+        xh = (((eq & pv) + pv) ^ pv) | eq
+        ph = mv | (~(xh | pv) & mask)
+        mh = pv & xh
+        if ph & high:
+            score += 1
+        elif mh & high:
+            score -= 1
+        # Substring search: row 0 is all zeros, so nothing is shifted in
+        ph = (ph << 1) & mask
+        mh = (mh << 1) & mask
+        pv = mh | (~(xv | ph) & mask)
+        mv = ph & xv
+        if score < best:
+            best = score
+            if best == 0:
+                return 0
+    return best if best <= max_distance else None
+
+
+class TitleSearchIndex:
+    """
+    In-memory title search built once per catalog load.
+
+    Titles are ranked by popularity and every posting list stores popularity
+    ranks (not row numbers), so intersecting postings yields candidates
+    already in ranked order and a search can stop after ``limit`` verified
+    hits. Substring queries intersect bigram/trigram postings; prefix
+    matches come from binary search over the sorted titles and rank first.
+    """
+
+    def __init__(self, titles: List[str], popularity: np.ndarray):
+        popularity = np.nan_to_num(np.asarray(popularity, dtype=np.float64), nan=-1.0)
+        # rank 0 is the most popular title; ties keep catalog order
+        self._by_rank = np.argsort(-popularity, kind="stable")
+        self._rank_of = np.empty_like(self._by_rank)
+        self._rank_of[self._by_rank] = np.arange(len(self._by_rank))
+        self._lower = [t.lower() for t in titles]
+
+        order = sorted(range(len(titles)), key=lambda row: self._lower[row])
+        self._sorted_titles = [self._lower[row] for row in order]
+        self._sorted_ranks = self._rank_of[np.array(order, dtype=np.int64)] if order else np.empty(0, dtype=np.int64)
+
+        postings: Dict[str, List[int]] = {}
+        for rank, row in enumerate(self._by_rank.tolist()):
+            for n in NGRAM_SIZES:
+                for gram in _ngrams(self._lower[row], n):
+                    postings.setdefault(gram, []).append(rank)
+        self._postings = {gram: np.array(ranks, dtype=np.int32) for gram, ranks in postings.items()}
+
+    def _prefix_ranks(self, query: str) -> np.ndarray:
+        """Popularity ranks of titles starting with query, most popular first"""
+        lo = bisect.bisect_left(self._sorted_titles, query)
+        hi = bisect.bisect_left(self._sorted_titles, query + "\U0010ffff")
+        return np.sort(self._sorted_ranks[lo:hi])
+
+    def _candidate_ranks(self, query: str) -> np.ndarray:
+        """Ranks that contain every n-gram of the query (a superset of the matches)"""
+        sizes = [size for size in NGRAM_SIZES if size <= len(query)]
+        if not sizes:
+            # Single characters are not indexed; scan in popularity order instead
+            return np.arange(len(self._by_rank), dtype=np.int32)
+        n = max(sizes)
+
+        lists = []
+        for gram in _ngrams(query, n):
+            posting = self._postings.get(gram)
+            if posting is None:
+                return np.empty(0, dtype=np.int32)
+            lists.append(posting)
+        lists.sort(key=len)
+        candidates = lists[0]
+        for posting in lists[1:]:
+            candidates = np.intersect1d(candidates, posting, assume_unique=True)
+            if len(candidates) == 0:
+                break
+        return candidates
+
+    def autocomplete(self, query: str, limit: int = 10) -> List[int]:
+        """Rows whose title starts with query, most popular first"""
+        query = query.lower()
+        if not query:
+            return []
+        return self._by_rank[self._prefix_ranks(query)[:limit]].tolist()
+
+    def search(self, query: str, limit: int = 10) -> List[int]:
+        """Rows whose title contains query: prefix matches first, then by popularity"""
+        query = query.lower()
+        if not query or limit <= 0:
+            return []
+
+        prefix = self._prefix_ranks(query)[:limit]
+        results = self._by_rank[prefix].tolist()
+        if len(results) >= limit:
+            return results
+
+        seen = set(prefix.tolist())
+        for rank in self._candidate_ranks(query).tolist():
+            if rank in seen:
+                continue
+            row = int(self._by_rank[rank])
+            # n-gram postings can over-match (grams in a different order), so verify
+            if query in self._lower[row]:
+                results.append(row)
+                if len(results) >= limit:
+                    break
+        return results
+
+    def fuzzy(self, query: str, limit: int = 10, max_distance: Optional[int] = None) -> List[Tuple[int, int]]:
+        """
+        (row, distance) for titles containing query within max_distance edits,
+        closest first, then by popularity.
+
+        A substring within k edits of the query still shares at least
+        ``len(grams) - q * k`` of its distinct q-grams, so only titles with that
+        many posting hits reach the Levenshtein check.
+        """
+        query = query.lower()
+        if not query or limit <= 0:
+            return []
+        if max_distance is None:
+            max_distance = default_max_distance(query)
+
+        grams = _ngrams(query, FUZZY_GRAM_SIZE)
+        threshold = len(grams) - FUZZY_GRAM_SIZE * max_distance
+        if threshold <= 0:
+            # Too short to filter on q-grams; fall back to exact substring matches
+            return [(row, 0) for row in self.search(query, limit)]
+
+        postings = [self._postings[gram] for gram in grams if gram in self._postings]
+        if len(postings) < threshold:
+            return []
+        counts = np.bincount(np.concatenate(postings), minlength=len(self._by_rank))
+        candidates = np.flatnonzero(counts >= threshold)
+        # Best-first: most shared q-grams, then popularity (ascending rank)
+        candidates = candidates[np.argsort(-counts[candidates], kind="stable")][:MAX_FUZZY_CANDIDATES]
+
+        matches = []
+        for rank in candidates.tolist():
+            # Each edit destroys at most q grams, so this count bounds the distance from below
+            lower_bound = -(-(len(grams) - int(counts[rank])) // FUZZY_GRAM_SIZE)
+            if len(matches) >= limit:
+                worst_distance, worst_rank, _ = matches[limit - 1]
+                if lower_bound > worst_distance:
+                    break
+                if lower_bound == worst_distance and rank > worst_rank:
+                    # Could at best tie on distance, and loses the popularity tie-break
+                    continue
+            row = int(self._by_rank[rank])
+            distance = bounded_substring_distance(query, self._lower[row], max_distance)
+            if distance is not None:
+                matches.append((distance, rank, row))
+                if len(matches) >= limit:
+                    matches.sort()
+                    del matches[limit:]
+        matches.sort()
+        return [(row, distance) for distance, _, row in matches[:limit]]
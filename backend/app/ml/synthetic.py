@@ -0,0 +1,108 @@
+"""
+Synthetic TMDB-shaped catalogs and ratings for benchmarks, the evaluation
+harness and tests, so they run without the CSVs
+"""
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+GENRES = [
+    "Action", "Adventure", "Animation", "Comedy", "Crime", "Documentary",
+    "Drama", "Family", "Fantasy", "History", "Horror", "Music", "Mystery",
+    "Romance", "Science Fiction", "Thriller", "War", "Western"
+]
+
+
+def make_synthetic_catalog(n_movies: int = 5000, seed: int = 42) -> pd.DataFrame:
+    """Build a preprocessed-looking movies DataFrame (including 'tags')"""
+    rng = np.random.default_rng(seed)
+    vocab = [f"kw{i}" for i in range(max(200, n_movies // 4))]
+    people = [f"person{i}" for i in range(max(100, n_movies // 2))]
+
+    # Draw every random index up front; per-row rng.choice(replace=False) is O(vocab)
+    keyword_ids = rng.integers(0, len(vocab), size=(n_movies, 8))
+    overview_ids = rng.integers(0, len(vocab), size=(n_movies, 20))
+    people_ids = rng.integers(0, len(people), size=(n_movies, 4))
+    genre_counts = rng.integers(1, 4, size=n_movies)
+    genre_orders = np.argsort(rng.random((n_movies, len(GENRES))), axis=1)
+    vote_averages = rng.uniform(2.0, 9.5, size=n_movies)
+    # Long-tailed like TMDB: most titles have few votes, a handful have thousands
+    vote_counts = np.round(rng.lognormal(mean=5.0, sigma=1.5, size=n_movies)).astype(int)
+    runtimes = rng.integers(75, 200, size=n_movies)
+
+    rows = []
+    for i in range(n_movies):
+        genres = [GENRES[g] for g in genre_orders[i, :genre_counts[i]]]
+        keywords = [vocab[k] for k in keyword_ids[i]]
+        cast = [people[p] for p in people_ids[i, :3]]
+        crew = [people[people_ids[i, 3]]]
+        overview = " ".join(vocab[k] for k in overview_ids[i])
+        rows.append({
+            'movie_id': 10_000 + i,
+            'title': f"Synthetic Movie {i}",
+            'overview': overview,
+            'genres': genres,
+            'keywords': keywords,
+            'cast': cast,
+            'crew': crew,
+            'vote_average': round(float(vote_averages[i]), 1),
+            'vote_count': int(vote_counts[i]),
+            'runtime': int(runtimes[i]),
+            'tags': (" ".join(genres + keywords + cast + crew) + " " + overview).lower(),
+        })
+
+    return pd.DataFrame(rows)
+
+
+def make_synthetic_ratings(
+    movie_ids: np.ndarray,
+    n_users: int = 2000,
+    ratings_per_user: int = 40,
+    rank: int = 8,
+    seed: int = 42,
+):
+    """
+    1-10 ratings with low-rank structure (user and movie taste vectors plus
+    biases and noise), so collaborative models have something to learn.
+    Popular movies are rated more often, as in real data.
+    """
+    from app.ml.ratings_loader import RatingArrays
+
+    rng = np.random.default_rng(seed)
+    movie_ids = np.asarray(movie_ids, dtype=np.int64)
+    user_taste = rng.normal(0.0, 1.0, size=(n_users, rank))
+    movie_taste = rng.normal(0.0, 1.0, size=(len(movie_ids), rank))
+    movie_bias = rng.normal(0.0, 1.0, size=len(movie_ids))
+    user_bias = rng.normal(0.0, 0.7, size=n_users)
+    popularity = rng.zipf(1.5, size=len(movie_ids)).astype(np.float64)
+    popularity /= popularity.sum()
+
+    counts = np.minimum(rng.poisson(ratings_per_user, size=n_users) + 1, len(movie_ids))
+    users = np.repeat(np.arange(n_users), counts)
+    movies = np.concatenate([rng.choice(len(movie_ids), size=c, replace=False, p=popularity) for c in counts])
+    raw = (
+        5.5
+        + user_bias[users]
+        + movie_bias[movies]
+        + np.einsum("ij,ij->i", user_taste[users], movie_taste[movies]) / np.sqrt(rank)
+        + rng.normal(0.0, 0.8, size=len(users))
+    )
+    return RatingArrays(
+        users.astype(np.int64) + 1,
+        movie_ids[movies],
+        np.clip(np.round(raw), 1, 10).astype(np.float32),
+    )
+
+
+def build_recommender(movies_df: pd.DataFrame, workdir: Path):
+    """A MovieRecommender over movies_df, through the real preprocessing and a catalog saved under workdir"""
+    from app.ml.preprocessing import MovieDataPreprocessor
+    from app.ml.recommender import MovieRecommender
+
+    preprocessor = MovieDataPreprocessor(credits_path="", movies_path="")
+    preprocessor.movies_df = movies_df
+    preprocessor.compute_neighbor_index(n_jobs=1)
+    catalog_dir = Path(workdir) / "catalog"
+    preprocessor.save_catalog(str(catalog_dir))
+    return MovieRecommender(str(catalog_dir))
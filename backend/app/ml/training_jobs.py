@@ -0,0 +1,252 @@
+"""
+Background training jobs for the collaborative models (NCF and ALS matrix
+factorization).
+
+Training runs in a separate (spawned) process so Keras never blocks the API
+event loop. Job records live as JSON files under ``JOBS_DIR`` and a lock file
+guards against concurrent trains, so every uvicorn worker sees the same job
+status and at most one job runs at a time. The job publishes its weights
+with an atomic rename; each worker notices the new version within a few
+seconds and swaps in a warmed-up model (see app.ml.artifacts).
+"""
+import json
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Optional, Tuple
+
+JOBS_DIR = Path(__file__).parent / "ncf_jobs"
+LOCK_FILE = "train.lock"
+# How long a lock may exist without a running job before it counts as stale
+STARTUP_GRACE_SECONDS = 60
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+FINISHED_STATES = (SUCCEEDED, FAILED)
+
+# Trainable models, by the name the API uses
+MODELS = ("ncf", "mf")
+
+
+def _pid_alive(pid: Optional[int]) -> bool:
+    if not pid:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class TrainingJobStore:
+    """File-backed job records plus the single-flight training lock"""
+
+    def __init__(self, root: Path = JOBS_DIR):
+        self.root = Path(root)
+
+    def _job_path(self, job_id: str) -> Path:
+        return self.root / f"{job_id}.json"
+
+    def get(self, job_id: str) -> Optional[dict]:
+        try:
+            with open(self._job_path(job_id)) as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def save(self, job: dict) -> dict:
+        self.root.mkdir(parents=True, exist_ok=True)
+        path = self._job_path(job["job_id"])
+        tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(job, f)
+        os.replace(tmp_path, path)
+        return job
+
+    def update(self, job_id: str, **fields) -> Optional[dict]:
+        job = self.get(job_id)
+        if job is None:
+            return None
+        job.update(fields)
+        return self.save(job)
+
+    def lock_holder(self) -> Optional[str]:
+        """Job id holding the training lock, if any"""
+        try:
+            return (self.root / LOCK_FILE).read_text().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def try_lock(self, job_id: str) -> bool:
+        """Take the training lock for job_id; False if another live job holds it"""
+        self.root.mkdir(parents=True, exist_ok=True)
+        for _ in range(2):
+            try:
+                fd = os.open(self.root / LOCK_FILE, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except FileExistsError:
+                if not self._break_stale_lock():
+                    return False
+                continue
+            with os.fdopen(fd, "w") as f:
+                f.write(job_id)
+            return True
+        return False
+
+    def _break_stale_lock(self) -> bool:
+        """Remove the lock if its job finished or its process died; True if removed"""
+        holder = self.lock_holder()
+        job = self.get(holder) if holder else None
+        if job is None:
+            # The lock is taken before the job record is written; give that a moment
+            try:
+                if time.time() - (self.root / LOCK_FILE).stat().st_mtime < STARTUP_GRACE_SECONDS:
+                    return False
+            except FileNotFoundError:
+                return True
+        elif job["status"] not in FINISHED_STATES:
+            if job["status"] == QUEUED and time.time() - job["created_at"] < STARTUP_GRACE_SECONDS:
+                return False
+            if job["status"] == RUNNING and _pid_alive(job.get("pid")):
+                return False
+            self.update(holder, status=FAILED, finished_at=time.time(),
+                        message="Training process exited unexpectedly")
+        self.release(holder)
+        return True
+
+    def release(self, job_id: Optional[str]):
+        """Drop the lock if job_id still holds it"""
+        if self.lock_holder() == job_id:
+            try:
+                (self.root / LOCK_FILE).unlink()
+            except FileNotFoundError:
+                pass
+
+
+def _load_ratings():
+    """Stream the ratings table into typed arrays with a session of this process's own"""
+    from app.database import SessionLocal
+    from app.ml.ratings_loader import load_rating_arrays
+
+    db = SessionLocal()
+    try:
+        return load_rating_arrays(db)
+    finally:
+        db.close()
+
+
+def _new_model(name: str):
+    """(untrained model, minimum ratings it needs) for a name in MODELS"""
+    if name == "mf":
+        from app.ml.matrix_factorization import MatrixFactorization, MIN_RATINGS_FOR_MF
+        return MatrixFactorization(load=False), MIN_RATINGS_FOR_MF
+    from app.ml.neural_recommender import NeuralCollaborativeFilter, MIN_RATINGS_FOR_NCF
+    return NeuralCollaborativeFilter(load=False), MIN_RATINGS_FOR_NCF
+
+
+def _run_job(job_id: str, ratings, root: str, model: str = "ncf"):
+    """Entry point of the training process; loads the ratings itself unless given them"""
+    store = TrainingJobStore(Path(root))
+    store.update(job_id, status=RUNNING, pid=os.getpid(), started_at=time.time())
+
+    def progress(epoch: int, epochs: int, logs: dict):
+        store.update(job_id, progress={
+            "epoch": epoch,
+            "epochs": epochs,
+            "loss": float(logs["loss"]) if "loss" in logs else None,
+            "mae": float(logs["mae"]) if "mae" in logs else None,
+        })
+
+    try:
+        if ratings is None:
+            ratings = _load_ratings()
+        store.update(job_id, total_ratings=len(ratings))
+
+        trainer, min_ratings = _new_model(model)
+        if trainer.train(ratings, progress=progress):
+            store.update(job_id, status=SUCCEEDED, finished_at=time.time(),
+                         message=f"{model.upper()} model trained on {len(ratings)} ratings.")
+        elif len(ratings) < min_ratings:
+            store.update(job_id, status=FAILED, finished_at=time.time(),
+                         message=f"Need at least {min_ratings} ratings to train (have {len(ratings)}).")
+        else:
+            store.update(job_id, status=FAILED, finished_at=time.time(),
+                         message="Training failed (is TensorFlow installed?)" if model == "ncf" else "Training failed")
+    except Exception as e:
+        store.update(job_id, status=FAILED, finished_at=time.time(), message=f"Training error: {e}")
+    finally:
+        store.release(job_id)
+
+
+class TrainingScheduler:
+    """Starts training jobs in a spawned process, one at a time across all workers"""
+
+    def __init__(self, store: Optional[TrainingJobStore] = None):
+        self.store = store or TrainingJobStore()
+        # spawn, not fork: TensorFlow and uvicorn's threads do not survive a fork
+        self._context = multiprocessing.get_context("spawn")
+
+    def submit(self, ratings=None, model: str = "ncf") -> Tuple[dict, bool]:
+        """
+        (job, started): a new job training model (one of MODELS), or the job
+        already running with started=False. Without ratings, the training process streams them
+        from the database itself, so they are never copied through this one.
+        """
+        job_id = uuid.uuid4().hex
+        if not self.store.try_lock(job_id):
+            holder = self.store.lock_holder()
+            running = self.store.get(holder) if holder else None
+            return running or {"job_id": holder, "status": QUEUED}, False
+
+        job = self.store.save({
+            "job_id": job_id,
+            "status": QUEUED,
+            "model": model,
+            "total_ratings": len(ratings) if ratings is not None else None,
+            "progress": None,
+            "pid": None,
+            "created_at": time.time(),
+            "started_at": None,
+            "finished_at": None,
+            "message": None,
+        })
+        try:
+            process = self._context.Process(
+                target=_run_job, args=(job_id, ratings, str(self.store.root), model), daemon=False
+            )
+            process.start()
+        except Exception as e:
+            self.store.update(job_id, status=FAILED, finished_at=time.time(),
+                              message=f"Could not start training process: {e}")
+            self.store.release(job_id)
+            raise
+        # Reap the child and catch hard crashes that skip _run_job's own bookkeeping
+        threading.Thread(target=self._watch, args=(job_id, process), daemon=True).start()
+        return job, True
+
+    def _watch(self, job_id: str, process):
+        process.join()
+        job = self.store.get(job_id)
+        if job is not None and job["status"] not in FINISHED_STATES:
+            self.store.update(job_id, status=FAILED, finished_at=time.time(),
+                              message=f"Training process exited with code {process.exitcode}")
+        self.store.release(job_id)
+
+    def get(self, job_id: str) -> Optional[dict]:
+        return self.store.get(job_id)
+
+
+_scheduler_instance: Optional[TrainingScheduler] = None
+
+
+def get_training_scheduler() -> TrainingScheduler:
+    global _scheduler_instance
+    if _scheduler_instance is None:
+        _scheduler_instance = TrainingScheduler()
+    return _scheduler_instance
@@ -10,12 +10,18 @@ class Movie(BaseModel):
     cast: List[str]
     crew: List[str]
     vote_average: Optional[float] = None
+    runtime: Optional[int] = None
     poster_path: Optional[str] = None
 
 class MovieRecommendationRequest(BaseModel):
     title: str
     n_recommendations: int = Field(default=10, ge=1, le=50)
 
+class MultiSeedRecommendationRequest(BaseModel):
+    movie_ids: List[int] = Field(..., min_length=1, max_length=200)
+    weights: Optional[List[float]] = Field(default=None, description="One non-negative weight per movie id")
+    n_recommendations: int = Field(default=10, ge=1, le=50)
+
 class MoodRecommendationRequest(BaseModel):
     mood: str = Field(..., description="User's current mood")
     n_recommendations: int = Field(default=5, ge=1, le=20)
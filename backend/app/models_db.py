@@ -75,6 +75,49 @@ class MovieRating(Base):
         return f"<MovieRating user={self.user_id} movie={self.movie_title} rating={self.rating}>"
 
 
+class MovieCoRating(Base):
+    """
+    One entry of the item-item co-rating matrix, stored in both directions so
+    a movie's row is one primary-key range scan. dot is the sum over users who
+    rated both movies of the product of their centered ratings.
+    """
+    __tablename__ = "movie_co_ratings"
+    
+    movie_id = Column(Integer, primary_key=True)
+    other_movie_id = Column(Integer, primary_key=True)
+    dot = Column(Float, nullable=False, default=0.0)
+    co_count = Column(Integer, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f"<MovieCoRating {self.movie_id}-{self.other_movie_id} n={self.co_count}>"
+
+
+class MovieRatingStats(Base):
+    """Per-movie sum of squared centered ratings (the co-rating matrix diagonal)"""
+    __tablename__ = "movie_rating_stats"
+    
+    movie_id = Column(Integer, primary_key=True)
+    sum_sq = Column(Float, nullable=False, default=0.0)
+    rating_count = Column(Integer, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f"<MovieRatingStats movie={self.movie_id} n={self.rating_count}>"
+
+
+class UserProfileVersion(Base):
+    """
+    Counter bumped in the same transaction as every write to a user's ratings
+    or watchlist; recommendations built at an older version are stale
+    """
+    __tablename__ = "user_profile_versions"
+    
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f"<UserProfileVersion user={self.user_id} version={self.version}>"
+
+
 class RefreshToken(Base):
     __tablename__ = "refresh_tokens"
     
@@ -0,0 +1,264 @@
+"""
+Latency benchmarks for the recommender hot paths on a synthetic catalog
+Run: python benchmark_recommender.py [--movies 5000] [--requests 2000] [--only content|search|mood|popular|personalized|ann|mf]
+"""
+
+import argparse
+import difflib
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.metrics.pairwise import cosine_similarity
+
+from app.ml.ann import IVFIndex, default_n_lists, measure_recall
+from app.ml.batch_recommendations import personalized_rows
+from app.ml.candidates import MODEL_CANDIDATES
+from app.ml.matrix_factorization import MatrixFactorization
+from app.ml.neural_recommender import NeuralCollaborativeFilter
+from app.ml.ratings_loader import RatingArrays
+from app.ml.synthetic import build_recommender, make_synthetic_catalog, make_synthetic_ratings
+
+
+def measure(fn, args_list):
+    """Call fn once per args tuple and return latency percentiles in ms"""
+    timings = []
+    for args in args_list:
+        start = time.perf_counter()
+        fn(*args)
+        timings.append((time.perf_counter() - start) * 1000)
+    timings = np.array(timings)
+    return {
+        'p50': float(np.percentile(timings, 50)),
+        'p95': float(np.percentile(timings, 95)),
+        'p99': float(np.percentile(timings, 99)),
+    }
+
+
+def report(name, stats):
+    print(f"  {name:<28} p50={stats['p50']:8.3f}ms  p95={stats['p95']:8.3f}ms  p99={stats['p99']:8.3f}ms")
+
+
+def bench_content(recommender, movies_df, rng, n_requests):
+    """Dense sort-a-Python-list path vs. neighbor slice + batch gather"""
+    tfidf_matrix = TfidfVectorizer(stop_words='english', max_features=5000).fit_transform(movies_df['tags'])
+    cosine_sim = cosine_similarity(tfidf_matrix, tfidf_matrix)
+
+    def legacy(title, n):
+        idx = movies_df[movies_df['title'] == title].index[0]
+        sim_scores = sorted(enumerate(cosine_sim[idx]), key=lambda x: x[1], reverse=True)[1:n + 1]
+        return [recommender._format_movie(movies_df.iloc[i]) for i, _ in sim_scores]
+
+    titles = movies_df['title'].to_numpy()
+    args_list = [(titles[i], 10) for i in rng.integers(0, len(titles), n_requests)]
+
+    print("content-based recommendations (n=10)")
+    report("legacy dense sort", measure(legacy, args_list))
+    report("top-K neighbor slice", measure(recommender.get_content_based_recommendations, args_list))
+
+
+def bench_search(recommender, movies_df, rng, n_requests):
+    """Full-column str.contains scan vs. the n-gram title index, and difflib vs. fuzzy suggestions"""
+    def legacy(query, limit):
+        mask = movies_df['title'].str.lower().str.contains(query, na=False, regex=False)
+        return [recommender._format_movie(row) for _, row in movies_df[mask].head(limit).iterrows()]
+
+    titles = movies_df['title'].str.lower().to_numpy()
+    queries = []
+    for i in rng.integers(0, len(titles), n_requests):
+        start = int(rng.integers(0, max(1, len(titles[i]) - 3)))
+        queries.append((titles[i][start:start + int(rng.integers(2, 6))], 10))
+
+    print("title search (limit=10)")
+    report("legacy str.contains", measure(legacy, queries))
+    report("n-gram index", measure(recommender.search_movies, queries))
+    report("prefix autocomplete", measure(recommender.autocomplete_rows, [(t[:3], 10) for t, _ in queries]))
+
+    # One dropped character per title, as in a fast typist's "godfater"
+    typos = []
+    for i in rng.integers(0, len(titles), min(n_requests, 200)):
+        cut = int(rng.integers(0, len(titles[i])))
+        typos.append((titles[i][:cut] + titles[i][cut + 1:], 5))
+    title_list = movies_df['title'].tolist()
+
+    print("did-you-mean suggestions (one typo, n=5)")
+    report("legacy difflib", measure(lambda q, n: difflib.get_close_matches(q, title_list, n), typos))
+    report("q-gram + bounded Levenshtein", measure(recommender.suggest_titles, typos))
+
+
+def bench_mood(recommender, movies_df, rng, n_requests):
+    """iterrows genre filter + sort per request vs. sampling a prebuilt mood pool"""
+    def legacy(mood, n):
+        selected_genres = recommender.mood_genres[mood]
+        mood_movies = [movie for _, movie in movies_df.iterrows()
+                       if any(genre in selected_genres for genre in movie['genres'])]
+        mood_df = pd.DataFrame(mood_movies).sort_values('vote_average', ascending=False)
+        sampled = mood_df.head(n * 3).sample(min(n, len(mood_df)))
+        return [recommender._format_movie(row) for _, row in sampled.iterrows()]
+
+    moods = list(recommender.mood_genres)
+    args_list = [(moods[i], 5) for i in rng.integers(0, len(moods), n_requests)]
+
+    print("mood-based recommendations (n=5)")
+    report("legacy iterrows filter", measure(legacy, args_list[:50]))
+    report("genre bitmask mood pool", measure(recommender.get_mood_based_recommendations, args_list))
+
+
+def bench_popular(recommender, movies_df, rng, n_requests):
+    """Filter + sort_values + iterrows per call vs. slicing the load-time ranking"""
+    def legacy(n):
+        popular = movies_df[movies_df['vote_average'] >= 7.0].sort_values('vote_average', ascending=False)
+        return [recommender._format_movie(row) for _, row in popular.head(n).iterrows()]
+
+    print("popular movies (latency should not grow with n or catalog size)")
+    for n in (10, 20, 50):
+        args_list = [(n,)] * n_requests
+        report(f"legacy filter+sort n={n}", measure(legacy, args_list[:200]))
+        report(f"pre-ranked slice n={n}", measure(recommender.get_popular_movies, args_list))
+        report(f"bayesian slice n={n}", measure(lambda k: recommender.get_popular_movies(k, weighted=True), args_list))
+
+
+def bench_personalized(recommender, movies_df, rng, n_requests):
+    """Genre-weighted fallback: iterrows + Python sum + full sort vs. sparse scoring + argpartition"""
+    def legacy(ratings, n):
+        genre_weights = {}
+        for movie_id, rating in ratings.items():
+            row = recommender.get_movie_row(movie_id)
+            for genre in recommender.payloads.get(row)["genres"]:
+                genre_weights[genre] = genre_weights.get(genre, 0.0) + rating / 5.0
+        scored = []
+        for _, movie in movies_df.iterrows():
+            if movie["movie_id"] in ratings:
+                continue
+            quality = float(movie["vote_average"]) / 10.0 if pd.notna(movie["vote_average"]) else 0.0
+            scored.append((movie, sum(genre_weights.get(g, 0.0) for g in movie["genres"]) * 0.65 + quality * 0.35))
+        scored.sort(key=lambda x: x[1], reverse=True)
+        return [recommender._format_movie(m) for m, _ in scored[:n]]
+
+    def engine(ratings, n):
+        rows, _ = recommender.get_genre_weighted_rows(ratings, n)
+        return recommender.payloads.encode_list(rows)
+
+    def two_stage(ratings, n):
+        candidates = recommender.get_personalized_candidates(ratings)
+        rows, _ = recommender.rank_personalized(candidates, n)
+        return recommender.payloads.encode_list(rows)
+
+    movie_ids = movies_df['movie_id'].to_numpy()
+    args_list = []
+    for _ in range(n_requests):
+        rated = rng.choice(movie_ids, size=int(rng.integers(1, 30)), replace=False)
+        args_list.append(({int(m): float(rng.integers(1, 11)) for m in rated}, 10))
+
+    print("genre-weighted personalized recommendations (n=10)")
+    report("legacy iterrows scoring", measure(legacy, args_list[:20]))
+    report("sparse genre scorer", measure(engine, args_list))
+    report("two-stage retrieve + rank", measure(two_stage, args_list))
+    sizes = [len(recommender.get_personalized_candidates(ratings)) for ratings, _ in args_list[:200]]
+    print(f"  candidates per request: median={int(np.median(sizes))} max={max(sizes)} (catalog {len(movie_ids)})")
+
+
+def bench_ann(recommender, movies_df, rng, n_requests):
+    """recall@10 and per-query latency of IVF settings against exact cosine"""
+    tfidf_matrix = TfidfVectorizer(stop_words='english', max_features=5000).fit_transform(movies_df['tags'])
+    n_lists = default_n_lists(len(movies_df))
+
+    print(f"IVF neighbors vs exact cosine (k=10, {n_lists} lists)")
+    index = IVFIndex(n_lists=n_lists).fit(tfidf_matrix)
+    for n_probe in (2, 4, 8, 16, 32):
+        index.n_probe = n_probe
+        stats = measure_recall(index, k=10, sample_size=min(n_requests, 300))
+        print(f"  probe={n_probe:<4} recall@10={stats['recall@10']:.3f}  "
+              f"ann={stats['ann_ms']:.3f}ms  exact={stats['exact_ms']:.3f}ms")
+
+
+def bench_mf(recommender, movies_df, rng, n_requests):
+    """ALS matrix factorization vs. the Keras NCF: training time, held-out RMSE, scoring latency"""
+    movie_ids = movies_df['movie_id'].to_numpy()
+    ratings = make_synthetic_ratings(movie_ids, n_users=max(500, len(movie_ids) // 2))
+    test = rng.random(len(ratings)) < 0.1
+    train = RatingArrays(ratings.user_ids[~test], ratings.movie_ids[~test], ratings.ratings[~test])
+    held_out = [(int(u), int(m), float(r)) for u, m, r in
+                zip(ratings.user_ids[test], ratings.movie_ids[test], ratings.ratings[test])]
+    mean = float(train.ratings.mean())
+    baseline = np.sqrt(np.mean([(mean - r) ** 2 for _, _, r in held_out]))
+
+    def evaluate(model, scale):
+        errors = []
+        for user_id, movie_id, rating in held_out:
+            _, scores = model.score_candidates(user_id, [movie_id])
+            errors.append((float(scores[0]) * scale if len(scores) else mean) - rating)
+        return float(np.sqrt(np.mean(np.square(errors))))
+
+    user_ids = np.unique(train.user_ids)
+    args_list = [(int(u), movie_ids) for u in rng.choice(user_ids, n_requests)]
+
+    print(f"collaborative models ({len(train)} training ratings, {len(held_out)} held out; "
+          f"global-mean RMSE={baseline:.3f})")
+    candidates = [("ALS matrix factorization", MatrixFactorization(load=False), 1.0)]
+    try:
+        import tensorflow  # noqa: F401
+        candidates.append(("Keras NCF", NeuralCollaborativeFilter(load=False), 10.0))
+    except ImportError:
+        print("  (TensorFlow not installed; NCF skipped)")
+    for name, model, scale in candidates:
+        start = time.perf_counter()
+        model.train(train, save=False)
+        train_s = time.perf_counter() - start
+        print(f"  {name:<28} train={train_s:7.2f}s  RMSE={evaluate(model, scale):.3f}")
+        report(f"{name} score catalog", measure(model.score_candidates, args_list))
+        if name.startswith("ALS"):
+            bench_mf_retrieval(recommender, model, train, args_list)
+
+
+def bench_mf_retrieval(recommender, model, train, args_list):
+    """Retrieval from the MF factor index vs. scoring the catalog, alone and end to end"""
+    recalls = []
+    for user_id, movie_ids in args_list[:200]:
+        ids, scores = model.score_candidates(user_id, movie_ids)
+        exact = set(ids[np.argsort(-scores, kind="stable")[:50]].tolist())
+        recalls.append(len(exact & set(model.retrieve(user_id, MODEL_CANDIDATES)[0].tolist())) / len(exact))
+    print(f"  MF retrieval of {MODEL_CANDIDATES}: recall of the exact top 50 = {np.mean(recalls):.3f}")
+    report(f"MF retrieve top {MODEL_CANDIDATES}", measure(lambda u, _: model.retrieve(u, MODEL_CANDIDATES), args_list))
+
+    by_user = {}
+    for user_id, movie_id, rating in zip(train.user_ids.tolist(), train.movie_ids.tolist(), train.ratings.tolist()):
+        by_user.setdefault(user_id, {})[movie_id] = rating
+    requests = [(user_id, by_user[user_id]) for user_id, _ in args_list]
+    models = {"mf": model}
+    for two_stage, label in ((False, "full catalog"), (True, "two-stage")):
+        report(f"personalized mf n=10 ({label})", measure(
+            lambda u, r: personalized_rows(recommender, models, u, r, (), 10, "mf", two_stage), requests
+        ))
+
+
+BENCHMARKS = {
+    'content': bench_content,
+    'search': bench_search,
+    'mood': bench_mood,
+    'popular': bench_popular,
+    'personalized': bench_personalized,
+    'ann': bench_ann,
+    'mf': bench_mf,
+}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--movies", type=int, default=5000)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--only", choices=sorted(BENCHMARKS), default=None)
+    args = parser.parse_args()
+
+    movies_df = make_synthetic_catalog(args.movies)
+    rng = np.random.default_rng(0)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        recommender = build_recommender(movies_df, Path(workdir))
+        for name, bench in BENCHMARKS.items():
+            if args.only and name != args.only:
+                continue
+            bench(recommender, movies_df, rng, args.requests)
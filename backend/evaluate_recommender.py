@@ -0,0 +1,270 @@
+"""
+Offline evaluation of the recommenders: ranking quality and serving latency per method
+Run: python evaluate_recommender.py [--source synthetic|db] [--k 10] [--output report.json] [--compare previous.json]
+
+Each user's ratings are split into a training part and a held-out part
+(--holdout of them, at random). Collaborative models are trained on the
+training part only; every method then recommends k movies per user from
+that user's training ratings, and held-out ratings >= LIKED_RATING count as
+the relevant movies. Reported per method: recall@k, NDCG@k, catalog coverage,
+p50/p95/p99 latency and throughput. The JSON report records the commit and
+configuration, so runs on different commits can be compared with --compare.
+"""
+
+import argparse
+import json
+import subprocess
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.ml.batch_recommendations import personalized_rows
+from app.ml.candidates import LIKED_RATING
+from app.ml.matrix_factorization import MatrixFactorization
+from app.ml.neural_recommender import NeuralCollaborativeFilter
+from app.ml.neighbors import top_n_indices
+from app.ml.ratings_loader import RatingArrays
+from app.ml.recommender import MovieRecommender
+from app.ml.synthetic import build_recommender, make_synthetic_catalog, make_synthetic_ratings
+
+# Users with fewer ratings than this are not evaluated (nothing left to train on)
+MIN_USER_RATINGS = 5
+
+# Metrics where a drop is a regression; latency (ms) regresses when it grows
+HIGHER_IS_BETTER = ("recall", "ndcg", "coverage", "throughput")
+
+
+def split_ratings(ratings: RatingArrays, holdout: float, seed: int) -> Tuple[RatingArrays, RatingArrays]:
+    """(train, held out), holding out a fraction of each eligible user's ratings"""
+    rng = np.random.default_rng(seed)
+    _, user_idx, counts = np.unique(ratings.user_ids, return_inverse=True, return_counts=True)
+    test = (rng.random(len(ratings)) < holdout) & (counts[user_idx] >= MIN_USER_RATINGS)
+    pick = lambda mask: RatingArrays(ratings.user_ids[mask], ratings.movie_ids[mask], ratings.ratings[mask])
+    return pick(~test), pick(test)
+
+
+def group_by_user(ratings: RatingArrays) -> Dict[int, Dict[int, float]]:
+    """{user_id: {movie_id: rating}}"""
+    users: Dict[int, Dict[int, float]] = {}
+    for user_id, movie_id, rating in zip(ratings.user_ids.tolist(), ratings.movie_ids.tolist(), ratings.ratings.tolist()):
+        users.setdefault(user_id, {})[movie_id] = rating
+    return users
+
+
+def recall_at_k(recommended: List[int], relevant: set, k: int) -> float:
+    return len(set(recommended[:k]) & relevant) / len(relevant)
+
+
+def ndcg_at_k(recommended: List[int], relevant: set, k: int) -> float:
+    """Binary-relevance NDCG: a hit at position i (0-based) is worth 1 / log2(i + 2)"""
+    dcg = sum(1.0 / np.log2(i + 2) for i, movie_id in enumerate(recommended[:k]) if movie_id in relevant)
+    ideal = sum(1.0 / np.log2(i + 2) for i in range(min(len(relevant), k)))
+    return dcg / ideal
+
+
+def build_methods(recommender: MovieRecommender, models: Dict[str, object], k: int) -> Dict[str, Callable]:
+    """{name: fn(user_id, {movie_id: rating}) -> top k movie ids}, for every method the API serves"""
+    ids = recommender.movie_ids
+
+    def popular(user_id, ratings):
+        rows = recommender.popularity.top(k + len(ratings), weighted=True)
+        return [m for m in ids[rows].tolist() if m not in ratings][:k]
+
+    def content(user_id, ratings):
+        liked = {m: r for m, r in ratings.items() if r >= LIKED_RATING} or ratings
+        rows, _ = recommender.get_multi_seed_rows(list(liked), [r / 10.0 for r in liked.values()], k)
+        return ids[rows].tolist()
+
+    def genre(user_id, ratings):
+        rows, _ = recommender.get_genre_weighted_rows(ratings, k)
+        return ids[rows].tolist()
+
+    def personalized(method, two_stage=None):
+        # What the personalized route serves for this method, two_stage=None choosing by catalog size
+        def recommend(user_id, ratings):
+            rows, _ = personalized_rows(recommender, models, user_id, ratings, (), k, method, two_stage)
+            return ids[rows].tolist()
+        return recommend
+
+    def full_catalog(model):
+        # The model alone over every movie, without retrieval: the quality ceiling two-stage trades for latency
+        def recommend(user_id, ratings):
+            movie_ids, scores = model.score_candidates(user_id, ids, ratings)
+            scores = np.where(np.isin(movie_ids, list(ratings)), -np.inf, scores)
+            return movie_ids[top_n_indices(scores, k)].tolist()
+        return recommend
+
+    methods = {
+        "popular": popular,
+        "content": content,
+        "genre": genre,
+        "personalized_genre": personalized("genre"),
+        "two_stage_genre": personalized("genre", two_stage=True),
+    }
+    for name, model in models.items():
+        methods[f"personalized_{name}"] = personalized(name)
+        methods[f"two_stage_{name}"] = personalized(name, two_stage=True)
+        methods[f"{name}_full_catalog"] = full_catalog(model)
+    return methods
+
+
+def train_models(train: RatingArrays) -> Dict[str, object]:
+    """The collaborative models, trained on the training split only (never saved)"""
+    models = {}
+    trainers = [("mf", MatrixFactorization(load=False))]
+    try:
+        import tensorflow  # noqa: F401
+        trainers.append(("ncf", NeuralCollaborativeFilter(load=False)))
+    except ImportError:
+        print("(TensorFlow not installed; NCF skipped)")
+    for name, model in trainers:
+        start = time.perf_counter()
+        if model.train(train, save=False):
+            models[name] = model
+            print(f"trained {name} on {len(train)} ratings in {time.perf_counter() - start:.2f}s")
+        else:
+            print(f"{name} could not be trained on {len(train)} ratings; skipped")
+    return models
+
+
+def evaluate(
+    method: Callable,
+    users: List[Tuple[int, Dict[int, float], set]],
+    k: int,
+    catalog_size: int,
+) -> dict:
+    """Ranking metrics and per-call latency of one method over the evaluation users"""
+    recalls, ndcgs, timings = [], [], []
+    recommended_ids = set()
+    for user_id, ratings, relevant in users:
+        start = time.perf_counter()
+        recommended = method(user_id, ratings)
+        timings.append((time.perf_counter() - start) * 1000)
+        recalls.append(recall_at_k(recommended, relevant, k))
+        ndcgs.append(ndcg_at_k(recommended, relevant, k))
+        recommended_ids.update(recommended)
+    timings = np.array(timings)
+    return {
+        "recall": float(np.mean(recalls)),
+        "ndcg": float(np.mean(ndcgs)),
+        "coverage": len(recommended_ids) / catalog_size,
+        "p50_ms": float(np.percentile(timings, 50)),
+        "p95_ms": float(np.percentile(timings, 95)),
+        "p99_ms": float(np.percentile(timings, 99)),
+        "throughput": len(timings) / (timings.sum() / 1000),
+    }
+
+
+def evaluation_users(train: RatingArrays, held_out: RatingArrays, max_users: int, seed: int):
+    """(user_id, training ratings, relevant held-out movie ids) for users with at least one relevant movie"""
+    train_by_user = group_by_user(train)
+    users = []
+    for user_id, ratings in group_by_user(held_out).items():
+        relevant = {m for m, r in ratings.items() if r >= LIKED_RATING}
+        if relevant and user_id in train_by_user:
+            users.append((user_id, train_by_user[user_id], relevant))
+    if len(users) > max_users:
+        keep = np.random.default_rng(seed).choice(len(users), max_users, replace=False)
+        users = [users[i] for i in sorted(keep)]
+    return users
+
+
+def load_source(args, workdir: Path) -> Tuple[MovieRecommender, RatingArrays]:
+    if args.source == "db":
+        from app.database import SessionLocal
+        from app.ml.ratings_loader import load_rating_arrays
+        from app.ml.recommender import _data_path
+
+        db = SessionLocal()
+        try:
+            ratings = load_rating_arrays(db)
+        finally:
+            db.close()
+        return MovieRecommender(str(_data_path())), ratings
+
+    movies_df = make_synthetic_catalog(args.movies, seed=args.seed)
+    recommender = build_recommender(movies_df, workdir)
+    ratings = make_synthetic_ratings(movies_df['movie_id'].to_numpy(), n_users=args.users, seed=args.seed)
+    return recommender, ratings
+
+
+def current_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=Path(__file__).parent,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_report(report: dict, previous: Optional[dict] = None):
+    k = report["config"]["k"]
+    print(f"{'method':<24} {'recall@' + str(k):>10} {'ndcg@' + str(k):>9} {'coverage':>9} "
+          f"{'p50':>9} {'p95':>9} {'p99':>9} {'req/s':>9}")
+    for name, m in report["methods"].items():
+        print(f"{name:<24} {m['recall']:10.4f} {m['ndcg']:9.4f} {m['coverage']:9.4f} "
+              f"{m['p50_ms']:7.3f}ms {m['p95_ms']:7.3f}ms {m['p99_ms']:7.3f}ms {m['throughput']:9.0f}")
+        before = (previous or {}).get("methods", {}).get(name)
+        if before:
+            deltas = []
+            for metric, value in m.items():
+                if metric not in before or not before[metric]:
+                    continue
+                change = (value - before[metric]) / abs(before[metric]) * 100
+                worse = change < 0 if metric in HIGHER_IS_BETTER else change > 0
+                deltas.append(f"{metric} {change:+.1f}%{' !' if worse and abs(change) >= 5 else ''}")
+            print(f"{'':<24} vs {str(previous.get('commit'))[:8]}: " + ", ".join(deltas))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--source", choices=("synthetic", "db"), default="synthetic")
+    parser.add_argument("--movies", type=int, default=5000, help="synthetic catalog size")
+    parser.add_argument("--users", type=int, default=2000, help="synthetic users")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--holdout", type=float, default=0.2, help="fraction of each user's ratings held out")
+    parser.add_argument("--max-users", type=int, default=1000, help="users evaluated (sampled)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", type=Path, default=None, help="write the JSON report here")
+    parser.add_argument("--compare", type=Path, default=None, help="earlier JSON report to diff against")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        recommender, ratings = load_source(args, Path(workdir))
+        train, held_out = split_ratings(ratings, args.holdout, args.seed)
+        users = evaluation_users(train, held_out, args.max_users, args.seed)
+        if not users:
+            raise SystemExit("No user has a held-out rating >= LIKED_RATING; nothing to evaluate")
+        print(f"{args.source}: {len(recommender.movie_ids)} movies, {len(train)} training ratings, "
+              f"{len(held_out)} held out, {len(users)} users evaluated")
+
+        models = train_models(train)
+        recommender.warm_up()
+        results = {}
+        for name, method in build_methods(recommender, models, args.k).items():
+            # One untimed pass over a few users so lazy loads do not land in the percentiles
+            for user_id, user_ratings, _ in users[:5]:
+                method(user_id, user_ratings)
+            results[name] = evaluate(method, users, args.k, len(recommender.movie_ids))
+
+    report = {
+        "commit": current_commit(),
+        "created_at": time.time(),
+        "config": {name: str(value) if isinstance(value, Path) else value for name, value in vars(args).items()},
+        "dataset": {
+            "movies": int(len(recommender.movie_ids)),
+            "train_ratings": len(train),
+            "held_out_ratings": len(held_out),
+            "users_evaluated": len(users),
+        },
+        "methods": results,
+    }
+    previous = json.loads(args.compare.read_text()) if args.compare else None
+    print_report(report, previous)
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2))
+        print(f"report written to {args.output}")
@@ -0,0 +1,53 @@
+"""
+Shared fixtures. The settings point at a throwaway SQLite file before any
+app module is imported, so tests never touch a real database.
+"""
+import os
+import tempfile
+
+import pytest
+
+_TMP_DIR = tempfile.mkdtemp(prefix="movie-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{_TMP_DIR}/test.db"
+os.environ.setdefault("SECRET_KEY", "test-secret-key")
+
+
+@pytest.fixture
+def db():
+    """A session on freshly created, empty tables"""
+    from app import models_db  # noqa: F401  (registers the tables)
+    from app.database import Base, SessionLocal, engine
+
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+@pytest.fixture
+def make_user(db):
+    """make_user(i) -> a committed active User"""
+    from app.models_db import User
+
+    def make(i: int) -> User:
+        user = User(email=f"user{i}@example.com", username=f"user{i}", hashed_password="x")
+        db.add(user)
+        db.commit()
+        return user
+    return make
+
+
+@pytest.fixture(scope="session")
+def movies_df():
+    from app.ml.synthetic import make_synthetic_catalog
+    return make_synthetic_catalog(400, seed=1)
+
+
+@pytest.fixture(scope="session")
+def recommender(movies_df, tmp_path_factory):
+    """A MovieRecommender over a small synthetic catalog saved in a temp dir"""
+    from app.ml.synthetic import build_recommender
+    return build_recommender(movies_df, tmp_path_factory.mktemp("catalog"))
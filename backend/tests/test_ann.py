@@ -0,0 +1,60 @@
+"""IVF approximate neighbors against the exact index"""
+import numpy as np
+import pytest
+from scipy.sparse import csr_matrix
+
+from app.ml.ann import (
+    ANN_AUTO_THRESHOLD, IVFIndex, build_ann_neighbor_index, exact_query_row, measure_recall, select_neighbor_method,
+)
+from app.ml.neighbors import build_neighbor_index
+
+
+@pytest.fixture(scope="module")
+def vectors():
+    """L2-normalised rows around a few topics, so clusters mean something"""
+    rng = np.random.default_rng(0)
+    topics = rng.random((6, 60)) * (rng.random((6, 60)) < 0.3)
+    dense = topics[rng.integers(0, 6, 300)] + 0.2 * rng.random((300, 60)) * (rng.random((300, 60)) < 0.2)
+    dense /= np.linalg.norm(dense, axis=1, keepdims=True)
+    return csr_matrix(dense.astype(np.float32))
+
+
+def test_inverted_lists_partition_the_rows(vectors):
+    index = IVFIndex(n_lists=12).fit(vectors)
+    assert index.list_indptr[-1] == vectors.shape[0]
+    assert sorted(index.list_members.tolist()) == list(range(vectors.shape[0]))
+
+
+def test_probing_every_list_is_exact(vectors):
+    index = IVFIndex(n_lists=12, n_probe=12).fit(vectors)
+    exact = build_neighbor_index(vectors, top_k=10, n_jobs=1)
+    approx = build_ann_neighbor_index(index, top_k=10, block_size=64, n_jobs=1)
+    for row in range(vectors.shape[0]):
+        np.testing.assert_allclose(approx.neighbors(row)[1], exact.neighbors(row)[1], rtol=1e-5)
+        _, scores = exact_query_row(vectors, row, 10)
+        np.testing.assert_allclose(scores, exact.neighbors(row)[1], rtol=1e-5)
+        assert row not in approx.neighbors(row)[0]
+
+
+def test_process_pool_build_matches_in_process(vectors):
+    index = IVFIndex(n_lists=12, n_probe=4).fit(vectors)
+    inline = build_ann_neighbor_index(index, top_k=10, block_size=50, n_jobs=1)
+    pooled = build_ann_neighbor_index(index, top_k=10, block_size=50, n_jobs=2)
+    np.testing.assert_array_equal(inline.indptr, pooled.indptr)
+    np.testing.assert_array_equal(inline.indices, pooled.indices)
+    np.testing.assert_allclose(inline.scores, pooled.scores)
+
+
+def test_partial_probe_keeps_most_neighbors(vectors):
+    index = IVFIndex(n_lists=12, n_probe=4).fit(vectors)
+    report = measure_recall(index, k=10, sample_size=100)
+    assert report["sample_size"] == 100
+    assert report["recall@10"] >= 0.8
+
+
+def test_select_neighbor_method():
+    assert select_neighbor_method(5000) == "exact"
+    assert select_neighbor_method(ANN_AUTO_THRESHOLD + 1) == "ann"
+    assert select_neighbor_method(10, "ann") == "ann"
+    with pytest.raises(ValueError):
+        select_neighbor_method(10, "hnsw")
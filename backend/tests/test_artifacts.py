@@ -0,0 +1,119 @@
+"""Hot-swappable artifact slots"""
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from app.ml import artifacts
+from app.ml.artifacts import ArtifactSlot, artifact_versions
+
+
+@pytest.fixture(autouse=True)
+def registry(monkeypatch):
+    """Keep test slots out of the serving registry"""
+    monkeypatch.setattr(artifacts, "_slots", {})
+
+
+class Disk:
+    """A fake published artifact: a version, and what loading it yields"""
+
+    def __init__(self):
+        self.version = 1
+        self.fail = False
+        self.loads = 0
+        self.warmed = []
+
+    def load(self):
+        self.loads += 1
+        if self.fail:
+            raise OSError("corrupt artifact")
+        time.sleep(0.01)
+        return {"version": self.version}
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def test_first_requests_share_one_load():
+    disk = Disk()
+    slot = ArtifactSlot("model", version=lambda: disk.version, load=disk.load, warm=disk.warmed.append)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(slot.get())) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert disk.loads == 1
+    assert all(result is results[0] for result in results)
+    assert disk.warmed == [results[0]]
+    assert artifact_versions() == (("model", 1),)
+
+
+def test_new_version_is_swapped_in_the_background():
+    disk = Disk()
+    slot = ArtifactSlot("model", version=lambda: disk.version, load=disk.load, check_interval=0.0)
+    old = slot.get()
+    disk.version = 2
+    # The request that notices the change is still served the old instance
+    assert slot.get() is old
+    wait_for(lambda: slot.get()["version"] == 2)
+    assert old == {"version": 1}
+    assert disk.loads == 2
+    assert slot.status()["version"] == "2"
+
+
+def test_version_checks_are_rate_limited():
+    disk = Disk()
+    slot = ArtifactSlot("model", version=lambda: disk.version, load=disk.load, check_interval=3600.0)
+    slot.get()
+    slot.get()
+    disk.version = 2
+    assert slot.get() == {"version": 1}
+    time.sleep(0.05)
+    assert disk.loads == 1
+
+
+def test_failed_load_keeps_serving_and_is_not_retried():
+    disk = Disk()
+    slot = ArtifactSlot("model", version=lambda: disk.version, load=disk.load, check_interval=0.0)
+    old = slot.get()
+    disk.version, disk.fail = 2, True
+    slot.get()
+    wait_for(lambda: slot.status()["last_error"] is not None)
+    wait_for(lambda: not slot.status()["reloading"])
+    for _ in range(5):
+        assert slot.get() is old
+    time.sleep(0.05)
+    assert disk.loads == 2
+
+    disk.version, disk.fail = 3, False
+    slot.get()
+    wait_for(lambda: slot.get()["version"] == 3)
+    assert slot.status()["last_error"] is None
+
+
+def test_reload_and_set():
+    disk = Disk()
+    slot = ArtifactSlot("model", version=lambda: disk.version, load=disk.load)
+    slot.get()
+    disk.version = 5
+    slot.reload(wait=True)
+    assert slot.get() == {"version": 5}
+    slot.set({"prebuilt": True}, version="x")
+    assert slot.get() == {"prebuilt": True}
+    assert artifact_versions() == (("model", "x"),)
+
+
+def test_npz_publish_round_trip(tmp_path):
+    path = tmp_path / "factors.npz"
+    assert artifacts.file_version(path) is None
+    artifacts.save_npz(path, ids=np.arange(3), scale=np.float64(0.5))
+    assert artifacts.file_version(path) == path.stat().st_mtime_ns
+    assert [p.name for p in tmp_path.iterdir()] == ["factors.npz"]
+    data = artifacts.load_npz(path)
+    assert data["ids"].tolist() == [0, 1, 2] and float(data["scale"]) == 0.5
@@ -0,0 +1,79 @@
+"""Precomputed lists: same as online ranking, invalidated by the user's profile version"""
+import asyncio
+
+import pytest
+
+from app.api import user_routes
+from app.api.user_routes import MovieRatingCreate, _precomputed_body, rate_movie
+from app.ml import batch_recommendations as batch
+from app.ml.matrix_factorization import MatrixFactorization
+from app.ml.recommendation_cache import read_profile_version
+from app.ml.synthetic import make_synthetic_ratings
+from app.models_db import MovieRating
+
+N_USERS = 40
+
+
+@pytest.fixture
+def rated_users(db, make_user, recommender):
+    """N_USERS users with synthetic ratings in the database, and their ratings by user id"""
+    users = [make_user(i) for i in range(N_USERS)]
+    ratings = make_synthetic_ratings(recommender.movie_ids, n_users=N_USERS, ratings_per_user=15, seed=3)
+    by_user = {}
+    for user_id, movie_id, rating in zip(ratings.user_ids.tolist(), ratings.movie_ids.tolist(), ratings.ratings.tolist()):
+        by_user.setdefault(users[user_id - 1].id, {})[movie_id] = rating
+    db.bulk_insert_mappings(MovieRating, [
+        {"user_id": user_id, "movie_id": movie_id, "movie_title": f"Movie {movie_id}", "rating": rating}
+        for user_id, user_ratings in by_user.items() for movie_id, rating in user_ratings.items()
+    ])
+    db.commit()
+    return users, by_user
+
+
+@pytest.fixture
+def models(rated_users, recommender):
+    _, by_user = rated_users
+    model = MatrixFactorization(load=False)
+    assert model.train([
+        {"user_id": user_id, "movie_id": movie_id, "rating": rating}
+        for user_id, user_ratings in by_user.items() for movie_id, rating in user_ratings.items()
+    ], save=False)
+    return {"mf": model}
+
+
+@pytest.fixture
+def precomputed(db, recommender, models, monkeypatch, tmp_path):
+    """Runs the batch inline over the test users and returns the published lists"""
+    monkeypatch.setattr(batch, "_PRECOMPUTED_PATH", tmp_path / "precomputed.npz")
+    monkeypatch.setattr(batch, "_init_worker", lambda: batch._worker.update(recommender=recommender, models=models))
+    assert batch.precompute_recommendations(db, workers=1, chunk_size=7) == N_USERS
+    published = batch.PrecomputedRecommendations()
+    monkeypatch.setattr(user_routes, "get_precomputed", lambda: published)
+    return published
+
+
+def test_precomputed_lists_match_online_ranking(precomputed, rated_users, recommender, models):
+    users, by_user = rated_users
+    assert len(precomputed) == N_USERS
+    for user in users:
+        movie_ids, used, version, rating_count = precomputed.lookup(user.id)
+        rows, online_used = batch.personalized_rows(recommender, models, user.id, by_user[user.id], (), batch.PRECOMPUTED_N)
+        assert movie_ids.tolist() == recommender.movie_ids[rows].tolist()
+        assert used == online_used
+        assert (version, rating_count) == (0, len(by_user[user.id]))
+    assert precomputed.lookup(10_000) is None
+
+
+def test_write_invalidates_precomputed_list(db, precomputed, rated_users, recommender):
+    users, by_user = rated_users
+    user, other = users[0], users[1]
+    assert _precomputed_body(recommender, user.id, read_profile_version(db, user.id), 10) is not None
+
+    unrated = next(m for m in recommender.movie_ids.tolist() if m not in by_user[user.id])
+    body = MovieRatingCreate(movie_id=unrated, movie_title="New", rating=8.0)
+    asyncio.run(rate_movie(body, current_user=user, db=db))
+
+    assert read_profile_version(db, user.id) == 1
+    assert _precomputed_body(recommender, user.id, read_profile_version(db, user.id), 10) is None
+    # Other users keep their lists
+    assert _precomputed_body(recommender, other.id, read_profile_version(db, other.id), 10) is not None
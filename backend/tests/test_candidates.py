@@ -0,0 +1,163 @@
+"""Two-stage retrieval and ranking of personalized recommendations"""
+import numpy as np
+import pytest
+
+from app.ml.batch_recommendations import personalized_rows
+from app.ml.candidates import (
+    GENRE_RANKING_WEIGHTS, MODEL_CANDIDATES, MODEL_RANKING_WEIGHTS, POPULAR_CANDIDATES, TWO_STAGE_MIN_CATALOG,
+    Candidates, rank_candidates,
+)
+from app.ml.matrix_factorization import MatrixFactorization
+from app.ml.neural_recommender import NeuralCollaborativeFilter
+from app.ml.synthetic import make_synthetic_ratings
+
+
+@pytest.fixture(scope="module")
+def model(recommender):
+    ratings = make_synthetic_ratings(recommender.movie_ids, n_users=200, ratings_per_user=25, seed=9)
+    trained = MatrixFactorization(load=False)
+    assert trained.train(ratings, save=False)
+    return trained
+
+
+@pytest.fixture(scope="module")
+def user_ratings(recommender):
+    ids = recommender.movie_ids.tolist()
+    return {ids[i]: float(1 + i % 10) for i in range(0, 60, 3)}
+
+
+def test_candidates_cover_every_source_and_skip_rated_movies(recommender, model, user_ratings):
+    watchlist = [recommender.movie_ids[1].item(), recommender.movie_ids[3].item()]
+    model_rows, _ = recommender.get_model_candidates(model, 1, user_ratings, 100)
+    assert len(model_rows) == 100
+    candidates = recommender.get_personalized_candidates(user_ratings, watchlist, model_rows)
+    rows = set(candidates.rows.tolist())
+
+    assert not set(recommender.movie_ids[candidates.rows].tolist()) & set(user_ratings)
+    assert set(model_rows.tolist()) <= rows
+    popular = set(recommender.popularity.top(POPULAR_CANDIDATES, weighted=True).tolist())
+    assert popular - {recommender.get_movie_row(m) for m in user_ratings} <= rows
+    assert len(np.unique(candidates.rows)) == len(candidates)
+
+
+def test_content_scores_are_the_seed_weighted_neighbor_sum(recommender, user_ratings):
+    candidates = recommender.get_personalized_candidates(user_ratings)
+    liked = {m: r for m, r in user_ratings.items() if r >= 6.0}
+    seeds = [recommender.get_movie_row(m) for m in liked]
+    weights = np.array([r / 10.0 for r in liked.values()], dtype=np.float32)
+    expected = recommender.neighbors.aggregate(seeds, weights) / weights.sum()
+    np.testing.assert_allclose(candidates.content, expected[candidates.rows], rtol=1e-5, atol=1e-7)
+
+
+def test_mf_retrieval_finds_the_models_top_movies(recommender, model, user_ratings):
+    movie_ids, scores = model.score_candidates(10_000, model.movie_ids, user_ratings)
+    exact = movie_ids[np.argsort(-scores, kind="stable")[:50]]
+    retrieved_ids, retrieved_scores = model.retrieve(10_000, 100, user_ratings)
+
+    assert len(retrieved_ids) == 100
+    assert len(np.intersect1d(exact, retrieved_ids)) >= 45
+    # Exact model scores, best first
+    assert retrieved_scores.tolist() == sorted(retrieved_scores.tolist(), reverse=True)
+    np.testing.assert_allclose(retrieved_scores, model.score_candidates(10_000, retrieved_ids, user_ratings)[1], rtol=1e-5)
+
+    rows, row_scores = recommender.get_model_candidates(model, 10_000, user_ratings, 40)
+    assert len(rows) == 40 and not set(recommender.movie_ids[rows].tolist()) & set(user_ratings)
+    np.testing.assert_allclose(row_scores, model.score_candidates(10_000, recommender.movie_ids[rows], user_ratings)[1], rtol=1e-5)
+
+
+class CountingModel:
+    """Records the movie ids a model is asked to score"""
+
+    def __init__(self, model):
+        self.model = model
+        self.scored = []
+
+    def __getattr__(self, name):
+        return getattr(self.model, name)
+
+    def score_candidates(self, user_id, candidate_movie_ids, ratings=None):
+        self.scored.extend(np.asarray(candidate_movie_ids).tolist())
+        return self.model.score_candidates(user_id, candidate_movie_ids, ratings)
+
+
+def test_ranking_reuses_retrieval_scores(recommender, model, user_ratings):
+    counting = CountingModel(model)
+    model_rows, model_scores = recommender.get_model_candidates(counting, 10_000, user_ratings, 100)
+    candidates = recommender.get_personalized_candidates(user_ratings, (), model_rows)
+    preference = recommender.model_preference(candidates, counting, 10_000, user_ratings, model_rows, model_scores)
+
+    # Each candidate is scored once: retrieved ones by retrieval, the rest in one batch
+    candidate_ids = recommender.movie_ids[candidates.rows]
+    assert not set(counting.scored) & set(recommender.movie_ids[model_rows].tolist())
+    assert sorted(counting.scored + recommender.movie_ids[model_rows].tolist()) == sorted(candidate_ids.tolist())
+    known_ids, known_scores = model.score_candidates(10_000, candidate_ids, user_ratings)
+    expected = np.full(len(candidates), np.nan)
+    expected[np.isin(candidate_ids, known_ids)] = known_scores
+    np.testing.assert_allclose(preference, expected, rtol=1e-5)
+
+
+def test_models_without_an_index_retrieve_nothing(recommender, user_ratings):
+    ncf = NeuralCollaborativeFilter(load=False)
+    rows, scores = recommender.get_model_candidates(ncf, 10_000, user_ratings)
+    assert len(rows) == 0 == len(scores)
+
+
+def test_rank_candidates_blends_scaled_signals():
+    candidates = Candidates(
+        np.array([0, 1, 2, 3]),
+        content=np.array([0.0, 1.0, 0.5, 0.5], dtype=np.float32),
+        affinity=np.array([2.0, 0.0, 1.0, 1.0], dtype=np.float32),
+    )
+    quality = np.array([0.5, 0.9, 0.1, 0.7])
+
+    rows, scores = rank_candidates(candidates, quality, 4)
+    p, c, q = GENRE_RANKING_WEIGHTS
+    expected = p * np.array([1.0, 0.0, 0.5, 0.5]) + c * np.array([0.0, 1.0, 0.5, 0.5]) + q * quality
+    assert rows.tolist() == np.argsort(-expected, kind="stable").tolist()
+    np.testing.assert_allclose(scores, np.sort(expected)[::-1], rtol=1e-6)
+
+    # NaN preferences count as the candidates' mean
+    rows, scores = rank_candidates(candidates, quality, 2, np.array([9.0, np.nan, 5.0, 7.0]))
+    p, c, q = MODEL_RANKING_WEIGHTS
+    expected = p * np.array([1.0, 0.5, 0.0, 0.5]) + c * np.array([0.0, 1.0, 0.5, 0.5]) + q * quality
+    assert rows.tolist() == np.argsort(-expected, kind="stable")[:2].tolist()
+
+    empty = Candidates(np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32), np.empty(0, dtype=np.float32))
+    assert len(rank_candidates(empty, quality, 5)[0]) == 0
+
+
+@pytest.mark.parametrize("two_stage", [False, True])
+def test_personalized_rows_serve_unrated_movies(recommender, model, user_ratings, two_stage):
+    for models, expected_method in (({"mf": model}, "mf"), ({}, "genre")):
+        rows, used = personalized_rows(recommender, models, 10_000, user_ratings, (), 20, "auto", two_stage)
+        assert used == expected_method
+        assert len(rows) == 20 == len(set(rows))
+        assert not set(recommender.movie_ids[rows].tolist()) & set(user_ratings)
+
+
+def test_full_catalog_model_path_is_the_models_top_n(recommender, model, user_ratings):
+    rows, used = personalized_rows(recommender, {"mf": model}, 10_000, user_ratings, (), 15, "mf", two_stage=False)
+    movie_ids, scores = model.score_candidates(10_000, recommender.movie_ids, user_ratings)
+    unrated = ~np.isin(movie_ids, list(user_ratings))
+    expected = movie_ids[unrated][np.argsort(-scores[unrated], kind="stable")][:15]
+    assert recommender.movie_ids[rows].tolist() == expected.tolist()
+
+
+def test_batch_model_rows_match_per_user_rows(recommender, model, user_ratings):
+    trained_user = int(model._user_ids[0])
+    items = list(user_ratings.items())
+    users = {
+        10_000: user_ratings,  # folded in
+        trained_user: dict(items[:int(model._user_rating_counts[0])]),  # as many ratings as trained on: trained vector
+        20_000: dict(items[:2]),  # too few ratings to score
+    }
+
+    batched = recommender.get_model_rows_batch(model, users, 25)
+    assert set(batched) == {10_000, trained_user}
+    for user_id in batched:
+        assert batched[user_id] == recommender.get_model_rows(model, user_id, users[user_id], 25)
+
+
+def test_two_stage_only_for_large_catalogs(recommender):
+    assert len(recommender.movie_ids) < TWO_STAGE_MIN_CATALOG
+    assert not recommender.uses_two_stage
@@ -0,0 +1,95 @@
+"""Versioned catalog artifact: save, memory-mapped open and the CURRENT switch"""
+import json
+
+import numpy as np
+import pytest
+
+from app.ml import catalog as catalog_module
+from app.ml.catalog import Catalog, catalog_exists, resolve_catalog_path
+from app.ml.neighbors import NeighborIndex
+from app.ml.payloads import format_movie
+
+
+@pytest.fixture
+def build(movies_df):
+    """build(seed) -> a fresh in-memory Catalog of the synthetic movies"""
+    def make(seed: int = 0) -> Catalog:
+        rng = np.random.default_rng(seed)
+        sim = rng.random((len(movies_df), len(movies_df))).astype(np.float32)
+        return Catalog.from_dataframe(movies_df, NeighborIndex.from_dense(sim, top_k=8), {"seed": seed})
+    return make
+
+
+def test_round_trip(build, movies_df, tmp_path):
+    built = build()
+    version_dir = built.save(str(tmp_path))
+    opened = Catalog.open(str(tmp_path))
+
+    assert opened.path == version_dir
+    assert opened.version == built.version
+    assert len(opened) == len(movies_df)
+    assert isinstance(opened.arrays["movie_id"], np.memmap)
+    for name, array in built.arrays.items():
+        np.testing.assert_array_equal(opened.arrays[name], array)
+    assert opened.titles() == movies_df["title"].tolist()
+    assert opened.genre_names == built.genre_names
+    assert opened.aggregates == built.aggregates
+    assert opened.manifest["build"] == {"seed": 0}
+
+    records = movies_df.to_dict("records")
+    payloads = opened.payloads
+    for row in (0, 17, len(records) - 1):
+        assert payloads.get(row) == format_movie(records[row])
+        assert set(opened.search_payloads.get(row)) == set(catalog_module.SEARCH_FIELDS)
+    rows, scores = opened.neighbors.neighbors(5)
+    np.testing.assert_array_equal(rows, built.neighbors.neighbors(5)[0])
+    np.testing.assert_array_equal(scores, built.neighbors.neighbors(5)[1])
+
+
+def test_save_switches_current_and_keeps_the_previous_version(build, tmp_path):
+    assert not catalog_exists(str(tmp_path))
+    first = build(0)
+    first_dir = first.save(str(tmp_path))
+    reader = Catalog.open(str(tmp_path))
+
+    second = build(1)
+    second_dir = second.save(str(tmp_path))
+    assert second.version != first.version
+    assert resolve_catalog_path(str(tmp_path)) == second_dir
+    assert Catalog.open(str(tmp_path)).manifest["build"] == {"seed": 1}
+
+    # A reader of the old version keeps working; its directory is left in place
+    assert first_dir.exists()
+    assert reader.titles() == first.titles()
+    assert Catalog.open(str(first_dir)).version == first.version
+    assert not list(tmp_path.glob(".*"))
+
+
+def test_save_keeps_only_the_previous_version(build, tmp_path):
+    first_dir = build(0).save(str(tmp_path))
+    reader = Catalog.open(str(tmp_path))
+    second_dir = build(1).save(str(tmp_path))
+    third_dir = build(2).save(str(tmp_path))
+
+    versions = sorted(path for path in tmp_path.iterdir() if path.is_dir())
+    assert versions == sorted([second_dir, third_dir])
+    assert resolve_catalog_path(str(tmp_path)) == third_dir
+    # Memory maps of a deleted version stay readable
+    assert reader.titles() == build(0).titles()
+    assert not first_dir.exists()
+
+
+def test_versions_are_unique_within_one_second(build, tmp_path):
+    built = build()
+    versions = {built.save(str(tmp_path)).name for _ in range(3)}
+    assert len(versions) == 3
+    assert resolve_catalog_path(str(tmp_path)).name == built.version
+
+
+def test_open_rejects_other_format_versions(build, tmp_path):
+    version_dir = build().save(str(tmp_path))
+    manifest = json.loads((version_dir / catalog_module.MANIFEST_FILE).read_text())
+    manifest["format_version"] = catalog_module.CATALOG_FORMAT_VERSION + 1
+    (version_dir / catalog_module.MANIFEST_FILE).write_text(json.dumps(manifest))
+    with pytest.raises(ValueError):
+        Catalog.open(str(tmp_path))
@@ -0,0 +1,44 @@
+"""Genre bitmasks and mood pools against per-movie genre lists"""
+import numpy as np
+import pytest
+
+from app.ml.genres import MAX_GENRES, GenreIndex, MoodPools, genre_bitmasks
+
+GENRE_NAMES = ["Action", "Comedy", "Drama", "Horror", "Romance"]
+MOVIE_GENRES = [["Action"], ["Comedy", "Romance"], [], ["Drama", "Horror", "Action"], ["Romance"], ["Comedy"]]
+
+
+@pytest.fixture
+def genre_index():
+    ids = [[GENRE_NAMES.index(g) for g in genres] for genres in MOVIE_GENRES]
+    indptr = np.concatenate([[0], np.cumsum([len(g) for g in ids])])
+    genre_ids = np.array([g for movie in ids for g in movie], dtype=np.int16)
+    return GenreIndex(GENRE_NAMES, genre_bitmasks(indptr, genre_ids))
+
+
+def test_rows_with_any_matches_genre_lists(genre_index):
+    for query in (["Action"], ["Romance", "Horror"], ["Western"], [], ["Comedy", "Western"]):
+        expected = [row for row, genres in enumerate(MOVIE_GENRES) if set(genres) & set(query)]
+        assert genre_index.rows_with_any(query).tolist() == expected
+    assert genre_index.ids_for(["Drama", "Western", "Action"]).tolist() == [2, 0]
+
+
+def test_too_many_genres_rejected():
+    with pytest.raises(ValueError):
+        genre_bitmasks(np.array([0, 1]), np.array([MAX_GENRES]))
+
+
+def test_mood_pools_rank_by_rating_and_sample_from_the_top(genre_index):
+    ratings = np.array([7.0, 9.0, 8.0, np.nan, 6.0, 5.0])
+    pools = MoodPools(genre_index, ratings, {"happy": ["Comedy", "Romance"], "tense": ["Horror"], "none": ["Western"]})
+
+    assert pools.pools["happy"].tolist() == [1, 4, 5]
+    assert pools.pools["tense"].tolist() == [3]
+    assert "happy" in pools and "sad" not in pools
+    assert len(pools.sample("none", 5)) == 0
+
+    rng = np.random.default_rng(0)
+    for _ in range(20):
+        sample = pools.sample("happy", 1, oversample=2, rng=rng)
+        assert len(sample) == 1 and sample[0] in (1, 4)
+    assert sorted(pools.sample("happy", 10, rng=rng).tolist()) == [1, 4, 5]
@@ -0,0 +1,123 @@
+"""Incremental co-rating maintenance (the rating routes) against a full rebuild"""
+import asyncio
+import random
+import threading
+
+import pytest
+from sqlalchemy import event
+
+from app.api.user_routes import MovieRatingCreate, delete_rating, rate_movie
+from app.database import SessionLocal, engine
+from app.ml.item_similarity import RATING_CENTER, co_rating_similarities, rebuild_item_similarity, record_rating_change
+from app.ml.recommendation_cache import bump_profile_version
+from app.models_db import MovieCoRating, MovieRating, MovieRatingStats
+
+
+def rate(db, user, movie_id, rating):
+    body = MovieRatingCreate(movie_id=movie_id, movie_title=f"Movie {movie_id}", rating=rating)
+    asyncio.run(rate_movie(body, current_user=user, db=db))
+
+
+def unrate(db, user, movie_id):
+    asyncio.run(delete_rating(movie_id, current_user=user, db=db))
+
+
+def snapshot(db):
+    """The live rows of both tables (writes may leave zero rows behind; a rebuild does not)"""
+    db.expire_all()
+    stats = {
+        row.movie_id: (pytest.approx(row.sum_sq), row.rating_count)
+        for row in db.query(MovieRatingStats).filter(MovieRatingStats.rating_count > 0)
+    }
+    pairs = {
+        (row.movie_id, row.other_movie_id): (pytest.approx(row.dot), row.co_count)
+        for row in db.query(MovieCoRating).filter(MovieCoRating.co_count > 0)
+    }
+    return stats, pairs
+
+
+def assert_matches_rebuild(db):
+    incremental = snapshot(db)
+    rebuild_item_similarity(db)
+    rebuilt = snapshot(db)
+    assert incremental[0] == rebuilt[0]
+    assert incremental[1] == rebuilt[1]
+
+
+def test_incremental_updates_match_rebuild(db, make_user):
+    rng = random.Random(7)
+    users = [make_user(i) for i in range(6)]
+    movie_ids = list(range(100, 112))
+    for _ in range(300):
+        user = rng.choice(users)
+        movie_id = rng.choice(movie_ids)
+        rated = db.query(MovieRating).filter_by(user_id=user.id, movie_id=movie_id).first() is not None
+        if rated and rng.random() < 0.3:
+            unrate(db, user, movie_id)
+        else:
+            rate(db, user, movie_id, float(rng.randint(1, 10)))
+
+    assert db.query(MovieRating).count() > 0
+    assert_matches_rebuild(db)
+
+
+def test_similarities_follow_writes(db, make_user):
+    users = [make_user(i) for i in range(3)]
+    for user in users:
+        rate(db, user, 1, 9.0)
+        rate(db, user, 2, 8.0)
+    other_ids, similarities = co_rating_similarities(db, 1)
+    assert other_ids.tolist() == [2]
+    assert similarities[0] > 0
+
+    for user in users[1:]:
+        unrate(db, user, 2)
+    other_ids, _ = co_rating_similarities(db, 1)
+    assert other_ids.tolist() == []
+
+
+def test_concurrent_writes_for_one_user_serialize(db, make_user):
+    user = make_user(0)
+    rate(db, user, 1, 7.0)
+    rate(db, user, 2, 4.0)
+
+    # A first write re-rates movie 1 and holds the user's lock while a second one starts
+    first = SessionLocal()
+    bump_profile_version(first, user.id)
+
+    second_writes = threading.Event()
+
+    def on_execute(conn, cursor, statement, parameters, context, executemany):
+        # The second write's first write statement, which must wait for the first to commit
+        if threading.current_thread().name == "second-write" and not statement.lstrip().upper().startswith("SELECT"):
+            second_writes.set()
+
+    def second_write():
+        session = SessionLocal()
+        try:
+            rate(session, session.merge(user), 1, 2.0)
+        finally:
+            session.close()
+
+    event.listen(engine, "before_cursor_execute", on_execute)
+    try:
+        thread = threading.Thread(target=second_write, name="second-write")
+        thread.start()
+        assert second_writes.wait(timeout=10)
+        record_rating_change(first, user.id, 1, 7.0, 9.0)
+        first.query(MovieRating).filter_by(user_id=user.id, movie_id=1).update({"rating": 9.0})
+        first.commit()
+        first.close()
+        thread.join(timeout=10)
+    finally:
+        event.remove(engine, "before_cursor_execute", on_execute)
+    assert not thread.is_alive()
+
+    # Without the lock the second write reads the rating as 7, not 9, and the sums drift
+    db.expire_all()
+    assert db.query(MovieRating).filter_by(user_id=user.id, movie_id=1).one().rating == 2.0
+    pair = db.get(MovieCoRating, (1, 2))
+    assert pair.co_count == 1
+    assert pair.dot == pytest.approx((2.0 - RATING_CENTER) * (4.0 - RATING_CENTER))
+    assert db.get(MovieRatingStats, 1).sum_sq == pytest.approx((2.0 - RATING_CENTER) ** 2)
+    assert_matches_rebuild(db)
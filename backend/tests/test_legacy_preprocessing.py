@@ -0,0 +1,47 @@
+"""Genre statistics of the Streamlit app (src/) on the frame src/preprocessing.py pickles"""
+import json
+import sys
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "src"))
+from preprocessing import build_movie_frame, genre_stats  # noqa: E402
+
+
+def names(*values):
+    return json.dumps([{"id": i, "name": value} for i, value in enumerate(values)])
+
+
+@pytest.fixture
+def preprocessed():
+    """Rows shaped like the TMDB 5000 CSVs, run through the preprocessing step"""
+    movies = pd.DataFrame({
+        "id": [1, 2, 3, 4],
+        "title": ["Alpha", "Beta", "Gamma", "Delta"],
+        "overview": ["a", "b", "c", "d"],
+        "genres": [names("Drama", "Comedy"), names("Drama"), names(), names("Horror")],
+        "keywords": [names("space"), names(), names("heist"), names()],
+        "vote_average": [8.0, 6.0, 7.0, 5.0],
+        "vote_count": [10, 20, 30, 40],
+    })
+    credits = pd.DataFrame({
+        "movie_id": [1, 2, 3, 4],
+        "title": ["Alpha", "Beta", "Gamma", "Delta"],
+        "cast": [names("Ann")] * 4,
+        "crew": [json.dumps([{"name": "Dee", "job": "Director"}])] * 4,
+    })
+    return build_movie_frame(movies, credits)
+
+
+def test_genre_stats_on_preprocessed_frame(preprocessed):
+    stats = genre_stats(preprocessed)
+    assert stats["count"].to_dict() == {"Drama": 2, "Comedy": 1, "Horror": 1}
+    assert stats["mean"].to_dict() == {"Drama": 7.0, "Comedy": 8.0, "Horror": 5.0}
+
+
+def test_genre_counts_without_vote_average(preprocessed):
+    stats = genre_stats(preprocessed.drop(columns="vote_average"))
+    assert stats["count"].to_dict() == {"Drama": 2, "Comedy": 1, "Horror": 1}
+    assert stats["mean"].isna().all()
@@ -0,0 +1,87 @@
+"""ALS matrix factorization: fit quality, fold-in and the published factors"""
+import numpy as np
+import pytest
+
+from app.ml import matrix_factorization
+from app.ml.matrix_factorization import MIN_RATINGS_FOR_MF, MatrixFactorization
+from app.ml.ratings_loader import RatingArrays
+from app.ml.synthetic import make_synthetic_ratings
+
+
+@pytest.fixture(scope="module")
+def split():
+    ratings = make_synthetic_ratings(np.arange(1, 301), n_users=300, ratings_per_user=40, seed=5)
+    test = np.random.default_rng(5).random(len(ratings)) < 0.1
+    pick = lambda mask: RatingArrays(ratings.user_ids[mask], ratings.movie_ids[mask], ratings.ratings[mask])
+    return pick(~test), pick(test)
+
+
+@pytest.fixture(scope="module")
+def model(split):
+    train, _ = split
+    losses = []
+    trained = MatrixFactorization(load=False)
+    assert trained.train(train, save=False, progress=lambda i, n, logs: losses.append(logs["loss"]))
+    trained.losses = losses
+    return trained
+
+
+def predict(model, ratings: RatingArrays) -> np.ndarray:
+    predictions = []
+    for user_id, movie_id in zip(ratings.user_ids.tolist(), ratings.movie_ids.tolist()):
+        _, scores = model.score_candidates(user_id, [movie_id])
+        predictions.append(scores[0] if len(scores) else model.global_mean)
+    return np.array(predictions)
+
+
+def test_training_loss_decreases(model):
+    assert len(model.losses) > 1
+    assert model.losses[-1] < model.losses[0]
+
+
+def test_beats_the_global_mean_on_held_out_ratings(model, split):
+    _, test = split
+    rmse = np.sqrt(np.mean((predict(model, test) - test.ratings) ** 2))
+    baseline = np.sqrt(np.mean((model.global_mean - test.ratings) ** 2))
+    assert rmse < 0.9 * baseline
+
+
+def test_new_users_are_folded_in(model, split):
+    train, _ = split
+    user_id = int(train.user_ids[0])
+    mask = train.user_ids == user_id
+    ratings = dict(zip(train.movie_ids[mask].tolist(), train.ratings[mask].tolist()))
+
+    assert model.is_ready_for_user(10_000, ratings)
+    assert not model.is_ready_for_user(10_000, dict(list(ratings.items())[:MIN_RATINGS_FOR_MF - 1]))
+    assert not model.is_ready_for_user(10_000, {100_000 + i: 8.0 for i in range(10)})
+
+    candidates = list(ratings) + [999_999]
+    trained_ids, trained_scores = model.score_candidates(user_id, candidates)
+    folded_ids, folded_scores = model.score_candidates(10_000, candidates, ratings)
+    assert folded_ids.tolist() == trained_ids.tolist() == list(ratings)
+    # The same solve against the same movie factors lands close to the trained user
+    assert np.corrcoef(trained_scores, folded_scores)[0, 1] > 0.9
+
+
+def test_published_factors_round_trip(split, tmp_path, monkeypatch):
+    monkeypatch.setattr(matrix_factorization, "_FACTORS_PATH", tmp_path / "mf_factors.npz")
+    assert matrix_factorization.factors_version() is None
+    train, _ = split
+    trained = MatrixFactorization(load=False)
+    assert trained.train(train, iterations=3)
+    assert not list(tmp_path.glob(".*"))
+
+    loaded = MatrixFactorization()
+    assert loaded.is_trained and loaded.version == matrix_factorization.factors_version()
+    np.testing.assert_array_equal(loaded.movie_ids, trained.movie_ids)
+    user_id = int(train.user_ids[0])
+    np.testing.assert_allclose(
+        loaded.score_candidates(user_id, loaded.movie_ids)[1], trained.score_candidates(user_id, trained.movie_ids)[1]
+    )
+
+
+def test_too_few_ratings_do_not_train():
+    model = MatrixFactorization(load=False)
+    assert not model.train([{"user_id": 1, "movie_id": 1, "rating": 5.0}], save=False)
+    assert not model.is_ready_for_user(1, {1: 5.0})
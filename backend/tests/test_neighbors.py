@@ -0,0 +1,84 @@
+"""Top-K neighbor index against brute-force cosine similarity"""
+import numpy as np
+import pytest
+from scipy.sparse import csr_matrix
+
+from app.ml.neighbors import NeighborIndex, build_neighbor_index, top_n_indices, top_n_per_row
+
+
+@pytest.fixture(scope="module")
+def vectors():
+    """L2-normalised sparse rows, like the TF-IDF matrix"""
+    rng = np.random.default_rng(0)
+    dense = rng.random((230, 40)) * (rng.random((230, 40)) < 0.3)
+    dense[:, 0] += 0.01  # no all-zero rows
+    dense /= np.linalg.norm(dense, axis=1, keepdims=True)
+    return csr_matrix(dense.astype(np.float32))
+
+
+def brute_force(vectors, k):
+    sim = (vectors @ vectors.T).toarray()
+    np.fill_diagonal(sim, -np.inf)
+    order = np.argsort(-sim, axis=1, kind="stable")[:, :k]
+    return order, np.take_along_axis(sim, order, axis=1)
+
+
+def test_top_n_indices_matches_sort():
+    scores = np.random.default_rng(1).random(500)
+    for n in (0, 1, 10, 500, 600):
+        assert top_n_indices(scores, n).tolist() == np.argsort(-scores)[:n].tolist()
+
+
+def test_top_n_per_row_matches_top_n_indices():
+    # Rounded so rows have ties, which both break by index
+    scores = np.round(np.random.default_rng(2).random((6, 80)), 1)
+    scores[2, :5] = -np.inf
+    for n in (0, 1, 10, 80, 100):
+        top = top_n_per_row(scores, n)
+        assert top.shape == (6, min(n, 80))
+        assert top.tolist() == [top_n_indices(row, n).tolist() for row in scores]
+
+
+@pytest.mark.parametrize("block_size", [1024, 64, 7])
+def test_build_matches_brute_force(vectors, block_size):
+    index = build_neighbor_index(vectors, top_k=15, block_size=block_size, n_jobs=1)
+    expected_rows, expected_scores = brute_force(vectors, 15)
+
+    assert len(index) == vectors.shape[0]
+    assert index.top_k == 15
+    for row in range(len(index)):
+        rows, scores = index.neighbors(row)
+        assert row not in rows
+        assert rows.tolist() == expected_rows[row].tolist()
+        np.testing.assert_allclose(scores, expected_scores[row], rtol=1e-5)
+
+
+def test_process_pool_build_matches_in_process(vectors):
+    inline = build_neighbor_index(vectors, top_k=10, block_size=50, n_jobs=1)
+    pooled = build_neighbor_index(vectors, top_k=10, block_size=50, n_jobs=2)
+    np.testing.assert_array_equal(inline.indptr, pooled.indptr)
+    np.testing.assert_array_equal(inline.indices, pooled.indices)
+    np.testing.assert_allclose(inline.scores, pooled.scores)
+
+
+def test_top_k_capped_by_catalog_size():
+    sim = np.eye(4, dtype=np.float32) + 0.1
+    index = NeighborIndex.from_dense(sim, top_k=50)
+    assert index.top_k == 3
+    assert index.neighbors(2, n=2)[0].shape == (2,)
+
+
+def test_aggregate_matches_dense_sum(vectors):
+    index = build_neighbor_index(vectors, top_k=12, n_jobs=1)
+    seeds = np.array([3, 17, 17, 120])
+    weights = np.array([1.0, 0.5, 0.25, -0.8], dtype=np.float32)
+
+    expected = np.zeros(len(index), dtype=np.float64)
+    for row, weight in zip(seeds, weights):
+        rows, scores = index.neighbors(row)
+        np.add.at(expected, rows, weight * scores)
+
+    np.testing.assert_allclose(index.aggregate(seeds, weights), expected, rtol=1e-5, atol=1e-6)
+    rows, summed = index.aggregate_sparse(seeds, weights)
+    assert rows.tolist() == sorted(set(np.concatenate([index.neighbors(row)[0] for row in seeds]).tolist()))
+    np.testing.assert_allclose(summed, expected[rows], rtol=1e-5, atol=1e-6)
@@ -0,0 +1,142 @@
+"""NCF NumPy inference and fold-in against reference computations of the Keras architecture"""
+import numpy as np
+import pytest
+
+from app.ml import neural_recommender
+from app.ml.neural_recommender import NeuralCollaborativeFilter
+
+N_USERS, N_MOVIES, DIM = 12, 60, 8
+
+
+def random_weights(rng) -> dict:
+    """Weights shaped like _export_weights output for the _build_model network"""
+    shapes = {
+        "user_emb": (N_USERS, DIM),
+        "movie_emb": (N_MOVIES, DIM),
+        "hidden_1_kernel": (2 * DIM, 64),
+        "hidden_1_bias": (64,),
+        "hidden_2_kernel": (64, 32),
+        "hidden_2_bias": (32,),
+        "output_kernel": (32, 1),
+        "output_bias": (1,),
+    }
+    return {name: (rng.normal(0.0, 0.5, size=shape)).astype(np.float32) for name, shape in shapes.items()}
+
+
+@pytest.fixture
+def model():
+    ncf = NeuralCollaborativeFilter(embedding_dim=DIM, load=False)
+    ncf.user_to_idx = {100 + i: i for i in range(N_USERS)}
+    # Sorted like np.unique in train(), but sparse, so ids and embedding rows differ
+    ncf.movie_to_idx = {7 * i + 3: i for i in range(N_MOVIES)}
+    ncf._set_weights(random_weights(np.random.default_rng(0)))
+    ncf.is_trained = True
+    return ncf
+
+
+def reference_scores(weights: dict, user_vec: np.ndarray, movie_idx: np.ndarray) -> np.ndarray:
+    """Concatenate, Dense(relu), Dense(relu), Dense(sigmoid), one movie at a time"""
+    scores = []
+    for idx in movie_idx:
+        x = np.concatenate([user_vec, weights["movie_emb"][idx]]).astype(np.float64)
+        x = np.maximum(x @ weights["hidden_1_kernel"] + weights["hidden_1_bias"], 0.0)
+        x = np.maximum(x @ weights["hidden_2_kernel"] + weights["hidden_2_bias"], 0.0)
+        z = float((x @ weights["output_kernel"] + weights["output_bias"])[0])
+        scores.append(1.0 / (1.0 + np.exp(-z)))
+    return np.array(scores)
+
+
+def test_forward_matches_reference(model):
+    movie_idx = np.array([5, 0, 59, 5, 31])
+    for user_idx in (0, 7):
+        user_vec = model.weights["user_emb"][user_idx]
+        np.testing.assert_allclose(
+            model._forward(user_vec, movie_idx), reference_scores(model.weights, user_vec, movie_idx), rtol=1e-5
+        )
+
+
+def test_score_candidates_maps_ids_and_skips_unknown(model):
+    known_ids = list(model.movie_to_idx)[10:16]
+    candidates = known_ids[:3] + [1, 2] + known_ids[3:]
+    movie_ids, scores = model.score_candidates(105, candidates)
+    assert movie_ids.tolist() == known_ids
+    expected = reference_scores(model.weights, model.weights["user_emb"][5], [model.movie_to_idx[m] for m in known_ids])
+    np.testing.assert_allclose(scores, expected, rtol=1e-5)
+    assert model.predict_for_user(105, candidates) == pytest.approx(dict(zip(known_ids, expected)), rel=1e-5)
+
+
+def test_score_matrix_matches_forward(model, monkeypatch):
+    # Groups of two users, so the grouping is exercised
+    monkeypatch.setattr(neural_recommender, "SCORE_MATRIX_BLOCK", 2 * N_MOVIES * 64)
+    vectors = [model.weights["user_emb"][i] for i in range(5)]
+    scores = model._score_matrix(vectors)
+    assert scores.shape == (5, N_MOVIES)
+    for vector, row in zip(vectors, scores):
+        np.testing.assert_allclose(row, model._forward(vector, np.arange(N_MOVIES)), rtol=1e-5)
+
+    user_ids, matrix = model.score_users([100, 999, 103], {999: {1: 8.0}})
+    assert user_ids == [100, 103]
+    np.testing.assert_allclose(matrix, scores[[0, 3]], rtol=1e-5)
+
+
+def test_forward_matches_keras(model):
+    pytest.importorskip("tensorflow")
+    keras_model = model._build_model(N_USERS, N_MOVIES)
+    w = model.weights
+    keras_model.get_layer("user_emb").set_weights([w["user_emb"]])
+    keras_model.get_layer("movie_emb").set_weights([w["movie_emb"]])
+    for name in ("hidden_1", "hidden_2", "output"):
+        keras_model.get_layer(name).set_weights([w[f"{name}_kernel"], w[f"{name}_bias"]])
+
+    movie_idx = np.arange(N_MOVIES)
+    user_idx = np.full(N_MOVIES, 3)
+    expected = keras_model.predict([user_idx, movie_idx], verbose=0).ravel()
+    np.testing.assert_allclose(model._forward(w["user_emb"][3], movie_idx), expected, rtol=1e-4, atol=1e-6)
+
+
+def fold_in_loss(model, user_vec, ratings) -> float:
+    """The training loss fold_in minimizes, without its L2 term"""
+    movie_idx = np.array([model.movie_to_idx[m] for m in ratings])
+    targets = np.array(list(ratings.values())) / 10.0
+    return float(np.mean((model._forward(user_vec, movie_idx) - targets) ** 2))
+
+
+def test_fold_in_lowers_the_training_loss(model):
+    ids = list(model.movie_to_idx)
+    ratings = {movie_id: float(rating) for movie_id, rating in zip(ids[:8], [9, 2, 8, 1, 10, 3, 7, 2])}
+    folded = model.fold_in(ratings)
+    assert folded is not None and folded.shape == (DIM,)
+    prior = model.weights["user_emb"].mean(axis=0)
+    assert fold_in_loss(model, folded, ratings) < 0.5 * fold_in_loss(model, prior, ratings)
+
+
+def test_fold_in_ranks_liked_movies_above_disliked(model):
+    # Ratings a hidden user would give, so the network can fit them: its five
+    # favourite and five least favourite of the first 30 movies
+    hidden_user = np.random.default_rng(2).normal(0.0, 0.5, size=DIM).astype(np.float32)
+    ids = np.array(list(model.movie_to_idx))[:30]
+    true_scores = model._forward(hidden_user, np.arange(30))
+    order = np.argsort(-true_scores)
+    liked, disliked = ids[order[:5]].tolist(), ids[order[-5:]].tolist()
+    ratings = {movie_id: 10.0 * float(true_scores[ids.tolist().index(movie_id)]) for movie_id in liked + disliked}
+
+    movie_ids, scores = model.score_candidates(999, liked + disliked, ratings)
+    assert movie_ids.tolist() == liked + disliked
+    assert scores[: len(liked)].min() > scores[len(liked):].max()
+
+
+def test_too_few_known_ratings_fall_back(model):
+    ids = list(model.movie_to_idx)
+    few = {movie_id: 8.0 for movie_id in ids[:4]}
+    # Unknown movies do not count toward the minimum
+    mostly_unknown = {**few, 1: 8.0, 2: 8.0}
+    for ratings in (few, mostly_unknown):
+        assert model.fold_in(ratings) is None
+        assert not model.is_ready_for_user(999, ratings)
+        assert model.score_candidates(999, ids, ratings)[0].size == 0
+    assert model.is_ready_for_user(999, {**few, ids[4]: 8.0})
+
+    # A trained user whose rating count matches training keeps the trained embedding
+    model._user_rating_counts = np.full(N_USERS, 4)
+    np.testing.assert_array_equal(model.user_vector(100, few), model.weights["user_emb"][0])
+    np.testing.assert_array_equal(model.user_vector(100), model.weights["user_emb"][0])
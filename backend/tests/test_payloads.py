@@ -0,0 +1,47 @@
+"""Pre-encoded payloads and responses spliced from them"""
+import json
+
+import numpy as np
+from fastapi.responses import JSONResponse
+
+from app.ml.payloads import PayloadStore, RawJSON, encode_response, format_movie
+
+
+def test_format_movie_maps_missing_values_to_none(movies_df):
+    movie = movies_df.iloc[0].to_dict()
+    movie.update(overview=float("nan"), vote_average=float("nan"), runtime=float("nan"))
+    payload = format_movie(movie)
+    assert payload["overview"] is None and payload["vote_average"] is None and payload["runtime"] is None
+    assert payload["movie_id"] == int(movies_df.iloc[0]["movie_id"])
+
+
+def test_store_round_trips_payloads(movies_df):
+    payloads = [format_movie(movie) for movie in movies_df.head(30).to_dict("records")]
+    store = PayloadStore.from_payloads(payloads)
+    assert len(store) == 30
+    for row, payload in enumerate(payloads):
+        assert json.loads(store.json_bytes(row)) == payload
+    assert json.loads(store.encode_list([4, 0, 4])) == [payloads[4], payloads[0], payloads[4]]
+    assert json.loads(store.encode_list([])) == []
+
+
+def test_memory_mapped_blob_decodes_each_row_once(movies_df):
+    payloads = [format_movie(movie) for movie in movies_df.head(10).to_dict("records")]
+    built = PayloadStore.from_payloads(payloads)
+    # As Catalog.open hands it over: a uint8 array and no dicts
+    store = PayloadStore(np.frombuffer(built.blob, dtype=np.uint8), built.offsets)
+    first = store.get(3)
+    assert first == payloads[3]
+    assert store.get(3) is first
+    assert store.get_many([3, 5]) == [payloads[3], payloads[5]]
+
+
+def test_encode_response_matches_json_response(movies_df):
+    payloads = [format_movie(movie) for movie in movies_df.head(5).to_dict("records")]
+    store = PayloadStore.from_payloads(payloads)
+    body = {"recommendations": payloads, "method": "popular", "message": "Übersicht", "count": 5}
+    expected = JSONResponse(body).body
+
+    assert encode_response(body) == expected
+    assert encode_response({**body, "recommendations": store.encode_list(range(5))}) == expected
+    assert isinstance(store.encode_list([0]), RawJSON)
@@ -0,0 +1,66 @@
+"""Sparse genre-weighted scoring against the per-movie loop it replaced"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.ml.personalization import GenreWeightedScorer
+from app.ml.synthetic import build_recommender, make_synthetic_catalog
+
+
+@pytest.fixture(scope="module")
+def catalog(tmp_path_factory):
+    """Synthetic catalog with some genre-less movies and missing ratings"""
+    movies = make_synthetic_catalog(300, seed=3)
+    movies.loc[::10, "genres"] = pd.Series([[] for _ in range(len(movies[::10]))], index=movies.index[::10])
+    movies.loc[::15, "vote_average"] = np.nan
+    return movies, build_recommender(movies, tmp_path_factory.mktemp("genre-catalog"))
+
+
+def legacy_scores(movies: pd.DataFrame, ratings: dict) -> dict:
+    """The old user_routes fallback: DataFrame scan per rating, Python sum per movie"""
+    genre_weights = {}
+    for movie_id, rating in ratings.items():
+        movie_data = movies[movies["movie_id"] == movie_id]
+        if movie_data.empty:
+            continue
+        for genre in movie_data.iloc[0]["genres"]:
+            genre_weights[genre] = genre_weights.get(genre, 0.0) + rating / 5.0
+    scored = {}
+    for row, movie in enumerate(movies.itertuples()):
+        if movie.movie_id in ratings:
+            continue
+        quality = float(movie.vote_average) / 10.0 if pd.notna(movie.vote_average) else 0.0
+        scored[row] = sum(genre_weights.get(g, 0.0) for g in movie.genres) * 0.65 + quality * 0.35
+    return scored
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_matches_legacy_loop(catalog, seed):
+    movies, recommender = catalog
+    rng = np.random.default_rng(seed)
+    rated = rng.choice(movies["movie_id"].to_numpy(), size=int(rng.integers(1, 25)), replace=False)
+    # Include a genre-less movie and an id missing from the catalog
+    ratings = {int(m): float(rng.integers(1, 11)) for m in rated}
+    ratings[int(movies["movie_id"].iloc[0])] = 9.0
+    ratings[1] = 10.0
+
+    expected = legacy_scores(movies, ratings)
+    rows, scores = recommender.get_genre_weighted_rows(ratings, n=20)
+
+    rated_rows = set(np.flatnonzero(movies["movie_id"].isin(list(ratings))).tolist())
+    assert not rated_rows & set(rows)
+    assert scores == sorted(scores, reverse=True)
+    assert scores == pytest.approx([expected[row] for row in rows], abs=1e-5)
+    # Same top 20 as a full sort, up to the order of tied scores
+    assert scores == pytest.approx(sorted(expected.values(), reverse=True)[:20], abs=1e-5)
+
+
+def test_genre_less_movies_score_on_quality_alone():
+    # Movies: [A], [], [A, B], [] with no rating
+    scorer = GenreWeightedScorer(np.array([0, 1, 1, 3, 3]), np.array([0, 0, 1]), 2, np.array([5.0, 8.0, 6.0, np.nan]))
+    scores = scorer.scores(scorer.user_weights(np.array([0]), np.array([10.0])))
+    np.testing.assert_allclose(scores, [0.65 * 2 + 0.35 * 0.5, 0.35 * 0.8, 0.65 * 2 + 0.35 * 0.6, 0.0], rtol=1e-6)
+
+    exclude = np.array([True, False, False, False])
+    rows, _ = scorer.recommend(np.array([0]), np.array([10.0]), exclude, n=10)
+    assert rows.tolist() == [2, 1, 3]
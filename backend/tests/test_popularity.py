@@ -0,0 +1,75 @@
+"""Popularity rankings, the Bayesian prior and the popular-movies route"""
+import numpy as np
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api import routes
+from app.ml.popularity import POPULAR_MIN_RATING, PopularityRanking, bayesian_average
+
+# row:          0    1    2       3    4    5
+RATINGS = [8.0, 9.5, np.nan, 7.0, 6.0, 9.0]
+VOTES = [1000, 2, 50, 500, 10, 100]
+
+
+def test_bayesian_average_by_hand():
+    # C = mean of rated = 7.9, m = given
+    scores = bayesian_average(RATINGS, VOTES, prior_votes=100, prior_mean=7.9)
+    expected = [(1000 * 8.0 + 100 * 7.9) / 1100, (2 * 9.5 + 790) / 102, np.nan, (500 * 7.0 + 790) / 600,
+                (10 * 6.0 + 790) / 110, (100 * 9.0 + 790) / 200]
+    np.testing.assert_allclose(scores, expected)
+
+
+def test_bayesian_average_default_prior():
+    scores = bayesian_average(RATINGS, VOTES)
+    rated_votes = np.array([1000, 2, 500, 10, 100], dtype=float)
+    m, c = np.quantile(rated_votes, 0.8), np.mean([8.0, 9.5, 7.0, 6.0, 9.0])
+    np.testing.assert_allclose(scores[1], (2 * 9.5 + m * c) / (2 + m))
+    # No votes at all and no prior: the rating itself
+    np.testing.assert_allclose(bayesian_average([7.5], [0], prior_votes=0), [7.5])
+
+
+def test_unweighted_ranking_keeps_well_rated_movies_by_rating():
+    ranking = PopularityRanking(np.array(RATINGS), np.array(VOTES, dtype=float))
+    assert POPULAR_MIN_RATING == 7.0
+    assert ranking.rows.tolist() == [1, 5, 0, 3]
+    assert ranking.top(2).tolist() == [1, 5]
+    assert ranking.top(100).tolist() == [1, 5, 0, 3]
+    assert ranking.top(0).tolist() == []
+
+
+def test_weighted_ranking_discounts_movies_with_few_votes():
+    ranking = PopularityRanking(np.array(RATINGS), np.array(VOTES, dtype=float))
+    scores = bayesian_average(RATINGS, VOTES)
+    expected = sorted((row for row in range(6) if not np.isnan(RATINGS[row])), key=lambda row: -scores[row])
+    assert ranking.top(10, weighted=True).tolist() == expected
+    # 9.5 from two votes no longer tops the list
+    assert expected[0] != 1 and expected.index(1) > expected.index(0)
+    assert ranking.top(3, weighted=True).tolist() == expected[:3]
+
+
+def test_weighted_falls_back_without_vote_counts():
+    ranking = PopularityRanking(np.array(RATINGS), np.full(6, np.nan))
+    assert ranking.weighted_rows is None
+    assert ranking.top(3, weighted=True).tolist() == ranking.top(3).tolist()
+
+
+@pytest.fixture
+def client(recommender, monkeypatch):
+    monkeypatch.setattr(routes, "get_recommender", lambda: recommender)
+    monkeypatch.setattr(recommender.settings, "TMDB_API_KEY", "")
+    app = FastAPI()
+    app.include_router(routes.router, prefix="/api")
+    return TestClient(app)
+
+
+@pytest.mark.parametrize("weighted", [False, True])
+def test_popular_route_serves_the_catalog_ranking_without_tmdb(client, recommender, weighted):
+    response = client.get("/api/movies/popular", params={"limit": 35, "weighted": weighted})
+    assert response.status_code == 200
+    body = response.json()
+    expected = recommender.popularity.top(35, weighted).tolist()
+    assert len(expected) == 35
+    assert [movie["movie_id"] for movie in body["movies"]] == recommender.movie_ids[expected].tolist()
+    assert body["count"] == 35
+    assert body["movies"][0] == recommender.payloads.get(expected[0])
@@ -0,0 +1,68 @@
+"""Chunked ratings export against the rows in the table"""
+import numpy as np
+import pytest
+from sqlalchemy import event, insert
+
+from app.database import engine
+from app.ml.ratings_loader import RatingArrays, load_rating_arrays
+from app.models_db import MovieRating
+
+
+def insert_ratings(conn_or_session, rows):
+    conn_or_session.execute(
+        insert(MovieRating),
+        [{"user_id": u, "movie_id": m, "movie_title": f"Movie {m}", "rating": r} for u, m, r in rows],
+    )
+
+
+def make_rows(n, seed):
+    rng = np.random.default_rng(seed)
+    return [
+        (int(rng.integers(1, 50)), int(rng.integers(1, 2_000_000)), float(rng.integers(1, 21)) / 2)
+        for _ in range(n)
+    ]
+
+
+def assert_arrays_match(arrays: RatingArrays, rows):
+    assert arrays.user_ids.dtype == np.int64
+    assert arrays.movie_ids.dtype == np.int64
+    assert arrays.ratings.dtype == np.float32
+    assert len(arrays) == len(rows)
+    loaded = sorted(zip(arrays.user_ids.tolist(), arrays.movie_ids.tolist(), arrays.ratings.tolist()))
+    assert loaded == sorted(rows)
+    assert arrays.nbytes == 20 * len(rows)
+
+
+@pytest.mark.parametrize("chunk_size", [7, 1000])
+def test_loads_every_row_in_chunks(db, chunk_size):
+    rows = make_rows(103, seed=0)
+    insert_ratings(db, rows)
+    db.commit()
+    assert_arrays_match(load_rating_arrays(db, chunk_size=chunk_size), rows)
+
+
+def test_arrays_grow_for_rows_inserted_after_the_count(db):
+    rows = make_rows(20, seed=1)
+    insert_ratings(db, rows)
+    db.commit()
+    late_rows = make_rows(45, seed=2)
+    pending = [late_rows]
+
+    def insert_late(conn, cursor, statement, parameters, context, executemany):
+        # Another writer commits between the loader's count and its select
+        if pending and statement.lstrip().upper().startswith("SELECT MOVIE_RATINGS.USER_ID"):
+            with engine.begin() as other:
+                insert_ratings(other, pending.pop())
+
+    event.listen(engine, "before_cursor_execute", insert_late)
+    try:
+        arrays = load_rating_arrays(db, chunk_size=8)
+    finally:
+        event.remove(engine, "before_cursor_execute", insert_late)
+    assert not pending
+    assert_arrays_match(arrays, rows + late_rows)
+
+
+def test_empty_table(db):
+    arrays = load_rating_arrays(db, chunk_size=4)
+    assert len(arrays) == 0 and arrays.ratings.dtype == np.float32
@@ -0,0 +1,119 @@
+"""Personalized response cache: LRU/TTL behaviour and invalidation through the routes"""
+import asyncio
+import json
+
+import pytest
+
+from app.api import user_routes
+from app.api.user_routes import (
+    MovieRatingCreate, WatchlistItemCreate, add_to_watchlist, get_personalized_recommendations, rate_movie,
+)
+from app.database import SessionLocal
+from app.ml import matrix_factorization, neural_recommender, recommendation_cache, recommender as recommender_module
+from app.ml.batch_recommendations import PrecomputedRecommendations
+from app.ml.matrix_factorization import MatrixFactorization
+from app.ml.recommendation_cache import PersonalizedCache, bump_profile_version, read_profile_version
+
+
+def test_lru_evicts_least_recently_used():
+    cache = PersonalizedCache(max_entries=2)
+    cache.put(1, 10, b"a")
+    cache.put(2, 10, b"b")
+    assert cache.get(1, 10) == b"a"
+    cache.put(3, 10, b"c")
+    assert cache.get(2, 10) is None
+    assert cache.get(1, 10) == b"a" and cache.get(3, 10) == b"c"
+    assert cache.stats()["evictions"] == 1
+
+
+def test_key_covers_every_version():
+    cache = PersonalizedCache()
+    cache.put(1, 10, b"a", profile_version=3, method="auto", artifact_versions=(("catalog", "v1"),))
+    assert cache.get(1, 10, "auto", 3, (("catalog", "v1"),)) == b"a"
+    assert cache.get(1, 10, "auto", 4, (("catalog", "v1"),)) is None
+    assert cache.get(1, 10, "auto", 3, (("catalog", "v2"),)) is None
+    assert cache.get(1, 10, "mf", 3, (("catalog", "v1"),)) is None
+    assert cache.get(1, 5, "auto", 3, (("catalog", "v1"),)) is None
+
+
+def test_expired_entries_are_dropped():
+    cache = PersonalizedCache(ttl_seconds=-1)
+    cache.put(1, 10, b"a")
+    assert cache.get(1, 10) is None
+    assert cache.stats()["stale"] == 1 and cache.stats()["entries"] == 0
+
+
+def test_profile_version_counts_writes(db, make_user):
+    user = make_user(0)
+    assert read_profile_version(db, user.id) == 0
+    bump_profile_version(db, user.id)
+    bump_profile_version(db, user.id)
+    db.commit()
+    assert read_profile_version(db, user.id) == 2
+
+
+@pytest.fixture
+def serving(recommender, monkeypatch):
+    """The personalized route on the synthetic catalog, with untrained models and a fresh cache"""
+    cache = PersonalizedCache()
+    monkeypatch.setattr(recommendation_cache, "_cache_instance", cache)
+    monkeypatch.setattr(recommender_module, "get_recommender", lambda: recommender)
+    untrained = MatrixFactorization(load=False)
+    monkeypatch.setattr(matrix_factorization, "get_mf_model", lambda: untrained)
+    monkeypatch.setattr(neural_recommender, "get_ncf_model", lambda: untrained)
+    monkeypatch.setattr(user_routes, "get_precomputed", lambda: PrecomputedRecommendations(load=False))
+    versions = [(("catalog", "v1"),)]
+    monkeypatch.setattr(user_routes, "artifact_versions", lambda: versions[0])
+    return cache, versions
+
+
+def recommend(db, user):
+    response = asyncio.run(get_personalized_recommendations(n=10, method="auto", current_user=user, db=db))
+    return json.loads(response.body)
+
+
+def rate(db, user, movie_id, rating):
+    body = MovieRatingCreate(movie_id=movie_id, movie_title=f"Movie {movie_id}", rating=rating)
+    asyncio.run(rate_movie(body, current_user=user, db=db))
+
+
+def test_writes_and_publishes_invalidate_cached_responses(db, make_user, recommender, serving):
+    cache, versions = serving
+    user = make_user(0)
+    movie_ids = recommender.movie_ids.tolist()
+    for movie_id in movie_ids[:6]:
+        rate(db, user, movie_id, 8.0)
+
+    first = recommend(db, user)
+    assert first["rating_count"] == 6
+    assert recommend(db, user) == first
+    assert cache.stats()["hits"] == 1
+
+    # A rating write
+    rate(db, user, movie_ids[6], 9.0)
+    after_rating = recommend(db, user)
+    assert after_rating["rating_count"] == 7
+    assert cache.stats()["hits"] == 1
+
+    # A watchlist write
+    item = WatchlistItemCreate(movie_id=movie_ids[7], movie_title="Movie")
+    asyncio.run(add_to_watchlist(item, current_user=user, db=db))
+    recommend(db, user)
+    assert cache.stats()["hits"] == 1
+    recommend(db, user)
+    assert cache.stats()["hits"] == 2
+
+    # A write through another worker's session
+    other = SessionLocal()
+    bump_profile_version(other, user.id)
+    other.commit()
+    other.close()
+    recommend(db, user)
+    assert cache.stats()["hits"] == 2
+
+    # A newly published artifact
+    versions[0] = (("catalog", "v2"),)
+    recommend(db, user)
+    assert cache.stats()["hits"] == 2
+    recommend(db, user)
+    assert cache.stats()["hits"] == 3
@@ -0,0 +1,119 @@
+"""Title search, autocomplete and fuzzy matching against brute-force references"""
+import random
+
+import numpy as np
+import pytest
+
+from app.ml.search import TitleSearchIndex, bounded_substring_distance, default_max_distance
+
+SYLLABLES = ["the", "dar", "k", "kni", "ght", "star", " ", " ", "wa", "rs", "lo", "ve", "a", "in", "o", "re"]
+
+
+def reference_substring_distance(pattern: str, text: str) -> int:
+    """Levenshtein distance from pattern to its closest substring of text (plain DP, free start and end)"""
+    previous = [0] * (len(text) + 1)
+    for i, p in enumerate(pattern, 1):
+        current = [i] + [0] * len(text)
+        for j, t in enumerate(text, 1):
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (p != t))
+        previous = current
+    return min(previous)
+
+
+def random_title(rng: random.Random) -> str:
+    return "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 7))).strip() or "x"
+
+
+def mutate(rng: random.Random, text: str) -> str:
+    i = rng.randrange(len(text))
+    op = rng.choice(("insert", "delete", "replace"))
+    if op == "insert":
+        return text[:i] + rng.choice("aekrst") + text[i:]
+    if op == "delete" and len(text) > 1:
+        return text[:i] + text[i + 1:]
+    return text[:i] + rng.choice("aekrst") + text[i + 1:]
+
+
+@pytest.fixture(scope="module")
+def catalog():
+    rng = random.Random(0)
+    titles = [random_title(rng) for _ in range(600)] + ["The Dark Knight", "The Dark Knight Rises"]
+    popularity = np.array([rng.random() for _ in titles])
+    popularity[rng.randrange(len(titles))] = np.nan
+    return titles, popularity, TitleSearchIndex(titles, popularity)
+
+
+def popularity_rank(popularity):
+    order = np.argsort(-np.nan_to_num(popularity, nan=-1.0), kind="stable")
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))
+    return rank
+
+
+def test_bounded_substring_distance_matches_reference():
+    rng = random.Random(1)
+    for _ in range(2000):
+        text = random_title(rng).lower()
+        pattern = text[rng.randrange(len(text)):][:rng.randint(1, 12)]
+        for _ in range(rng.randint(0, 3)):
+            pattern = mutate(rng, pattern)
+        if rng.random() < 0.2:
+            pattern = random_title(rng).lower()[:10]
+        expected = reference_substring_distance(pattern, text)
+        for max_distance in (0, 1, 2, 5):
+            got = bounded_substring_distance(pattern, text, max_distance)
+            assert got == (expected if expected <= max_distance else None), (pattern, text, max_distance)
+
+
+def test_search_and_autocomplete_match_brute_force(catalog):
+    titles, popularity, index = catalog
+    rank = popularity_rank(popularity)
+    lower = [t.lower() for t in titles]
+    rng = random.Random(2)
+    queries = ["dark", "The", "k", "a", "ght sta", "zzz", "LOVE"] + [
+        t.lower()[i:i + rng.randint(1, 6)] for t in rng.sample(titles, 40) for i in [rng.randrange(len(t))]
+    ]
+    for query in queries:
+        q = query.lower()
+        if not q:
+            continue
+        prefix = sorted((row for row, t in enumerate(lower) if t.startswith(q)), key=lambda row: rank[row])
+        contains = sorted(
+            (row for row, t in enumerate(lower) if q in t and not t.startswith(q)), key=lambda row: rank[row]
+        )
+        assert index.autocomplete(query, limit=8) == prefix[:8], query
+        assert index.search(query, limit=12) == (prefix[:12] + contains)[:12], query
+
+
+def test_fuzzy_matches_brute_force(catalog):
+    titles, popularity, index = catalog
+    rank = popularity_rank(popularity)
+    lower = [t.lower() for t in titles]
+    rng = random.Random(3)
+    queries = ["the drak knight", "knigth", "strwars"]
+    for title in rng.sample(lower, 40):
+        start = rng.randrange(len(title))
+        query = title[start:start + rng.randint(4, 14)]
+        for _ in range(rng.randint(0, 2)):
+            query = mutate(rng, query)
+        queries.append(query)
+
+    for query in queries:
+        max_distance = default_max_distance(query)
+        matches = [
+            (reference_substring_distance(query, t), rank[row], row) for row, t in enumerate(lower)
+        ]
+        expected = sorted(m for m in matches if m[0] <= max_distance)
+        got = index.fuzzy(query, limit=10)
+        if len(set(query[i:i + 2] for i in range(len(query) - 1))) <= 2 * max_distance:
+            # Too short for the q-gram filter: exact substring search
+            assert got == [(row, 0) for row in index.search(query, limit=10)], query
+            continue
+        assert got == [(row, distance) for distance, _, row in expected[:10]], query
+
+
+def test_fuzzy_finds_typos_of_known_titles(catalog):
+    titles, _, index = catalog
+    rows = [row for row, _ in index.fuzzy("the drak knight", limit=5)]
+    assert titles.index("The Dark Knight") in rows
+    assert titles.index("The Dark Knight Rises") in rows
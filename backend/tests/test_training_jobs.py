@@ -0,0 +1,87 @@
+"""Training job records, the single-flight lock and the job body"""
+import os
+import time
+
+import numpy as np
+import pytest
+
+from app.ml import matrix_factorization
+from app.ml.synthetic import make_synthetic_ratings
+from app.ml.training_jobs import (
+    FAILED, LOCK_FILE, QUEUED, RUNNING, STARTUP_GRACE_SECONDS, SUCCEEDED, TrainingJobStore, TrainingScheduler, _run_job,
+)
+
+
+@pytest.fixture
+def store(tmp_path):
+    return TrainingJobStore(tmp_path / "jobs")
+
+
+def make_job(store, job_id, **fields):
+    return store.save({"job_id": job_id, "status": QUEUED, "created_at": time.time(), "pid": None, **fields})
+
+
+def test_one_lock_holder_at_a_time(store):
+    assert store.try_lock("a")
+    make_job(store, "a", status=RUNNING, pid=os.getpid())
+    assert not store.try_lock("b")
+    assert store.lock_holder() == "a"
+
+    store.release("b")
+    assert store.lock_holder() == "a"
+    store.release("a")
+    assert store.try_lock("b")
+
+
+def test_lock_of_a_dead_or_finished_job_is_broken(store):
+    assert store.try_lock("dead")
+    # A pid no live process has (pids wrap far below this)
+    make_job(store, "dead", status=RUNNING, pid=2 ** 22 + 12345)
+    assert store.try_lock("next")
+    assert store.get("dead")["status"] == FAILED
+
+    make_job(store, "next", status=SUCCEEDED)
+    assert store.try_lock("after")
+    assert store.lock_holder() == "after"
+
+
+def test_fresh_lock_without_a_record_is_respected(store):
+    assert store.try_lock("starting")
+    assert not store.try_lock("other")
+    old = time.time() - STARTUP_GRACE_SECONDS - 1
+    os.utime(store.root / LOCK_FILE, (old, old))
+    assert store.try_lock("other")
+
+
+def test_submit_returns_the_running_job(store):
+    make_job(store, "busy", status=RUNNING, pid=os.getpid())
+    assert store.try_lock("busy")
+    job, started = TrainingScheduler(store).submit(model="mf")
+    assert not started
+    assert job["job_id"] == "busy"
+
+
+def test_job_trains_and_publishes(store, tmp_path, monkeypatch):
+    monkeypatch.setattr(matrix_factorization, "_FACTORS_PATH", tmp_path / "mf_factors.npz")
+    ratings = make_synthetic_ratings(np.arange(1, 101), n_users=50, ratings_per_user=20)
+    assert store.try_lock("job")
+    make_job(store, "job", model="mf")
+
+    _run_job("job", ratings, str(store.root), model="mf")
+
+    job = store.get("job")
+    assert job["status"] == SUCCEEDED
+    assert job["total_ratings"] == len(ratings)
+    assert job["progress"]["epoch"] == job["progress"]["epochs"]
+    assert store.lock_holder() is None
+    assert matrix_factorization.factors_version() is not None
+
+
+def test_job_with_too_few_ratings_fails(store):
+    assert store.try_lock("job")
+    make_job(store, "job", model="mf")
+    _run_job("job", [{"user_id": 1, "movie_id": 1, "rating": 7.0}], str(store.root), model="mf")
+    job = store.get("job")
+    assert job["status"] == FAILED
+    assert "at least" in job["message"]
+    assert store.lock_holder() is None
@@ -132,9 +132,14 @@ export default function Recommendations() {
   const handleTrainModel = async () => {
     setTrainingModel(true)
     try {
-      const result = await movieAPI.trainNcfModel()
-      alert(result.message)
-      if (result.trained) fetchPersonalized()
+      let job = await movieAPI.trainNcfModel()
+      // Training runs in the background; poll until it finishes
+      while (job.status === 'queued' || job.status === 'running') {
+        await new Promise((resolve) => setTimeout(resolve, 2000))
+        job = await movieAPI.getTrainingJob(job.job_id)
+      }
+      alert(job.message)
+      if (job.status === 'succeeded') fetchPersonalized()
     } catch (err) {
       alert('Training failed. Check backend logs.')
     } finally {
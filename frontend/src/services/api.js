@@ -30,6 +30,12 @@ export const movieAPI = {
     return response.data
   },
 
+  // Get "users who liked this also liked" recommendations
+  getAlsoLikedRecommendations: async (title, n_recommendations = 10) => {
+    const response = await api.post('/recommendations/also-liked', { title, n_recommendations })
+    return response.data
+  },
+
   // Get mood-based recommendations
   getMoodRecommendations: async (mood, n_recommendations = 5) => {
     const response = await api.post('/recommendations/mood-based', { mood, n_recommendations })
@@ -42,12 +48,18 @@ export const movieAPI = {
     return response.data
   },
 
-  // Trigger NCF model re-training (requires auth)
+  // Start NCF model re-training in the background (requires auth)
   trainNcfModel: async () => {
     const response = await api.post('/user/recommendations/train-model')
     return response.data
   },
 
+  // Poll a background training job (requires auth)
+  getTrainingJob: async (jobId) => {
+    const response = await api.get(`/user/recommendations/train-model/${jobId}`)
+    return response.data
+  },
+
   // Rate a movie (requires auth)
   rateMovie: async (movieId, movieTitle, rating) => {
     const response = await api.post('/user/ratings', {
@@ -2,46 +2,47 @@ import streamlit as st
 import requests
 import pickle
 import pandas as pd
+import numpy as np
 import difflib
 import matplotlib.pyplot as plt
 from config import TMDB_API_KEY
+from preprocessing import genre_stats
 
 with open('src\movie_data.pkl', 'rb') as file:
     movies, cosine_sim = pickle.load(file)
 
+MOOD_GENRES = {
+    "Happy": ["Comedy", "Animation", "Family"],
+    "Sad": ["Drama", "Romance"],
+    "Excited": ["Action", "Adventure", "Sci-Fi"],
+    "Scared": ["Horror", "Thriller"],
+    "Thoughtful": ["Documentary", "History", "Mystery"]
+}
+
+# Genre bitmasks (one bit per genre) and per-mood candidate rows, built once at load
+genre_bits = {genre: 1 << i for i, genre in enumerate(sorted({g for gs in movies['genres'] for g in gs}))}
+genre_masks = np.array([sum(genre_bits[g] for g in set(gs)) for gs in movies['genres']], dtype=np.uint64)
+mood_pools = {
+    mood: np.flatnonzero(genre_masks & np.uint64(sum(genre_bits.get(g, 0) for g in genres)))
+    for mood, genres in MOOD_GENRES.items()
+}
+
 # Move all function definitions to the top
 def get_mood_recommendations(mood):
-    mood_genres = {
-        "Happy": ["Comedy", "Animation", "Family"],
-        "Sad": ["Drama", "Romance"],
-        "Excited": ["Action", "Adventure", "Sci-Fi"],
-        "Scared": ["Horror", "Thriller"],
-        "Thoughtful": ["Documentary", "History", "Mystery"]
-    }
-    
-    recommended_movies = []
-    selected_genres = mood_genres[mood]
-    
-    for _, movie in movies.iterrows():
-        if any(genre in selected_genres for genre in movie['genres']):
-            recommended_movies.append(movie)
-    
-    return pd.DataFrame(recommended_movies).sample(min(5, len(recommended_movies)))
+    pool = mood_pools[mood]
+    sampled = np.random.choice(pool, size=min(5, len(pool)), replace=False)
+    return movies.iloc[sampled]
+
+# Catalog aggregates only change when movie_data.pkl is rebuilt, so compute them once per process
+@st.cache_data
+def genre_rating_stats():
+    return genre_stats(movies)
 
 def show_movie_statistics():
     st.header("📊 Movie Statistics")
     
     # Average rating by genre
-    genre_ratings = {}
-    for _, movie in movies.iterrows():
-        rating = movie['vote_average']
-        for genre in movie['genres']:
-            if genre not in genre_ratings:
-                genre_ratings[genre] = []
-            genre_ratings[genre].append(rating)
-    
-    avg_genre_ratings = {genre: sum(ratings)/len(ratings) 
-                        for genre, ratings in genre_ratings.items()}
+    avg_genre_ratings = genre_rating_stats()['mean'].dropna().to_dict()
     
     # Create a bar chart
     fig, ax = plt.subplots(figsize=(10, 6))
@@ -77,13 +78,15 @@ def fetch_poster(movie_id):
 
 
 # Function to get movie recommendations based on cosine similarity
+# cosine_sim is a sparse matrix holding only each movie's top-K neighbors (self excluded)
 def get_recommendations(title, cosine_sim=cosine_sim):
     idx = movies[movies['title'] == title].index[0]
-    sim_scores = list(enumerate(cosine_sim[idx]))
-    sim_scores = sorted(sim_scores, key=lambda x: x[1], reverse=True)
-    sim_scores = sim_scores[1:11]
-    movie_indices = [i[0] for i in sim_scores]
-    return movies.iloc[movie_indices]
+    row = cosine_sim.getrow(idx)
+    n = min(10, row.nnz)
+    # Partial selection of the top n, then order just those n
+    top = np.argpartition(row.data, -n)[-n:] if n else np.empty(0, dtype=int)
+    top = top[np.argsort(-row.data[top])]
+    return movies.iloc[row.indices[top]]
 
 
 # Fetch popular movies from TMDB
@@ -107,10 +110,7 @@ def get_search_suggestions(query, movie_titles):
 
 # Plot genre distribution
 def plot_genre_distribution():
-    all_genres = []
-    for movie in movies['genres']:
-        all_genres.extend(movie)  # Flatten the list of genres
-    genre_counts = pd.Series(all_genres).value_counts()
+    genre_counts = genre_rating_stats()['count'].sort_values(ascending=False)
 
     fig, ax = plt.subplots(figsize=(10, 6))
     genre_counts.plot(kind="bar", ax=ax, color="salmon")
@@ -1,19 +1,17 @@
 import pandas as pd
+import numpy as np
 import ast
+from concurrent.futures import ProcessPoolExecutor
+from scipy import sparse
 from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
 import pickle
 
+TOP_K = 50
+BLOCK_SIZE = 1024
+
 pd.set_option('display.max_columns', None)  # Show all columns
 pd.set_option('display.width', 0)
 
-credits = pd.read_csv('../data/tmdb_5000_credits.csv')
-movies = pd.read_csv('../data/tmdb_5000_movies.csv')
-
-movies = movies.merge(credits, left_on='title', right_on='title')
-
-movies = movies[['movie_id', 'title', 'overview', 'genres', 'keywords', 'cast', 'crew']]
-
 # Cleans the messy genre dict from dataset, into more readable list form.
 def convert(obj):
     L = []
@@ -21,29 +19,71 @@ def convert(obj):
         L.append(i["name"])
     return L
 
-movies['genres'] = movies['genres'].apply(convert)
-movies['keywords'] = movies['keywords'].apply(convert)
-movies['cast'] = movies['cast'].apply(lambda x: [i['name'] for i in ast.literal_eval(x)[:3]])
-movies['crew'] = movies['crew'].apply(lambda x: [i['name'] for i in ast.literal_eval(x) if i['job'] == "Director"])
+# Each worker gets the TF-IDF matrix once instead of once per block
+_tfidf_matrix = None
+
+def _init_worker(tfidf_matrix):
+    global _tfidf_matrix
+    _tfidf_matrix = tfidf_matrix
+
+# Cosine similarity of one row block against every movie, keeping only the top-K per row.
+# TF-IDF rows are L2-normalised so a dot product is the cosine similarity.
+def top_k_block(bounds):
+    start, end = bounds
+    block = (_tfidf_matrix[start:end] @ _tfidf_matrix.T).toarray()
+    block[np.arange(end - start), np.arange(start, end)] = -np.inf
+    k = min(TOP_K, block.shape[1] - 1)
+    cols = np.argpartition(block, -k, axis=1)[:, -k:]
+    return cols, np.take_along_axis(block, cols, axis=1)
+
+# Sparse N x N matrix holding each movie's top-K neighbors, built block by block
+# across a process pool so the dense similarity matrix is never materialised.
+def top_k_similarity(tfidf_matrix):
+    n = tfidf_matrix.shape[0]
+    blocks = [(start, min(start + BLOCK_SIZE, n)) for start in range(0, n, BLOCK_SIZE)]
+    with ProcessPoolExecutor(initializer=_init_worker, initargs=(tfidf_matrix,)) as pool:
+        results = list(pool.map(top_k_block, blocks))
+    cols = np.vstack([c for c, _ in results])
+    scores = np.vstack([v for _, v in results])
+    rows = np.repeat(np.arange(n), cols.shape[1])
+    return sparse.csr_matrix((scores.ravel(), (rows, cols.ravel())), shape=(n, n))
+
+# Merges the TMDB movies and credits tables into one row per movie with a lowercase tag string.
+# vote_average is kept for the Statistics page.
+def build_movie_frame(movies, credits):
+    movies = movies.merge(credits, left_on='title', right_on='title')
+
+    movies = movies[['movie_id', 'title', 'overview', 'genres', 'keywords', 'cast', 'crew', 'vote_average']]
+
+    movies['genres'] = movies['genres'].apply(convert)
+    movies['keywords'] = movies['keywords'].apply(convert)
+    movies['cast'] = movies['cast'].apply(lambda x: [i['name'] for i in ast.literal_eval(x)[:3]])
+    movies['crew'] = movies['crew'].apply(lambda x: [i['name'] for i in ast.literal_eval(x) if i['job'] == "Director"])
+
+    movies['tags'] = movies['genres'] + movies['keywords'] + movies['cast'] + movies['crew']
+
+    movies = movies[['movie_id', 'title', 'overview', 'genres', 'keywords', 'cast', 'crew', 'tags', 'vote_average']]
+    movies['tags'] = movies['tags'].apply(lambda x: " ".join(x))
+    movies['tags'] = movies['tags'].apply(lambda x: x.lower())
+    return movies
 
-movies['tags'] = movies['genres'] + movies['keywords'] + movies['cast'] + movies['crew']
+# Movie count and mean vote_average per genre. Counts only need the genres column, so they
+# also work on pickles built before vote_average was kept (the mean is then all NaN).
+def genre_stats(movies):
+    exploded = movies.explode('genres').dropna(subset=['genres'])
+    ratings = exploded['vote_average'] if 'vote_average' in exploded else pd.Series(np.nan, index=exploded.index)
+    return ratings.groupby(exploded['genres'], sort=False).agg(mean='mean', count='size')
 
-movies = movies[['movie_id', 'title', 'overview', 'genres', 'keywords', 'cast', 'crew','tags']]
-movies['tags'] = movies['tags'].apply(lambda x: " ".join(x))
-movies['tags'] = movies['tags'].apply(lambda x: x.lower())
+if __name__ == "__main__":
+    credits = pd.read_csv('../data/tmdb_5000_credits.csv')
+    movies = pd.read_csv('../data/tmdb_5000_movies.csv')
 
-tfidf = TfidfVectorizer(stop_words='english')
-tfidf_matrix = tfidf.fit_transform(movies['tags'])
+    movies = build_movie_frame(movies, credits)
 
-cosine_sim = cosine_similarity(tfidf_matrix, tfidf_matrix)
+    tfidf = TfidfVectorizer(stop_words='english')
+    tfidf_matrix = tfidf.fit_transform(movies['tags']).astype(np.float32)
 
-def get_recommendations(title, cosine_sim=cosine_sim):
-    idx = movies[movies['title'] == title].index[0]
-    sim_scores = list(enumerate(cosine_sim[idx]))
-    sim_scores = sorted(sim_scores, key=lambda x: x[1], reverse=True)
-    sim_scores = sim_scores[1:11]
-    movie_indices = [i[0] for i in sim_scores]
-    return movies['title'].iloc[movie_indices]
+    cosine_sim = top_k_similarity(tfidf_matrix)
 
-with open('movie_data.pkl', 'wb') as file:
-    pickle.dump((movies, cosine_sim), file)
\ No newline at end of file
+    with open('movie_data.pkl', 'wb') as file:
+        pickle.dump((movies, cosine_sim), file)